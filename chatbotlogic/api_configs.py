@@ -0,0 +1,89 @@
+# Per-API settings shared by the dashboard and the background jobs. Pricing
+# keys (cost_per_call, endpoint_costs, cost_tiers) are read by
+# cost_engine.PriceBook.from_api_configs.
+API_CONFIGS = {
+    "Image API": {
+        "cost_per_call": 0.001,
+        "quota_daily": 10000,
+        "rate_limit_per_second": 10,
+        "base_latency_ms": 50,
+        "latency_variation": 20,
+        "base_error_rate_percent": 0.5,
+        "error_rate_variation": 0.5,
+        "documentation_url": "https://www.apihub.digital/dashboard/Imageapi",
+        "latest_version": "v2.1",
+        "endpoints": ["/process", "/info", "/status"]
+    },
+    "Video API": {
+        "cost_per_call": 0.002,
+        "quota_daily": 5000,
+        "rate_limit_per_second": 5,
+        "base_latency_ms": 80,
+        "latency_variation": 30,
+        "base_error_rate_percent": 1.2,
+        "error_rate_variation": 1.0,
+        "documentation_url": "https://www.apihub.digital/dashboard/videoapi",
+        "latest_version": "v1.5",
+        "endpoints": ["/stream", "/upload", "/metadata"]
+    },
+    "Weather API": {
+        "cost_per_call": 0.0005,
+        "quota_daily": 20000,
+        "rate_limit_per_second": 20,
+        "base_latency_ms": 30,
+        "latency_variation": 10,
+        "base_error_rate_percent": 0.1,
+        "error_rate_variation": 0.1,
+        "documentation_url": "https://www.apihub.digital/dashboard/weatherapi",
+        "latest_version": "v3.0",
+        "endpoints": ["/current", "/forecast", "/historical"]
+    },
+    "Ecommerce API": {
+        "cost_per_call": 0.0007,
+        "quota_daily": 15000,
+        "rate_limit_per_second": 15,
+        "base_latency_ms": 60,
+        "latency_variation": 25,
+        "base_error_rate_percent": 0.8,
+        "error_rate_variation": 0.7,
+        "documentation_url": "https://www.apihub.digital/dashboard/ecommerceapi",
+        "latest_version": "v2.3",
+        "endpoints": ["/products", "/orders", "/users", "/checkout"]
+    },
+    "QR Code API": {
+        "cost_per_call": 0.0012,
+        "quota_daily": 8000,
+        "rate_limit_per_second": 8,
+        "base_latency_ms": 45,
+        "latency_variation": 15,
+        "base_error_rate_percent": 0.3,
+        "error_rate_variation": 0.3,
+        "documentation_url": "https://www.apihub.digital/dashboard/Qrcodeapi",
+        "latest_version": "v1.2",
+        "endpoints": ["/generate", "/decode"]
+    },
+    "Profile Photo API": {
+        "cost_per_call": 0.0014,
+        "quota_daily": 7000,
+        "rate_limit_per_second": 7,
+        "base_latency_ms": 70,
+        "latency_variation": 28,
+        "base_error_rate_percent": 0.6,
+        "error_rate_variation": 0.6,
+        "documentation_url": "https://www.apihub.digital/dashboard/profilepic",
+        "latest_version": "v2.0",
+        "endpoints": ["/upload", "/crop", "/filter"]
+    },
+    "Jokes API": {
+        "cost_per_call": 0.0004,
+        "quota_daily": 25000,
+        "rate_limit_per_second": 25,
+        "base_latency_ms": 25,
+        "latency_variation": 10,
+        "base_error_rate_percent": 0.05,
+        "error_rate_variation": 0.05,
+        "documentation_url": "https://www.apihub.digital/dashboard/jokesapi",
+        "latest_version": "v1.0",
+        "endpoints": ["/random", "/category", "/search"]
+    }
+}
@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_configs import API_CONFIGS
+from cost_engine import PriceBook
+
+
+def build_frame(rows, seed):
+    # Same dtypes log_loader.load_logs produces.
+    rng = np.random.default_rng(seed)
+    apis = list(API_CONFIGS)
+    api = rng.choice(apis, size=rows)
+    endpoint = np.array([rng.choice(API_CONFIGS[name]["endpoints"]) for name in apis])[
+        pd.Categorical(api, categories=apis).codes
+    ]
+    timestamp = pd.Timestamp.now(tz="UTC") - pd.to_timedelta(rng.random(rows) * 90, unit="D")
+    return pd.DataFrame({
+        "api": pd.Categorical(api),
+        "endpoint": pd.Categorical(endpoint),
+        "timestamp": timestamp,
+    })
+
+
+def legacy_cost(df):
+    # The original dashboard: one Python lambda per row.
+    return df.apply(lambda row: API_CONFIGS.get(row["api"], {}).get("cost_per_call", 0), axis=1).sum()
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log cost: row-wise df.apply vs PriceBook over categorical codes.")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    df = build_frame(args.rows, args.seed)
+    flat = PriceBook.from_api_configs(API_CONFIGS)
+    tiered_configs = {
+        name: dict(config, cost_tiers=[[args.rows // 100, 0.8], [args.rows // 20, 0.6]])
+        for name, config in API_CONFIGS.items()
+    }
+    tiered = PriceBook.from_api_configs(tiered_configs)
+
+    legacy, legacy_seconds = timed(lambda: legacy_cost(df), 1)
+    vectorized, vectorized_seconds = timed(lambda: flat.unit_prices(df["api"]).sum(), args.repeat)
+    _, endpoint_seconds = timed(lambda: flat.unit_prices(df["api"], df["endpoint"]).sum(), args.repeat)
+    tiered_total, tiered_seconds = timed(lambda: tiered.log_costs(df).sum(), args.repeat)
+
+    print(f"{args.rows:,} rows, {len(API_CONFIGS)} APIs\n")
+    print(f"{'method':<34}{'seconds':>10}{'rows/s':>16}{'total $':>12}")
+    for name, seconds, total in [
+        ("df.apply per row", legacy_seconds, legacy),
+        ("PriceBook.unit_prices (api)", vectorized_seconds, vectorized),
+        ("PriceBook.unit_prices (endpoint)", endpoint_seconds, None),
+        ("PriceBook.log_costs (tiered)", tiered_seconds, tiered_total),
+    ]:
+        total_text = f"{total:>12,.2f}" if total is not None else f"{'':>12}"
+        print(f"{name:<34}{seconds:>10.4f}{args.rows / seconds:>16,.0f}{total_text}")
+    print(f"\nspeedup over apply: {legacy_seconds / vectorized_seconds:,.0f}x")
+    assert abs(legacy - vectorized) < 1e-6 * max(1.0, legacy)
+
+
+if __name__ == "__main__":
+    main()
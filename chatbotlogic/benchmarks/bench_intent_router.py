@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_router import GREETINGS, INTRODUCTION_QUESTIONS, INTENT_ENGINE
+
+SAMPLE_MESSAGES = [
+    "hi",
+    "hello there, how are you doing today?",
+    "who are you",
+    "show tickets",
+    "show api keys",
+    "what's my api key",
+    "How do I authenticate with the Image API?",
+    "what does /postimg return when the upload fails with a 413 status code",
+    "how do I call /getweatherdata for a city with spaces in the name",
+    "tell me about cats",
+    "how do I reset my password",
+    "create manual support ticket",
+    "Can you explain the rate limits for the Ecommerce API and what happens when I exceed them "
+    "during a bulk product import that runs every night at midnight?",
+]
+
+
+def legacy_classify(query):
+    # Mirrors the original page logic: the elif substring chain, then both
+    # phrase lists rebuilt and scanned for every unmatched message.
+    query = query.lower().strip()
+    if "show recent support tickets" in query or "show tickets" in query:
+        return "show_tickets"
+    elif "show api usage statistics" in query or "show api stats" in query:
+        return "show_stats"
+    elif "show contact information" in query or "show contact" in query or "contact support" in query:
+        return "show_contact"
+    elif "apikey" in query or "api key" in query or "get api key" in query:
+        return "get_api_key"
+    elif "show api keys" in query or "my api keys" in query:
+        return "show_api_keys"
+    elif "show help" in query or "commands" in query:
+        return "show_help"
+    elif "create manual support ticket" in query or "new ticket" in query:
+        return "new_ticket"
+    greetings = list(GREETINGS)
+    introduction_questions = list(INTRODUCTION_QUESTIONS)
+    if any(greet in query for greet in greetings):
+        return "greeting"
+    if any(q in query for q in introduction_questions):
+        return "introduction"
+    return None
+
+
+def compiled_classify(query):
+    match = INTENT_ENGINE.resolve(query)
+    return match.intent if match else None
+
+
+def run(classify, messages, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for message in messages:
+            classify(message)
+    elapsed = time.perf_counter() - started
+    return iterations * len(messages) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intent routing throughput: legacy substring scans vs compiled automaton.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{INTENT_ENGINE.pattern_count} phrases, {len(SAMPLE_MESSAGES)} sample messages, {args.iterations} iterations\n")
+    legacy = run(legacy_classify, SAMPLE_MESSAGES, args.iterations)
+    compiled = run(compiled_classify, SAMPLE_MESSAGES, args.iterations)
+    print(f"{'legacy substring scan':<24}{legacy:>14,.0f} msg/s")
+    print(f"{'compiled automaton':<24}{compiled:>14,.0f} msg/s")
+    print(f"{'speedup':<24}{compiled / legacy:>13.2f}x\n")
+
+    print(f"{'message':<60}{'legacy':<16}{'compiled':<16}")
+    for message in SAMPLE_MESSAGES:
+        print(f"{message[:58]:<60}{str(legacy_classify(message)):<16}{str(compiled_classify(message)):<16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_loader import load_logs
+from mongo_connection import get_database
+
+APIS = {
+    "Image Processing API": ["/process", "/resize", "/info"],
+    "Video Streaming API": ["/stream", "/upload", "/status"],
+    "Weather Data API": ["/current", "/forecast", "/historical"],
+    "Jokes API": ["/random", "/category", "/search"],
+}
+COUNTRIES = ["USA", "Germany", "India", "Brazil", "Japan", "UK", "Canada", "Australia", "France", "China", "Mexico"]
+STATUS_CODES = [200] * 50 + [400] * 5 + [401] * 2 + [404] * 3 + [500] * 5
+
+
+def seed_logs(collection, rows, seed):
+    rng = random.Random(seed)
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=30)
+    docs = []
+    for _ in range(rows):
+        api = rng.choice(list(APIS))
+        docs.append({
+            "api": api,
+            "timestamp": start + (end - start) * rng.random(),
+            "user_id": f"user_{rng.randint(1, 20)}",
+            "status_code": rng.choice(STATUS_CODES),
+            "country": rng.choice(COUNTRIES),
+            "api_version": "v1.0",
+            "endpoint": rng.choice(APIS[api]),
+            "latency_ms": rng.uniform(10, 500),
+        })
+    collection.insert_many(docs)
+    return start.date(), end.date()
+
+
+def legacy_load(collection, start_date, end_date):
+    # The original get_api_logs: every field as Python objects, then a copy.
+    query = {"timestamp": {
+        "$gte": datetime.combine(start_date, datetime.min.time(), tzinfo=timezone.utc),
+        "$lte": datetime.combine(end_date, datetime.max.time(), tzinfo=timezone.utc),
+    }}
+    df = pd.DataFrame(list(collection.find(query)))
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+    df["timestamp"] = df["timestamp"].dt.tz_localize(timezone.utc)
+    return df.copy()
+
+
+def measure(load):
+    tracemalloc.start()
+    started = time.perf_counter()
+    df = load()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw log loading: list of dicts + object frame vs typed columnar loader.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--mongo-uri", default="mongomock://bench-log-loader",
+                        help="mongomock (the default) spends most of the load time projecting documents; use a real cluster for timings")
+    args = parser.parse_args()
+
+    collection = get_database(args.mongo_uri)["bench_api_usage_logs"]
+    collection.delete_many({})
+    start_date, end_date = seed_logs(collection, args.rows, args.seed)
+
+    results = [
+        ("legacy get_api_logs", *measure(lambda: legacy_load(collection, start_date, end_date))),
+        ("log_loader.load_logs", *measure(lambda: load_logs(collection, start_date, end_date))),
+    ]
+    print(f"{args.rows:,} log documents\n")
+    print(f"{'loader':<24}{'rows':>10}{'frame B/row':>14}{'peak B/row':>14}{'seconds':>10}")
+    for name, df, elapsed, peak in results:
+        rows = max(1, len(df))
+        frame_bytes = df.memory_usage(deep=True).sum()
+        print(f"{name:<24}{len(df):>10,}{frame_bytes / rows:>14,.0f}{peak / rows:>14,.0f}{elapsed:>10.2f}")
+    legacy_bytes = results[0][1].memory_usage(deep=True).sum()
+    compact_bytes = results[1][1].memory_usage(deep=True).sum()
+    print(f"\nframe size reduction: {legacy_bytes / max(1, compact_bytes):.1f}x")
+    print("\ndtypes:")
+    print(results[1][1].dtypes.to_string())
+    collection.drop()
+
+
+if __name__ == "__main__":
+    main()
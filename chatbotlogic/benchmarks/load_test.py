@@ -0,0 +1,178 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_engine import ChatEngine, load_settings
+from intent_router import GREETINGS, INTRODUCTION_QUESTIONS
+from llm_providers import FakeChatModel, PROVIDER_MOCK
+from llm_resilience import ResilientChatModel
+from notifications import FakeTwilioClient
+from rate_limiter import RateLimiter
+from telemetry import STAGES
+
+COMMAND_MESSAGES = ["show tickets", "show api stats", "show contact", "get api key", "show help"]
+OFF_TOPIC_MESSAGES = [
+    "what's the weather like in paris today",
+    "tell me a joke about cats",
+    "who won the football match last night",
+    "recommend a good pizza place near me",
+    "how do I reset my laptop password",
+    "write me a poem about the sea",
+]
+API_QUESTION_TEMPLATES = [
+    "How do I call {endpoint}?",
+    "what does {endpoint} return",
+    "What errors can {endpoint} give me and how do I handle them?",
+    "How do I authenticate requests to the {api}?",
+    "what are the rate limits for the {api}",
+]
+
+
+# Drives the same ChatEngine the Streamlit page and chat_server.py use, with
+# every external service replaced by a local stand-in: mongomock for MongoDB,
+# FakeChatModel for Groq and FakeTwilioClient for WhatsApp.
+def build_engine(args):
+    settings = load_settings(
+        mongo_uri=f"mongomock://load-test-{uuid.uuid4().hex}",
+        llm_provider=PROVIDER_MOCK,
+        llm_streaming=False,
+        twilio_fake=True,
+        twilio_number="+10000000000",
+        support_phone_number="+10000000001",
+        notify_coalesce_window_seconds=args.notify_window,
+        notify_max_per_minute=args.notify_per_minute,
+        response_cache_shared=False,
+        semantic_cache_dir=tempfile.mkdtemp(prefix="apiman-load-"),
+    )
+    chat_model = ResilientChatModel(
+        FakeChatModel(latency=args.llm_latency, error_rate=args.llm_error_rate, seed=args.seed),
+        max_workers=max(16, args.llm_concurrency * 2)
+    )
+    rate_limiter = RateLimiter(
+        session_burst=args.turns, global_burst=args.sessions * args.turns,
+        max_concurrency=args.llm_concurrency, queue_timeout=30
+    )
+    twilio = FakeTwilioClient(latency_seconds=args.twilio_latency, seed=args.seed)
+    return ChatEngine(settings, chat_model=chat_model, twilio_client=twilio, rate_limiter=rate_limiter)
+
+
+def build_message_pool(catalog):
+    api_questions = []
+    for api in catalog.apis:
+        for template in API_QUESTION_TEMPLATES:
+            if "{endpoint}" in template:
+                api_questions.extend(template.format(endpoint=endpoint, api=api.name) for endpoint in api.endpoints)
+            else:
+                api_questions.append(template.format(api=api.name, endpoint=""))
+    return {
+        "greeting": list(GREETINGS[:10]) + list(INTRODUCTION_QUESTIONS[:5]),
+        "command": COMMAND_MESSAGES,
+        "api": api_questions,
+        "off_topic": OFF_TOPIC_MESSAGES,
+    }
+
+
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def run_session(engine, pool, mix, turns, think_seconds, seed):
+    rng = random.Random(seed)
+    session = engine.open_session(uuid.UUID(int=rng.getrandbits(128)).hex)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    for _ in range(turns):
+        kind = rng.choices(kinds, weights)[0]
+        engine.handle_turn(session, rng.choice(pool[kind]))
+        if think_seconds:
+            time.sleep(rng.uniform(0, think_seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive simulated chat sessions through the chatbot pipeline offline.")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=8, help="messages per session")
+    parser.add_argument("--concurrency", type=int, default=16, help="sessions running at once")
+    parser.add_argument("--think-seconds", type=float, default=0.0, help="max pause between a session's messages")
+    parser.add_argument("--mix", default="greeting=0.15,command=0.15,api=0.55,off_topic=0.15")
+    parser.add_argument("--llm-latency", default="lognormal:p50=0.3,p95=1.0")
+    parser.add_argument("--llm-error-rate", type=float, default=0.02)
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--twilio-latency", type=float, default=0.15)
+    parser.add_argument("--notify-window", type=float, default=1.0)
+    parser.add_argument("--notify-per-minute", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    engine = build_engine(args)
+    pool = build_message_pool(engine.catalog_index)
+    mix = parse_mix(args.mix)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [
+            executor.submit(run_session, engine, pool, mix, args.turns, args.think_seconds, args.seed * 100003 + i)
+            for i in range(args.sessions)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    # Let the outbox drain so notification latency is part of the report.
+    drain_deadline = time.monotonic() + args.notify_window + 30
+    while engine.outbox_worker.queue_depth() and time.monotonic() < drain_deadline:
+        engine.outbox_worker.wake()
+        time.sleep(0.1)
+    engine.close()
+
+    stats = engine.stats()
+    summaries = stats["stages"]
+    turns = summaries.get("turn", {}).get("count", 0)
+    print(f"{args.sessions} sessions x {args.turns} turns, concurrency {args.concurrency}")
+    print(f"{turns} turns in {elapsed:.2f}s: {turns / elapsed:,.1f} turns/s")
+    print()
+    print(f"{'stage':<14}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name in STAGES:
+        summary = summaries.get(name)
+        if not summary:
+            continue
+        print(
+            f"{name:<14}{summary['count']:>8}{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}"
+            f"{summary['p99_ms']:>10.2f}{summary['max_ms']:>10.2f}"
+        )
+    print()
+    llm_stats = stats["llm"]
+    outbox_stats = stats["outbox"]
+    print(
+        f"LLM: {llm_stats['calls']} calls, {llm_stats['retries']} retries, {llm_stats['unavailable']} degraded; "
+        f"single-flight coalesced {stats['single_flight']['coalesced']}"
+    )
+    print(
+        f"Sessions: {stats['sessions']['messages_written']} messages in {stats['sessions']['writes']} "
+        f"write-behind updates"
+    )
+    print(
+        f"Canned answers: {stats['canned_answers']['hits']} turns ({stats['canned_answers']['traffic_share']:.0%}); "
+        f"caches: exact {stats['response_cache']['local_hits']} hits, "
+        f"semantic {stats['semantic_cache']['hits']} hits"
+    )
+    print(
+        f"Tickets: {engine.tickets_collection.count_documents({})} created, {stats['ticket_dedup']['duplicates']} merged; "
+        f"WhatsApp: {len(engine.twilio_client.sent)} messages for {outbox_stats['delivered']} tickets, "
+        f"queue depth {outbox_stats['queue_depth']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
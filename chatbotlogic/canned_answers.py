@@ -0,0 +1,224 @@
+import argparse
+import logging
+import os
+import re
+import threading
+from collections import Counter, namedtuple
+from datetime import datetime, timezone
+
+from catalog_retrieval import CatalogIndex
+from chatbot_prompt import API_KEY_DASHBOARD_URL
+from response_cache import prompt_fingerprint
+
+CANNED_ANSWERS_COLLECTION = "canned_answers"
+
+GENERATOR_TEMPLATE = "template"
+GENERATOR_LLM = "llm"
+
+logger = logging.getLogger("apiman.canned_answers")
+
+# A canned answer is only served when every word of the question, other than
+# the endpoint or API it names, is one of these. "what does /getvideo do" and
+# "how do I call the jokes api" match; "what errors can /getvideo return" has
+# "errors" and "return" left over and goes on to the caches and the LLM.
+QUESTION_WORDS = frozenset((
+    "a", "an", "the", "i", "me", "my", "we", "you", "it", "is", "are", "do", "does", "did", "can", "could",
+    "what", "whats", "what's", "how", "which", "tell", "about", "explain", "describe", "info", "information",
+    "on", "of", "for", "to", "with", "use", "using", "call", "calling", "invoke", "work", "works", "purpose",
+    "endpoint", "endpoints", "api", "apis", "service", "please", "there", "have", "has", "available", "list",
+    "all", "in", "this", "that", "from", "apihub",
+))
+
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9'\-]*")
+_ENDPOINT_RE = re.compile(r"/?([a-z0-9][a-z0-9\-]*)")
+
+CannedAnswer = namedtuple("CannedAnswer", ["key", "api", "endpoint", "question", "answer", "generated_by"])
+
+
+def _api_words(api_name):
+    # "QR Code Generator API" -> ("qr", "code", "generator")
+    return tuple(word for word in _WORD_RE.findall(api_name.lower()) if word != "api")
+
+
+def _template_endpoint_answer(api, endpoint):
+    siblings = [ep for ep in api.endpoints if ep != endpoint]
+    answer = (
+        f"`{endpoint}` is part of the **{api.name}**. What the {api.name} covers: {api.functions}\n\n"
+        f"Send your request to `{endpoint}` with your APIHub API key, which you can get from the "
+        f"[APIHub Key Dashboard]({API_KEY_DASHBOARD_URL})."
+    )
+    if siblings:
+        answer += f"\n\nOther {api.name} endpoints: " + ", ".join(f"`{ep}`" for ep in siblings) + "."
+    return answer
+
+
+def _template_api_answer(api):
+    endpoints = ", ".join(f"`{ep}`" for ep in api.endpoints)
+    return (
+        f"The **{api.name}** offers: {api.functions}\n\n"
+        f"Endpoint{'s' if len(api.endpoints) > 1 else ''}: {endpoints}. Authenticate each request with your "
+        f"APIHub API key from the [APIHub Key Dashboard]({API_KEY_DASHBOARD_URL})."
+    )
+
+
+def catalog_questions(catalog_index):
+    # One entry per API and per endpoint in the prompt's catalog.
+    for api in catalog_index.apis:
+        yield f"api:{api.name.lower()}", api, None, f"What does the {api.name} do and which endpoints does it have?"
+        for endpoint in api.endpoints:
+            yield (
+                f"endpoint:{endpoint.lower()}", api, endpoint,
+                f"What does the {endpoint} endpoint of the {api.name} do and how do I call it?"
+            )
+
+
+def generate_canned_answers(system_prompt, chat_model=None):
+    # Builds the answer set for one prompt. With a chat model each answer is
+    # written by the LLM once, offline; without one it is filled in from the
+    # catalog text, which is all the prompt tells the model anyway.
+    catalog_index = CatalogIndex(system_prompt)
+    answers = []
+    for key, api, endpoint, question in catalog_questions(catalog_index):
+        if chat_model is not None:
+            from langchain_core.messages import HumanMessage, SystemMessage
+            from llm_streaming import invoke_chat_completion
+            answer, _ = invoke_chat_completion(
+                chat_model, [SystemMessage(content=system_prompt), HumanMessage(content=question)]
+            )
+            generated_by = GENERATOR_LLM
+        else:
+            answer = _template_endpoint_answer(api, endpoint) if endpoint else _template_api_answer(api)
+            generated_by = GENERATOR_TEMPLATE
+        answers.append(CannedAnswer(key, api.name, endpoint, question, answer, generated_by))
+    return answers
+
+
+def store_canned_answers(collection, fingerprint, answers):
+    now = datetime.now(timezone.utc)
+    for answer in answers:
+        collection.update_one(
+            {"_id": f"{fingerprint}|{answer.key}"},
+            {"$set": {
+                "fingerprint": fingerprint, "key": answer.key, "api": answer.api, "endpoint": answer.endpoint,
+                "question": answer.question, "answer": answer.answer, "generated_by": answer.generated_by,
+                "generated_at": now,
+            }},
+            upsert=True
+        )
+    # Answers written for an older prompt can never be served again.
+    collection.delete_many({"fingerprint": {"$ne": fingerprint}})
+
+
+def load_canned_answers(collection, fingerprint):
+    return [
+        CannedAnswer(doc["key"], doc["api"], doc.get("endpoint"), doc["question"], doc["answer"], doc["generated_by"])
+        for doc in collection.find({"fingerprint": fingerprint})
+    ]
+
+
+# Serves catalog questions without an LLM call. Answers are keyed by the
+# fingerprint of the system prompt: when the prompt changes, the stored set
+# no longer matches and a fresh one is generated on startup.
+class CannedAnswerMatcher:
+    def __init__(self, system_prompt, collection=None):
+        self.fingerprint = prompt_fingerprint(system_prompt)
+        self.catalog_index = CatalogIndex(system_prompt)
+        answers = []
+        if collection is not None:
+            try:
+                answers = load_canned_answers(collection, self.fingerprint)
+            except Exception as e:
+                logger.warning("could not load canned answers: %s", e)
+        self.regenerated = not answers
+        if not answers:
+            answers = generate_canned_answers(system_prompt)
+            if collection is not None:
+                try:
+                    store_canned_answers(collection, self.fingerprint, answers)
+                except Exception as e:
+                    logger.warning("could not store canned answers: %s", e)
+        self._answers = {answer.key: answer for answer in answers}
+        self._endpoints = {}
+        self._apis = {}
+        for api in self.catalog_index.apis:
+            self._apis[_api_words(api.name)] = f"api:{api.name.lower()}"
+            for endpoint in api.endpoints:
+                self._endpoints[endpoint.lower().lstrip("/")] = f"endpoint:{endpoint.lower()}"
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._lookups = 0
+
+    def _match_key(self, query):
+        words = _WORD_RE.findall(query.lower())
+        keys = set()
+        leftover = []
+        consumed = set()
+        for api_words, key in self._apis.items():
+            for start in range(len(words) - len(api_words) + 1):
+                if tuple(words[start:start + len(api_words)]) == api_words:
+                    keys.add(key)
+                    consumed.update(range(start, start + len(api_words)))
+        for index, word in enumerate(words):
+            endpoint_key = self._endpoints.get(word)
+            if endpoint_key:
+                keys.add(endpoint_key)
+                consumed.add(index)
+            elif index not in consumed:
+                leftover.append(word)
+        endpoint_keys = {key for key in keys if key.startswith("endpoint:")}
+        if len(endpoint_keys) == 1:
+            # "/getweatherdata in the weather api" is still one endpoint.
+            keys = endpoint_keys
+        if len(keys) != 1 or any(word not in QUESTION_WORDS for word in leftover):
+            return None
+        return keys.pop()
+
+    def match(self, query):
+        key = self._match_key(query)
+        answer = self._answers.get(key) if key else None
+        with self._lock:
+            self._lookups += 1
+            if answer is not None:
+                self._counts[answer.key] += 1
+        return answer.answer if answer is not None else None
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self._counts.values())
+            return {
+                "lookups": self._lookups,
+                "hits": hits,
+                "hit_rate": hits / self._lookups if self._lookups else 0.0,
+                "entries": len(self._answers),
+                "fingerprint": self.fingerprint,
+                "regenerated": self.regenerated,
+                "top_answers": self._counts.most_common(5),
+            }
+
+
+def main():
+    # Build step: python canned_answers.py [--llm]. Without --llm the answers
+    # come from the catalog text; the engine also does that on its own when it
+    # finds no answers for the current prompt.
+    from dotenv import load_dotenv
+    from chatbot_prompt import SYSTEM_PROMPT
+    from mongo_connection import get_database
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Generate canned answers for every API and endpoint in the catalog.")
+    parser.add_argument("--llm", action="store_true", help="write each answer with the configured chat model")
+    args = parser.parse_args()
+
+    chat_model = None
+    if args.llm:
+        from llm_providers import create_chat_model
+        chat_model = create_chat_model(os.getenv("GROQ_MODEL", "llama3-8b-8192"), os.getenv("GROQ_API_KEY"))
+    fingerprint = prompt_fingerprint(SYSTEM_PROMPT)
+    answers = generate_canned_answers(SYSTEM_PROMPT, chat_model=chat_model)
+    collection = get_database(os.getenv("MONGODB_URI"))[CANNED_ANSWERS_COLLECTION]
+    store_canned_answers(collection, fingerprint, answers)
+    print(f"Stored {len(answers)} canned answers for prompt {fingerprint}.")
+
+
+if __name__ == "__main__":
+    main()
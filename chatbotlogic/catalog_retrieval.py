@@ -0,0 +1,134 @@
+import math
+import os
+import re
+from collections import Counter, namedtuple
+
+DEFAULT_TOP_K = int(os.getenv("CATALOG_TOP_K", "3"))
+
+CATALOG_START_MARKER = "Only answer questions about these APIHub services:"
+CATALOG_END_MARKER = "Response Rules"
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Hits scoring below this fraction of the best hit are dropped as noise.
+MIN_RELATIVE_SCORE = 0.3
+
+STOPWORDS = frozenset((
+    "a", "an", "the", "i", "me", "my", "you", "your", "it", "is", "are", "do", "does", "how", "what", "can",
+    "to", "for", "of", "on", "in", "with", "and", "or", "from", "by", "about", "this", "that", "api",
+))
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+CatalogDocument = namedtuple("CatalogDocument", ["doc_id", "api", "endpoint", "text"])
+CatalogApi = namedtuple("CatalogApi", ["name", "endpoints", "functions", "block"])
+
+
+def _terms(text):
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def split_system_prompt(system_prompt):
+    start = system_prompt.index(CATALOG_START_MARKER) + len(CATALOG_START_MARKER)
+    end = system_prompt.index(CATALOG_END_MARKER, start)
+    return system_prompt[:start], system_prompt[start:end], system_prompt[end:]
+
+
+def parse_catalog(catalog_text):
+    apis = []
+    for block in re.split(r"\n\s*\n", catalog_text.strip()):
+        lines = [line.strip() for line in block.strip().splitlines() if line.strip()]
+        if not lines:
+            continue
+        fields = {}
+        for line in lines[1:]:
+            key, _, value = line.partition(":")
+            fields[key.strip().lower().rstrip("s")] = value.strip()
+        endpoints = [ep.strip() for ep in fields.get("endpoint", "").split(",") if ep.strip()]
+        apis.append(CatalogApi(lines[0], endpoints, fields.get("function", ""), "\n".join(lines)))
+    return apis
+
+
+class CatalogIndex:
+    def __init__(self, system_prompt, top_k=DEFAULT_TOP_K):
+        self.top_k = top_k
+        self.preamble, catalog_text, self.rules = split_system_prompt(system_prompt)
+        self.apis = parse_catalog(catalog_text)
+        self.full_catalog = "\n\n".join(api.block for api in self.apis)
+        self.documents = []
+        for api in self.apis:
+            self.documents.append(CatalogDocument(len(self.documents), api.name, None, api.block))
+            for endpoint in api.endpoints:
+                # Endpoint names are compound words; index "/getweatherdata" under
+                # the API's own vocabulary too so "weather" finds it.
+                text = f"{api.name}\nEndpoint: {endpoint}\nFunction: {api.functions}"
+                self.documents.append(CatalogDocument(len(self.documents), api.name, endpoint, text))
+        self._term_freqs = [Counter(_terms(doc.text)) for doc in self.documents]
+        self._doc_lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = sum(self._doc_lengths) / len(self._doc_lengths) if self.documents else 0.0
+        doc_freq = Counter(term for tf in self._term_freqs for term in tf)
+        n_docs = len(self.documents)
+        self._idf = {
+            term: math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    def score(self, query):
+        query_terms = _terms(query)
+        scores = []
+        for doc, tf, length in zip(self.documents, self._term_freqs, self._doc_lengths):
+            score = 0.0
+            for term in query_terms:
+                freq = tf.get(term)
+                if not freq:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self._avg_length)
+                score += self._idf[term] * freq * (BM25_K1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+
+    def search(self, query, top_k=None):
+        scores = self.score(query)
+        ranked = sorted(
+            ((score, doc) for score, doc in zip(scores, self.documents) if score > 0),
+            key=lambda pair: (-pair[0], pair[1].doc_id)
+        )
+        if not ranked:
+            return []
+        cutoff = ranked[0][0] * MIN_RELATIVE_SCORE
+        return [pair for pair in ranked[:top_k or self.top_k] if pair[0] >= cutoff]
+
+    def render_sections(self, hits):
+        # An API-level hit, or several endpoint hits on one API, sends that API's
+        # whole block; a single endpoint hit sends just that endpoint.
+        endpoints_by_api = {}
+        for _, doc in hits:
+            if doc.endpoint is not None:
+                endpoints_by_api.setdefault(doc.api, []).append(doc.endpoint)
+        whole_apis = {doc.api for _, doc in hits if doc.endpoint is None}
+        whole_apis.update(api for api, endpoints in endpoints_by_api.items() if len(endpoints) > 1)
+        sections = []
+        for api in self.apis:
+            if api.name in whole_apis:
+                sections.append(api.block)
+            elif api.name in endpoints_by_api:
+                sections.append(
+                    f"{api.name}\nEndpoint: {', '.join(endpoints_by_api[api.name])}\nFunction: {api.functions}"
+                )
+        return sections
+
+    def build_system_prompt(self, query):
+        hits = self.search(query)
+        if not hits:
+            # Nothing in the catalog matched (e.g. a generic auth question), so
+            # the model gets the whole catalog as before.
+            return self.preamble + "\n\n" + self.full_catalog + "\n\n" + self.rules, []
+        sections = self.render_sections(hits)
+        return self.preamble + "\n\n" + "\n\n".join(sections) + "\n\n" + self.rules, [doc.endpoint or doc.api for _, doc in hits]
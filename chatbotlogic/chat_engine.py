@@ -0,0 +1,469 @@
+import logging
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import pandas as pd
+from langchain_core.messages import SystemMessage
+
+from canned_answers import CannedAnswerMatcher, CANNED_ANSWERS_COLLECTION
+from catalog_retrieval import CatalogIndex
+from chatbot_prompt import API_KEY_DASHBOARD_URL, SYSTEM_PROMPT
+from context_builder import build_context, context_fingerprint, KIND_CHAT, KIND_COMMAND, DEFAULT_TOKEN_BUDGET
+from intent_router import (
+    resolve_intent, INTENT_SHOW_TICKETS, INTENT_SHOW_STATS, INTENT_SHOW_CONTACT, INTENT_GET_API_KEY,
+    INTENT_SHOW_API_KEYS, INTENT_SHOW_HELP, INTENT_NEW_TICKET
+)
+from llm_providers import create_chat_model, DEFAULT_PROVIDER
+from llm_resilience import ResilientChatModel, LLMUnavailableError, DEGRADED_REPLY
+from llm_streaming import stream_chat_completion, invoke_chat_completion
+from mongo_connection import get_database
+from notification_coalescer import NotificationCoalescer, DEFAULT_WINDOW_SECONDS, DEFAULT_MAX_PER_MINUTE
+from notifications import create_twilio_client, WhatsAppSender
+from prompt_tokens import count_tokens, count_message_tokens, EXACT_COUNTS
+from query_router import QueryRouter, ROUTE_CANNED, ROUTE_TICKET, DEFAULT_CONFIDENCE_THRESHOLD
+from rate_limiter import RateLimiter, RateLimitExceeded
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache, DEFAULT_SIMILARITY_THRESHOLD, DEFAULT_CACHE_DIR
+from session_store import SessionStore, ensure_session_indexes, SESSIONS_COLLECTION
+from single_flight import SingleFlight, prompt_key
+from telemetry import (
+    Telemetry, ensure_metrics_indexes, METRICS_COLLECTION, STAGE_TURN, STAGE_INTENT, STAGE_ROUTING, STAGE_CANNED_ANSWER,
+    STAGE_CACHE, STAGE_CONTEXT, STAGE_LLM, STAGE_TICKET_INSERT,
+)
+from ticket_dedup import TicketDeduplicator
+from ticket_outbox import OutboxWorker, new_ticket_document, ensure_outbox_indexes
+
+logger = logging.getLogger("apiman.chatbot")
+
+# While the breaker is open a looser paraphrase match beats no answer at all.
+DEGRADED_SIMILARITY_THRESHOLD = 0.6
+
+ACTION_REPLY = "reply"
+ACTION_SHOW_API_KEYS = "show_api_keys"
+ACTION_NEW_TICKET_FORM = "new_ticket_form"
+
+SOURCE_COMMAND = "command"
+SOURCE_CANNED = "canned"
+SOURCE_CATALOG = "catalog"
+SOURCE_TICKET = "ticket"
+SOURCE_CACHE = "cache"
+SOURCE_LLM = "llm"
+SOURCE_RATE_LIMITED = "rate_limited"
+SOURCE_DEGRADED = "degraded"
+SOURCE_ERROR = "error"
+
+HELP_MARKDOWN = """
+### APIMAN Commands:
+You can ask me to:
+- `show recent support tickets` or `show tickets`: See a list of your latest support tickets.
+- `show api usage statistics` or `show api stats`: Get an overview of your API consumption.
+- `show contact information` or `show contact`: Find ways to reach our support team.
+- `apikey` or `get api key`: Get your APIHub API key.
+- `show api keys` or `my api keys`: View the API keys you have stored with APIMAN.
+- `create manual support ticket` or `new ticket`: Open a form to submit a detailed support ticket.
+- And of course, ask any question about APIHub endpoints, authentication, rate limits, errors, and data formats!
+"""
+
+_TRUE_VALUES = ("1", "true", "yes")
+
+EngineSettings = namedtuple("EngineSettings", [
+    "mongo_uri", "groq_api_key", "groq_model", "groq_fallback_model", "llm_provider", "llm_streaming",
+    "twilio_account_sid", "twilio_auth_token", "twilio_number", "support_phone_number", "twilio_fake",
+    "notify_coalesce_window_seconds", "notify_max_per_minute", "response_cache_shared",
+    "semantic_cache_threshold", "semantic_cache_dir", "router_confidence_threshold", "context_token_budget",
+])
+
+TurnResult = namedtuple(
+    "TurnResult", ["reply", "kind", "intent", "action", "source", "ticket_id", "seconds", "ticket_merged"]
+)
+# merged: the request was a duplicate and was added to the open ticket_id
+# instead of opening a new one (see ticket_dedup.py).
+TicketOutcome = namedtuple("TicketOutcome", ["ticket_id", "merged"])
+
+
+def _env_lookup(key, default=None):
+    return os.getenv(key) or default
+
+
+def load_settings(lookup=_env_lookup, **overrides):
+    # `lookup(key, default)` lets the Streamlit page fall back to st.secrets.
+    def flag(key, default):
+        return str(lookup(key, default)).lower() in _TRUE_VALUES
+
+    settings = EngineSettings(
+        mongo_uri=lookup("MONGODB_URI"),
+        groq_api_key=lookup("GROQ_API_KEY"),
+        groq_model=lookup("GROQ_MODEL", "llama3-8b-8192"),
+        groq_fallback_model=lookup("GROQ_FALLBACK_MODEL", ""),
+        llm_provider=str(lookup("LLM_PROVIDER", DEFAULT_PROVIDER)).lower(),
+        llm_streaming=flag("LLM_STREAMING", "true"),
+        twilio_account_sid=lookup("TWILIO_ACCOUNT_SID"),
+        twilio_auth_token=lookup("TWILIO_AUTH_TOKEN"),
+        twilio_number=lookup("TWILIO_NUMBER"),
+        support_phone_number=lookup("SUPPORT_PHONE_NUMBER"),
+        twilio_fake=flag("TWILIO_FAKE", "false"),
+        notify_coalesce_window_seconds=float(lookup("NOTIFY_COALESCE_WINDOW_SECONDS", DEFAULT_WINDOW_SECONDS)),
+        notify_max_per_minute=int(lookup("NOTIFY_MAX_PER_MINUTE", DEFAULT_MAX_PER_MINUTE)),
+        response_cache_shared=flag("RESPONSE_CACHE_SHARED", "true"),
+        semantic_cache_threshold=float(lookup("SEMANTIC_CACHE_THRESHOLD", DEFAULT_SIMILARITY_THRESHOLD)),
+        semantic_cache_dir=lookup("SEMANTIC_CACHE_DIR", DEFAULT_CACHE_DIR),
+        router_confidence_threshold=float(lookup("ROUTER_CONFIDENCE_THRESHOLD", DEFAULT_CONFIDENCE_THRESHOLD)),
+        context_token_budget=int(lookup("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+    )
+    return settings._replace(**overrides)
+
+
+def _recent_tickets_markdown(tickets):
+    markdown_output = "### Recent Support Tickets\n"
+    if tickets:
+        ticket_records = []
+        for t in tickets:
+            subject = t["title"].split('\n')[0]
+            if len(subject) > 50:
+                subject = subject[:47] + "..."
+            ticket_records.append({
+                "ID": str(t["_id"])[-6:],
+                "Subject": subject,
+                "Status": t["status"].capitalize(),
+                "Created": datetime.fromisoformat(t["created_at"]).strftime("%Y-%m-%d %H:%M")
+            })
+        markdown_output += pd.DataFrame(ticket_records).to_markdown(index=False)
+    else:
+        markdown_output += "No open tickets found in the database.\n"
+    return markdown_output
+
+
+def _api_stats_markdown():
+    markdown_output = "### API Usage Statistics\n"
+    markdown_output += "Insights into your API consumption (mock data):\n\n"
+    markdown_output += "**Total Requests (24h):** 1,245,678\n"
+    markdown_output += "**Avg Latency (ms):** 75\n\n"
+    markdown_output += "#### Daily Request Volume\n"
+    chart_data = pd.DataFrame(
+        {
+            "Date": pd.to_datetime(pd.date_range(end=datetime.now(), periods=7, freq='D')),
+            "Requests": [1500, 1800, 2200, 1900, 2500, 2300, 2700],
+        }
+    )
+    markdown_output += "```\n"
+    markdown_output += "Date          Requests\n"
+    markdown_output += "----------  ----------\n"
+    for index, row in chart_data.iterrows():
+        markdown_output += f"{row['Date'].strftime('%Y-%m-%d')}  {row['Requests']}\n"
+    markdown_output += "```\n"
+    return markdown_output
+
+
+def _contact_info_markdown():
+    markdown_output = "### APIHUB Contact Info\n"
+    markdown_output += "- whatsapp community: https://chat.whatsapp.com/J8iljiMAZcvB58RS9GYwjH\n"
+    markdown_output += "- discord community: https://discord.com/invite/Fj28zvaz\n"
+    markdown_output += "- linkedin: https://www.linkedin.com/in/apihub/\n\n"
+    markdown_output += "### APIMAN Contact Info\n"
+    markdown_output += "- email: apimancompany@gmail.com\n"
+    return markdown_output
+
+
+# Everything a chat turn needs (routing, caches, prompt assembly, the guarded
+# LLM call, ticket escalation) behind handle_turn(). One engine per process is
+# shared by every session; the Streamlit page and the ASGI server are both
+# thin clients of it.
+class ChatEngine:
+    def __init__(self, settings, db=None, chat_model=None, twilio_client=None, rate_limiter=None,
+                 system_prompt=SYSTEM_PROMPT):
+        self.settings = settings
+        self.system_prompt = system_prompt
+        self.db = db if db is not None else get_database(settings.mongo_uri)
+        self.tickets_collection = self.db["support_tickets"]
+        self.api_keys_collection = self.db["user_api_keys"]
+
+        metrics_collection = self.db[METRICS_COLLECTION]
+        try:
+            ensure_metrics_indexes(metrics_collection)
+        except Exception as e:
+            logger.warning("could not create metrics indexes: %s", e)
+        self.telemetry = Telemetry(metrics_collection).start()
+
+        if chat_model is None:
+            primary = create_chat_model(settings.groq_model, settings.groq_api_key, provider=settings.llm_provider)
+            fallback = (
+                create_chat_model(settings.groq_fallback_model, settings.groq_api_key, provider=settings.llm_provider)
+                if settings.groq_fallback_model else None
+            )
+            chat_model = ResilientChatModel(primary, fallback=fallback)
+        self.chat_model = chat_model
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.single_flight = SingleFlight()
+        self.query_router = QueryRouter(confidence_threshold=settings.router_confidence_threshold)
+        self.response_cache = ResponseCache(
+            system_prompt,
+            collection=self.db["llm_response_cache"] if settings.response_cache_shared else None
+        )
+        self.semantic_cache = SemanticCache(
+            system_prompt, cache_dir=settings.semantic_cache_dir, similarity_threshold=settings.semantic_cache_threshold
+        ).start()
+        self.catalog_index = CatalogIndex(system_prompt)
+        self.canned_answers = CannedAnswerMatcher(system_prompt, collection=self.db[CANNED_ANSWERS_COLLECTION])
+
+        if twilio_client is None:
+            try:
+                twilio_client = create_twilio_client(
+                    settings.twilio_account_sid, settings.twilio_auth_token, use_fake=settings.twilio_fake
+                )
+            except Exception as e:
+                logger.warning("Twilio client unavailable; notifications will be retried: %s", e)
+        self.twilio_client = twilio_client
+        sender = WhatsAppSender(twilio_client, settings.twilio_number, settings.support_phone_number)
+        try:
+            ensure_outbox_indexes(self.tickets_collection)
+        except Exception as e:
+            logger.warning("could not create outbox index: %s", e)
+        coalescer = NotificationCoalescer(
+            window_seconds=settings.notify_coalesce_window_seconds, max_per_minute=settings.notify_max_per_minute
+        )
+        self.outbox_worker = OutboxWorker(
+            self.tickets_collection, sender, coalescer=coalescer, telemetry=self.telemetry
+        ).start()
+        self.ticket_deduplicator = TicketDeduplicator(self.tickets_collection)
+
+        sessions_collection = self.db[SESSIONS_COLLECTION]
+        try:
+            ensure_session_indexes(sessions_collection)
+        except Exception as e:
+            logger.warning("could not create chat session indexes: %s", e)
+        self.session_store = SessionStore(sessions_collection).start()
+
+    def open_session(self, session_id=None):
+        return self.session_store.open(session_id)
+
+    def close(self):
+        self.session_store.stop()
+        self.outbox_worker.stop()
+        self.semantic_cache.stop()
+        self.telemetry.stop()
+
+    def create_support_ticket(self, title, description, contact_info="anonymous user"):
+        # -> TicketOutcome, or None if the ticket could not be stored.
+        try:
+            with self.telemetry.span(STAGE_TICKET_INSERT):
+                existing_ticket_id = self.ticket_deduplicator.attach_if_duplicate(title, description, contact_info)
+                if existing_ticket_id:
+                    return TicketOutcome(str(existing_ticket_id), True)
+                result = self.tickets_collection.insert_one(new_ticket_document(title, description, contact_info))
+                self.ticket_deduplicator.add(result.inserted_id, title, description)
+            self.outbox_worker.wake()
+            return TicketOutcome(str(result.inserted_id), False)
+        except Exception as e:
+            logger.error("failed to create support ticket: %s", e)
+            return None
+
+    def store_api_key(self, user_id, api_key):
+        self.api_keys_collection.update_one(
+            {"user_id": user_id},
+            {"$set": {"api_key": api_key, "updated_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+
+    def get_user_api_keys(self, user_id):
+        return [record["api_key"] for record in self.api_keys_collection.find({"user_id": user_id})]
+
+    def get_open_tickets(self):
+        return list(self.tickets_collection.find({"status": "open"}).sort("created_at", -1))
+
+    def _command_reply(self, intent_name):
+        if intent_name == INTENT_SHOW_TICKETS:
+            try:
+                return _recent_tickets_markdown(self.get_open_tickets())
+            except Exception as e:
+                return f"### Recent Support Tickets\nCould not load recent tickets: {e}\n"
+        if intent_name == INTENT_SHOW_STATS:
+            return _api_stats_markdown()
+        if intent_name == INTENT_SHOW_CONTACT:
+            return _contact_info_markdown()
+        if intent_name == INTENT_GET_API_KEY:
+            return f"You can get your API key here: [APIHub Key Dashboard]({API_KEY_DASHBOARD_URL})"
+        return HELP_MARKDOWN
+
+    def find_cached_answer(self, query, context=""):
+        # The semantic cache matches on the question alone, so it only serves
+        # questions that open a conversation.
+        with self.telemetry.span(STAGE_CACHE):
+            cached_response = self.response_cache.get(query, context)
+            if cached_response is None and not context:
+                cached_response = self.semantic_cache.get(query)
+                if cached_response is not None:
+                    self.response_cache.put(query, cached_response)
+        return cached_response
+
+    def handle_turn(self, session, message, on_text=None):
+        # Appends the user message and the reply to session.history. When
+        # on_text is given and streaming is enabled, partial LLM output is
+        # pushed to it as it arrives.
+        turn_started = time.perf_counter()
+        with session.lock:
+            session.history.append({"role": "user", "content": message})
+            query = message.lower().strip()
+            with self.telemetry.span(STAGE_INTENT):
+                intent = resolve_intent(query)
+            intent_name = intent.intent if intent else None
+            action, kind, ticket = ACTION_REPLY, KIND_COMMAND, None
+
+            if intent_name == INTENT_SHOW_API_KEYS:
+                action, source, reply = ACTION_SHOW_API_KEYS, SOURCE_COMMAND, "Opening your stored API keys."
+            elif intent_name == INTENT_NEW_TICKET:
+                action, source = ACTION_NEW_TICKET_FORM, SOURCE_COMMAND
+                reply = "Alright, please fill out the details for your support ticket."
+            elif intent_name in (INTENT_SHOW_TICKETS, INTENT_SHOW_STATS, INTENT_SHOW_CONTACT,
+                                 INTENT_GET_API_KEY, INTENT_SHOW_HELP):
+                source, reply = SOURCE_COMMAND, self._command_reply(intent_name)
+            else:
+                kind = KIND_CHAT
+                try:
+                    reply, source, ticket = self._answer(session, query, intent, on_text)
+                except Exception as e:
+                    logger.exception("chat turn failed")
+                    title = "AI Chatbot Failure: " + (query[:30] + "..." if len(query) > 30 else query)
+                    ticket = self.create_support_ticket(title, f"Error while processing: {query}\n\nError: {e}")
+                    source = SOURCE_ERROR
+                    if ticket is None:
+                        reply = ""
+                    elif ticket.merged:
+                        reply = f"An error occurred. It was added to the open support ticket #{ticket.ticket_id}."
+                    else:
+                        reply = "An error occurred. A support ticket has been created."
+
+            seconds = time.perf_counter() - turn_started
+            self.telemetry.record(STAGE_TURN, seconds)
+            session.history.append({"role": "assistant", "content": reply, "kind": kind})
+        self.session_store.save(session)
+        return TurnResult(
+            reply, kind, intent_name, action, source,
+            ticket.ticket_id if ticket else None, seconds, bool(ticket and ticket.merged)
+        )
+
+    def _answer(self, session, query, intent, on_text):
+        with self.telemetry.span(STAGE_ROUTING):
+            route = self.query_router.route(query, intent=intent)
+        if route.action == ROUTE_CANNED:
+            return route.reply, SOURCE_CANNED, None
+        if route.action == ROUTE_TICKET:
+            title = "Non-API Question: " + (query[:50] + "..." if len(query) > 50 else query)
+            ticket = self.create_support_ticket(title, query)
+            if ticket is None:
+                return "I cannot resolve this. Please contact support directly.", SOURCE_TICKET, None
+            if ticket.merged:
+                reply = f"I cannot resolve this. Your question was added to the open support ticket #{ticket.ticket_id}."
+                return reply, SOURCE_TICKET, ticket
+            return "I cannot resolve this. A support ticket has been created.", SOURCE_TICKET, ticket
+        match_started = time.perf_counter()
+        canned_answer = self.canned_answers.match(query)
+        if canned_answer is not None:
+            self.telemetry.record(STAGE_CANNED_ANSWER, time.perf_counter() - match_started)
+            return canned_answer, SOURCE_CATALOG, None
+        context = context_fingerprint(session.history)
+        cached_response = self.find_cached_answer(query, context)
+        if cached_response is not None:
+            return cached_response, SOURCE_CACHE, None
+        return self._ask_model(session, query, context, on_text)
+
+    def _build_messages(self, session):
+        # -> (messages, prompt token breakdown for _record_prompt_tokens)
+        with self.telemetry.span(STAGE_CONTEXT):
+            retrieval_query = " ".join(msg["content"] for msg in session.history[-3:] if msg["role"] == "user")
+            system_prompt, catalog_sections = self.catalog_index.build_system_prompt(retrieval_query)
+            context = build_context(session.history, token_budget=self.settings.context_token_budget)
+            messages = [SystemMessage(content=system_prompt)] + context.messages
+
+        prompt_tokens = count_message_tokens(messages)
+        full_catalog_tokens = prompt_tokens - count_tokens(system_prompt) + count_tokens(self.system_prompt)
+        return messages, {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "catalog_sections": catalog_sections,
+            "tokens_full_catalog": full_catalog_tokens,
+            "tokens_sent": prompt_tokens,
+            "history_tokens": context.tokens_used,
+            "history_tokens_saved": context.tokens_saved,
+            "summarized_turns": context.summarized_turns,
+            "dropped_commands": context.dropped_commands,
+        }
+
+    def _record_prompt_tokens(self, session, prompt):
+        session.prompt_token_log.append(prompt)
+        logger.info(
+            "prompt tokens%s: %d with full catalog, %d sent (sections: %s); history %d tokens, "
+            "%d saved (%d turns summarized, %d command outputs dropped)",
+            "" if EXACT_COUNTS else " (approximate)", prompt["tokens_full_catalog"], prompt["tokens_sent"],
+            ", ".join(prompt["catalog_sections"]) or "full catalog", prompt["history_tokens"],
+            prompt["history_tokens_saved"], prompt["summarized_turns"], prompt["dropped_commands"]
+        )
+
+    def _ask_model(self, session, query, context, on_text):
+        messages, prompt = self._build_messages(session)
+
+        # Each caller is charged against its own session and the global
+        # budget; only the flight's leader waits for a provider slot.
+        decision = self.rate_limiter.check(session.session_id)
+        if not decision.allowed:
+            return RateLimitExceeded(decision).reply, SOURCE_RATE_LIMITED, None
+
+        def run_completion():
+            with self.rate_limiter.slot():
+                if on_text is not None and self.settings.llm_streaming:
+                    return stream_chat_completion(self.chat_model, messages, on_text=on_text)
+                return invoke_chat_completion(self.chat_model, messages)
+
+        try:
+            # Sessions asking the same question at the same moment wait on one
+            # provider call instead of each making their own.
+            with self.telemetry.span(STAGE_LLM):
+                (reply, timing), coalesced = self.single_flight.do(prompt_key(messages), run_completion)
+        except RateLimitExceeded as e:
+            # Only the provider queue can refuse here; the turn never ran.
+            self.rate_limiter.refund(session.session_id)
+            return e.reply, SOURCE_RATE_LIMITED, None
+        except LLMUnavailableError as e:
+            # Provider outage: answer from the cache or with a canned reply
+            # rather than opening one ticket per message.
+            logger.warning("chat model unavailable, serving degraded reply: %s", e)
+            stale_response = None
+            if not context:
+                stale_response, _ = self.semantic_cache.lookup(query, similarity_threshold=DEGRADED_SIMILARITY_THRESHOLD)
+            return stale_response or DEGRADED_REPLY, SOURCE_DEGRADED, None
+
+        # Only prompts that reached the provider count toward the token figures.
+        self._record_prompt_tokens(session, prompt)
+        session.llm_timings.append({
+            "at": datetime.now(timezone.utc).isoformat(),
+            "streamed": timing.streamed,
+            "coalesced": coalesced,
+            "ttft_ms": round(timing.time_to_first_token * 1000, 1),
+            "total_ms": round(timing.total_seconds * 1000, 1),
+        })
+        if not coalesced:
+            self.response_cache.put(query, reply, context)
+            if not context:
+                self.semantic_cache.put(query, reply)
+        return reply, SOURCE_LLM, None
+
+    def stats(self):
+        stages = self.telemetry.stage_summaries()
+        canned_stats = self.canned_answers.stats()
+        turns = stages.get(STAGE_TURN, {}).get("count", 0)
+        canned_stats["traffic_share"] = canned_stats["hits"] / turns if turns else 0.0
+        return {
+            "router": self.query_router.stats(),
+            "canned_answers": canned_stats,
+            "response_cache": self.response_cache.stats(),
+            "semantic_cache": self.semantic_cache.stats(),
+            "outbox": self.outbox_worker.stats(),
+            "ticket_dedup": self.ticket_deduplicator.stats(),
+            "rate_limiter": self.rate_limiter.stats(),
+            "single_flight": self.single_flight.stats(),
+            "llm": self.chat_model.stats(),
+            "telemetry": self.telemetry.stats(),
+            "sessions": self.session_store.stats(),
+            "stages": stages,
+        }
+
@@ -0,0 +1,88 @@
+import html
+import os
+import re
+import threading
+import time
+
+DEFAULT_RENDER_WINDOW = int(os.getenv("CHAT_RENDER_WINDOW", "20"))
+
+# Fenced blocks and inline code spans, which markdown shows as literal text.
+_CODE_RE = re.compile(r"(```.*?```|~~~.*?~~~|`[^`\n]+`)", re.DOTALL)
+# Entities are not decoded inside code, so "<" there is kept visible but
+# followed by a zero-width space, which no HTML or markdown parser reads as
+# the start of a tag.
+_CODE_TAG_OPEN = "<\u200b"
+
+# Blank lines around the body end the surrounding HTML blocks, so the body is
+# still parsed as markdown while sitting inside the bubble.
+USER_BUBBLE = (
+    '<div class="chat-message chat-message-user"><div class="message-bubble">'
+    '<strong>You:</strong> {body}</div><div class="chat-avatar user-avatar">U</div></div>'
+)
+ASSISTANT_BUBBLE = (
+    '<div class="chat-message chat-message-assistant"><div class="chat-avatar assistant-avatar">A</div>'
+    '<div class="message-bubble">\n\n{body}\n\n</div></div>'
+)
+
+
+def sanitize_assistant_markdown(text):
+    # Replies come from the model, the shared response cache and stored
+    # sessions and end up in an unsafe_allow_html element, so no raw HTML may
+    # survive: it is escaped like user messages, and code is neutralized
+    # without entities. Even a span taken for code by mistake stays inert.
+    parts = _CODE_RE.split(text or "")
+    return "".join(
+        part.replace("<", _CODE_TAG_OPEN) if index % 2 else html.escape(part, quote=False)
+        for index, part in enumerate(parts)
+    )
+
+
+def render_user_message(content):
+    return USER_BUBBLE.format(body=html.escape(content or ""))
+
+
+def render_assistant_message(content):
+    return ASSISTANT_BUBBLE.format(body=sanitize_assistant_markdown(content).strip())
+
+
+def render_message(msg):
+    if msg.get("role") == "user":
+        return render_user_message(msg.get("content"))
+    return render_assistant_message(msg.get("content"))
+
+
+# Keeps one pre-rendered HTML fragment per history message. sync() renders
+# only messages appended since the previous call, so a rerun costs the same
+# whether the conversation has ten messages or a thousand; window() joins the
+# newest fragments into a single markdown element.
+class ChatRenderer:
+    def __init__(self):
+        self._fragments = []
+        self._lock = threading.Lock()
+        self._counters = {"rendered": 0, "resets": 0}
+
+    def sync(self, history):
+        started = time.perf_counter()
+        with self._lock:
+            if len(history) < len(self._fragments):
+                # History was replaced (e.g. a different session); start over.
+                self._fragments = []
+                self._counters["resets"] += 1
+            new_messages = history[len(self._fragments):]
+            self._fragments.extend(render_message(msg) for msg in new_messages)
+            self._counters["rendered"] += len(new_messages)
+        return time.perf_counter() - started
+
+    def window(self, size=DEFAULT_RENDER_WINDOW, extra=()):
+        # Returns (number of older messages left out, HTML for the newest
+        # `size` messages followed by any extra fragments).
+        with self._lock:
+            hidden = max(0, len(self._fragments) - size)
+            fragments = self._fragments[hidden:]
+        return hidden, "\n\n".join(list(fragments) + list(extra))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["cached_fragments"] = len(self._fragments)
+        return stats
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from chat_engine import ChatEngine, load_settings
+from session_store import sign_session_id, verify_session_token
+from telemetry import configure_logging
+
+load_dotenv()
+configure_logging()
+
+# Headless HTTP front end for the chat engine, written against bare ASGI so it
+# needs no web framework. Run several worker processes behind one port with:
+#
+#   uvicorn chat_server:app --workers 4 --timeout-keep-alive 30
+#
+# Each worker builds one engine, so the Mongo pool, the provider client and the
+# caches are reused across every request and keep-alive connection it serves.
+# Chat history lives in the engine's session store, so no sticky routing is
+# needed between workers or hosts.
+#
+#   POST /v1/chat   {"session_id": "...", "message": "..."} -> {"reply": ..., ...}
+#                   session_id is the signed token a previous reply returned
+#                   (the same format as the chat page's ?sid=); leave it out
+#                   to start a new conversation.
+#   GET  /v1/stats  engine and session counters for this worker
+#   GET  /healthz
+
+logger = logging.getLogger("apiman.chat_server")
+
+DEFAULT_TURN_WORKERS = int(os.getenv("CHAT_SERVER_TURN_WORKERS", "32"))
+MAX_MESSAGE_CHARS = 4000
+MAX_BODY_BYTES = 64 * 1024
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class ChatServer:
+    def __init__(self, engine_factory=None, turn_workers=DEFAULT_TURN_WORKERS, session_secret=None):
+        self.engine_factory = engine_factory or (lambda: ChatEngine(load_settings()))
+        self.engine = None
+        self.session_secret = session_secret or os.getenv("CHAT_SESSION_SECRET")
+        if not self.session_secret:
+            # Tokens then only work on this worker until it restarts.
+            logger.warning("CHAT_SESSION_SECRET is not set; using a random per-process secret")
+            self.session_secret = uuid.uuid4().hex
+        # handle_turn blocks on Mongo and the provider, so turns run on a pool
+        # sized to the expected in-flight turns rather than the event loop.
+        self.executor = ThreadPoolExecutor(max_workers=turn_workers, thread_name_prefix="chat-turn")
+
+    def startup(self):
+        if self.engine is None:
+            self.engine = self.engine_factory()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        if self.engine is not None:
+            self.engine.close()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            status, payload = await self._dispatch(scope, receive)
+            await _send_json(send, status, payload)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.startup()
+                except Exception as e:
+                    logger.exception("chat engine failed to start")
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _dispatch(self, scope, receive):
+        method, path = scope["method"], scope["path"]
+        if path == "/healthz" and method == "GET":
+            return 200, {"status": "ok" if self.engine is not None else "starting"}
+        if self.engine is None:
+            return 503, {"error": "engine not started"}
+        if path == "/v1/stats" and method == "GET":
+            return 200, self.engine.stats()
+        if path == "/v1/chat":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            return await self._chat(receive)
+        return 404, {"error": "not found"}
+
+    async def _chat(self, receive):
+        try:
+            body = json.loads(await _read_body(receive))
+        except BodyTooLarge:
+            return 413, {"error": f"request body larger than {MAX_BODY_BYTES} bytes"}
+        except ValueError as e:
+            return 400, {"error": f"invalid request body: {e}"}
+        if not isinstance(body, dict):
+            return 400, {"error": "request body must be a JSON object"}
+        token, message = body.get("session_id"), body.get("message")
+        if token is not None and not isinstance(token, str):
+            return 400, {"error": "session_id must be a string"}
+        if not isinstance(message, str) or not message.strip():
+            return 400, {"error": "message is required"}
+        message = message.strip()
+        if token:
+            session_id = verify_session_token(token, self.session_secret)
+            if session_id is None:
+                return 403, {"error": "invalid session_id"}
+        else:
+            session_id = uuid.uuid4().hex
+        if len(message) > MAX_MESSAGE_CHARS:
+            return 413, {"error": f"message longer than {MAX_MESSAGE_CHARS} characters"}
+
+        loop = asyncio.get_running_loop()
+        session = await loop.run_in_executor(self.executor, self.engine.open_session, session_id)
+        result = await loop.run_in_executor(self.executor, self.engine.handle_turn, session, message)
+        return 200, {
+            "session_id": sign_session_id(session.session_id, self.session_secret),
+            "reply": result.reply,
+            "kind": result.kind,
+            "intent": result.intent,
+            "action": result.action,
+            "source": result.source,
+            "ticket_id": result.ticket_id,
+            "ticket_merged": result.ticket_merged,
+            "elapsed_ms": round(result.seconds * 1000, 1),
+        }
+
+
+async def _read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks) or b"{}"
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+app = ChatServer()
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import re
+from collections import namedtuple
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from prompt_tokens import count_tokens, MESSAGE_OVERHEAD_TOKENS
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+DEFAULT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "12"))
+# The fixed window the page used before the builder existed; tokens saved are
+# reported against it.
+LEGACY_WINDOW = 5
+
+KIND_CHAT = "chat"
+KIND_COMMAND = "command"
+
+COMMAND_PLACEHOLDER = "(Displayed the output of a chat command.)"
+TRUNCATION_MARKER = " [...]"
+SUMMARY_PREFIX = "Summary of earlier conversation:\n"
+_SUMMARY_SNIPPET_CHARS = 120
+MIN_TRUNCATED_TOKENS = 16
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.?!])\s")
+
+ContextResult = namedtuple(
+    "ContextResult",
+    ["messages", "tokens_used", "tokens_legacy", "tokens_saved", "summarized_turns", "dropped_commands", "truncated"]
+)
+
+
+def _message_tokens(content):
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _truncate_to_tokens(content, max_tokens):
+    if _message_tokens(content) <= max_tokens:
+        return content
+    # Binary search on characters; the tokenizer is monotonic enough for this.
+    low, high = 0, len(content)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if _message_tokens(content[:mid] + TRUNCATION_MARKER) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return content[:low].rstrip() + TRUNCATION_MARKER if low else ""
+
+
+def _to_message(role, content):
+    return HumanMessage(content=content) if role == "user" else AIMessage(content=content)
+
+
+def _summarize(turns):
+    # Extractive and local: the first sentence of each older turn, clipped.
+    lines = []
+    for msg in turns:
+        if msg.get("kind") == KIND_COMMAND:
+            continue
+        first = _SENTENCE_END_RE.split(" ".join(msg["content"].split()), maxsplit=1)[0]
+        if len(first) > _SUMMARY_SNIPPET_CHARS:
+            first = first[:_SUMMARY_SNIPPET_CHARS - 3] + "..."
+        lines.append(f"- {'User' if msg['role'] == 'user' else 'APIMAN'}: {first}")
+    return SUMMARY_PREFIX + "\n".join(lines) if lines else ""
+
+
+def build_context(history, token_budget=DEFAULT_TOKEN_BUDGET, max_messages=DEFAULT_MAX_MESSAGES):
+    window = history[-max_messages:]
+    tokens_legacy = sum(_message_tokens(msg["content"]) for msg in history[-LEGACY_WINDOW:])
+
+    # Command output (ticket tables, stats, help) is for the user's eyes; the
+    # model only needs to know a command ran, so it is the first thing to go.
+    candidates = []
+    dropped_commands = 0
+    for msg in window:
+        content = msg["content"]
+        if msg.get("kind") == KIND_COMMAND:
+            content = COMMAND_PLACEHOLDER
+            dropped_commands += 1
+        candidates.append((msg, content))
+
+    # Keep part of the budget for the summary of whatever does not fit.
+    verbatim_budget = token_budget - token_budget // 5
+    selected = []
+    used = 0
+    truncated = 0
+    last = len(candidates) - 1
+    for index in range(last, -1, -1):
+        msg, content = candidates[index]
+        cost = _message_tokens(content)
+        if used + cost > verbatim_budget:
+            remaining = verbatim_budget - used
+            # The current question always goes through, trimmed if need be; an
+            # older turn is trimmed only if a useful amount of it still fits.
+            if index == last or remaining >= MIN_TRUNCATED_TOKENS:
+                content = _truncate_to_tokens(content, max(remaining, MIN_TRUNCATED_TOKENS))
+                if content:
+                    selected.append((msg["role"], content))
+                    used += _message_tokens(content)
+                    truncated += 1
+            if index != last:
+                break
+            continue
+        selected.append((msg["role"], content))
+        used += cost
+
+    selected.reverse()
+    messages = [_to_message(role, content) for role, content in selected]
+
+    older = history[:len(history) - len(selected)]
+    summarized_turns = 0
+    if older:
+        summary = _summarize(older[-max_messages:])
+        summary = _truncate_to_tokens(summary, max(0, token_budget - used)) if summary else ""
+        if summary:
+            messages.insert(0, SystemMessage(content=summary))
+            used += _message_tokens(summary)
+            summarized_turns = min(len(older), max_messages)
+
+    return ContextResult(
+        messages, used, tokens_legacy, max(0, tokens_legacy - used),
+        summarized_turns, dropped_commands, truncated
+    )
+
+
+def context_fingerprint(history):
+    # Identifies the turns before the last message, which shape its reply as
+    # much as the message itself; "" when the message opens the conversation.
+    digest = hashlib.sha256()
+    for msg in history[:-1]:
+        content = COMMAND_PLACEHOLDER if msg.get("kind") == KIND_COMMAND else msg["content"]
+        digest.update(f"{msg['role']}\x00{content}\x00".encode("utf-8"))
+    return digest.hexdigest()[:16] if len(history) > 1 else ""
@@ -0,0 +1,186 @@
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from dashboard_queries import WIDGET_CALLS_BY_API, WIDGET_MONTHLY_CALLS_BY_API
+
+# Pricing for one API, read from its API_CONFIGS entry:
+#   "cost_per_call": 0.002                       price of a call
+#   "endpoint_costs": {"/upload": 0.004}         optional per-endpoint prices
+#   "cost_tiers": [[100000, 0.8], [1000000, 0.6]]
+#       optional volume discounts: calls past the 100,000th of a calendar
+#       month cost 0.8x, past the 1,000,000th 0.6x (graduated, per API)
+ApiPricing = namedtuple("ApiPricing", ["per_call", "endpoint_costs", "tiers"])
+
+
+def _tier_table(tiers):
+    # -> (starts, multipliers) with an implicit 1.0x tier from call 0.
+    table = sorted((int(start), float(multiplier)) for start, multiplier in tiers or ())
+    if not table or table[0][0] > 0:
+        table.insert(0, (0, 1.0))
+    starts, multipliers = zip(*table)
+    return np.array(starts, dtype=np.float64), np.array(multipliers, dtype=np.float64)
+
+
+def _tiered_units(starts, multipliers, calls):
+    # Integral of the tier multiplier over the first `calls` calls of a month.
+    calls = np.asarray(calls, dtype=np.float64)
+    widths = np.diff(np.append(starts, np.inf))
+    return (np.clip(calls[..., None] - starts, 0, widths) * multipliers).sum(axis=-1)
+
+
+def _as_categorical(values):
+    if isinstance(values, pd.Series):
+        values = values.array
+    if isinstance(values, pd.Categorical):
+        return values
+    return pd.Categorical(values)
+
+
+# Every cost on the dashboard comes from here: the Mongo price expression in
+# the aggregation pipelines, the per-bucket cost written into the hourly
+# rollups, per-row prices for raw log frames and the monthly volume tiers.
+class PriceBook:
+    def __init__(self, pricing):
+        self.pricing = dict(pricing)
+        self._tiers = {api: _tier_table(p.tiers) for api, p in self.pricing.items() if p.tiers}
+
+    @classmethod
+    def from_api_configs(cls, api_configs):
+        return cls({
+            api: ApiPricing(
+                float(config.get("cost_per_call", 0) or 0),
+                {endpoint: float(price) for endpoint, price in (config.get("endpoint_costs") or {}).items()},
+                tuple(tuple(tier) for tier in config.get("cost_tiers") or ()),
+            )
+            for api, config in api_configs.items()
+        })
+
+    @property
+    def has_tiers(self):
+        return bool(self._tiers)
+
+    def unit_price(self, api, endpoint=None):
+        pricing = self.pricing.get(api)
+        if pricing is None:
+            return 0.0
+        return pricing.endpoint_costs.get(endpoint, pricing.per_call)
+
+    def unit_prices(self, api, endpoint=None):
+        # Per-row untiered prices. The price table is built once per distinct
+        # (api, endpoint) category pair and indexed by the categorical codes,
+        # so the cost of a frame does not grow with a Python call per row.
+        api = _as_categorical(api)
+        api_codes = np.asarray(api.codes, dtype=np.intp)
+        if endpoint is None:
+            table = np.array([self.unit_price(name) for name in api.categories] + [0.0])
+            return table[api_codes]
+        endpoint = _as_categorical(endpoint)
+        endpoint_codes = np.asarray(endpoint.codes, dtype=np.intp)
+        endpoints = list(endpoint.categories) + [None]
+        table = np.zeros((len(api.categories) + 1, len(endpoints)))
+        for row, name in enumerate(api.categories):
+            table[row] = [self.unit_price(name, ep) for ep in endpoints]
+        # Code -1 (missing) lands on the trailing row/column.
+        return table[api_codes, endpoint_codes]
+
+    def log_costs(self, df, offsets=None):
+        # Per-row cost of a raw log frame (see log_loader.load_logs), with
+        # tiers applied by each call's rank within its API's calendar month.
+        # offsets: {(api, "YYYY-MM"): calls} made that month before the
+        # frame starts (see month_offsets), so a frame beginning mid-month
+        # carries on from the month's earlier volume.
+        prices = self.unit_prices(df["api"], df["endpoint"] if "endpoint" in df.columns else None)
+        if self._tiers and "timestamp" in df.columns and len(df):
+            api = _as_categorical(df["api"])
+            api_codes = np.asarray(api.codes)
+            timestamps = df["timestamp"]
+            group = (api_codes.astype(np.int64) + 1) * 100000 + (timestamps.dt.year * 12 + timestamps.dt.month).to_numpy()
+            # Rows ordered by (api, month, time); a row's rank is its position
+            # after the first row of its group.
+            order = np.lexsort((pd.DatetimeIndex(timestamps).asi8, group))
+            sorted_group = group[order]
+            starts_at = np.flatnonzero(np.r_[True, sorted_group[1:] != sorted_group[:-1]])
+            positions = np.arange(len(df)) - np.repeat(starts_at, np.diff(np.r_[starts_at, len(df)]))
+            rank = np.empty(len(df))
+            rank[order] = positions + 1
+            if offsets:
+                group_offsets = {}
+                for (api_name, month), calls in offsets.items():
+                    if api_name in api.categories:
+                        year, month_number = (int(part) for part in month.split("-"))
+                        code = api.categories.get_loc(api_name)
+                        group_offsets[(code + 1) * 100000 + year * 12 + month_number] = float(calls)
+                rank += pd.Series(group).map(group_offsets).fillna(0.0).to_numpy()
+            for api_name, (starts, multipliers) in self._tiers.items():
+                if api_name not in api.categories:
+                    continue
+                mask = api_codes == api.categories.get_loc(api_name)
+                prices[mask] *= multipliers[np.searchsorted(starts, rank[mask] - 1, side="right") - 1]
+        return pd.Series(prices, index=df.index, name="cost")
+
+    def tier_factors(self, api, offset, calls):
+        # Average tier multiplier for calls numbered offset+1 .. offset+calls
+        # in a month, per row of the aligned api/offset/calls arrays.
+        api = _as_categorical(api)
+        offset = np.asarray(offset, dtype=np.float64)
+        calls = np.asarray(calls, dtype=np.float64)
+        factors = np.ones(len(calls))
+        for api_name, (starts, multipliers) in self._tiers.items():
+            if api_name not in api.categories:
+                continue
+            mask = (np.asarray(api.codes) == api.categories.get_loc(api_name)) & (calls > 0)
+            units = _tiered_units(starts, multipliers, offset[mask] + calls[mask]) - _tiered_units(starts, multipliers, offset[mask])
+            factors[mask] = units / calls[mask]
+        return factors
+
+    def mongo_expression(self, api_field="$api", endpoint_field="$endpoint"):
+        # Untiered per-call price of a log document as a Mongo expression, so
+        # cost is summed server-side alongside the counts.
+        branches = []
+        for api, pricing in self.pricing.items():
+            for endpoint, price in pricing.endpoint_costs.items():
+                branches.append({
+                    "case": {"$and": [{"$eq": [api_field, api]}, {"$eq": [endpoint_field, endpoint]}]},
+                    "then": price,
+                })
+        for api, pricing in self.pricing.items():
+            branches.append({"case": {"$eq": [api_field, api]}, "then": pricing.per_call})
+        if not branches:
+            return 0
+        return {"$switch": {"branches": branches, "default": 0}}
+
+
+def month_offsets(queries, start_date, api=None):
+    # {(api, "YYYY-MM"): calls} made in start_date's month before start_date;
+    # the tier offsets for costs of a range that starts mid-month.
+    month_start = start_date.replace(day=1)
+    if month_start >= start_date:
+        return {}
+    earlier = queries.run(WIDGET_CALLS_BY_API, month_start, start_date - timedelta(days=1), api=api)
+    month = start_date.strftime("%Y-%m")
+    return {(name, month): float(calls) for name, calls in zip(earlier["api"], earlier["calls"])}
+
+
+def period_costs(queries, start_date, end_date, api=None):
+    # Calls and cost per API over an inclusive date range. Widget rows carry
+    # untiered cost; with tiers configured the rows are fetched per month and
+    # scaled by the tier factor for where they fall in that month's volume,
+    # counting calls made earlier in the first month before start_date. With
+    # per-endpoint prices the discount is spread evenly over the month's
+    # endpoint mix, where log_costs applies it call by call.
+    price_book = queries.price_book
+    if not price_book.has_tiers:
+        df = queries.run(WIDGET_CALLS_BY_API, start_date, end_date, api=api)
+        return df[["api", "calls", "cost"]].reset_index(drop=True)
+    df = queries.run(WIDGET_MONTHLY_CALLS_BY_API, start_date, end_date, api=api)
+    if df.empty:
+        return pd.DataFrame(columns=["api", "calls", "cost"])
+    earlier_calls = month_offsets(queries, start_date, api=api)
+    offsets = pd.Series(
+        [earlier_calls.get(key, 0.0) for key in zip(df["api"], df["month"])], index=df.index, dtype=float
+    )
+    df["cost"] = df["cost"] * price_book.tier_factors(df["api"], offsets, df["calls"])
+    return df.groupby("api", as_index=False, sort=False)[["calls", "cost"]].sum().sort_values("calls", ascending=False)
@@ -0,0 +1,130 @@
+import os
+from collections import namedtuple
+from datetime import datetime, time as dt_time, timedelta, timezone
+
+import pandas as pd
+
+LOGS_COLLECTION = "api_usage_logs"
+DEFAULT_TOP_USERS = 10
+# Server-side limit per widget aggregation. The dashboard's Mongo client has no
+# socket timeout (see mongo_connection.get_analytics_database), so this is
+# what stops a runaway query.
+DEFAULT_MAX_TIME_MS = int(os.getenv("DASHBOARD_MAX_TIME_MS", "120000"))
+
+# What a dashboard widget needs from the logs: the fields to group by, the
+# metric to sort on (descending, except "day" which sorts ascending) and an
+# optional row limit. Every result row carries calls, latency_avg_ms and cost.
+Aggregate = namedtuple("Aggregate", ["group_by", "sort_by", "limit"])
+
+WIDGET_TOTALS = "totals"
+WIDGET_CALLS_BY_API = "calls_by_api"
+WIDGET_DAILY_CALLS = "daily_calls"
+WIDGET_DAILY_CALLS_BY_API = "daily_calls_by_api"
+WIDGET_TOP_USERS = "top_users"
+WIDGET_CALLS_BY_COUNTRY = "calls_by_country"
+WIDGET_MONTHLY_CALLS_BY_API = "monthly_calls_by_api"
+
+WIDGET_AGGREGATES = {
+    WIDGET_TOTALS: Aggregate((), None, None),
+    WIDGET_CALLS_BY_API: Aggregate(("api",), "calls", None),
+    WIDGET_DAILY_CALLS: Aggregate(("day",), "day", None),
+    WIDGET_DAILY_CALLS_BY_API: Aggregate(("day", "api"), "day", None),
+    WIDGET_TOP_USERS: Aggregate(("user_id",), "calls", DEFAULT_TOP_USERS),
+    WIDGET_CALLS_BY_COUNTRY: Aggregate(("country",), "calls", None),
+    WIDGET_MONTHLY_CALLS_BY_API: Aggregate(("month", "api"), "calls", None),
+}
+
+_DAY_FORMAT = "%Y-%m-%d"
+_MONTH_FORMAT = "%Y-%m"
+
+
+def day_bounds(start_date, end_date):
+    # Inclusive calendar dates -> [start, end) UTC datetimes.
+    start = datetime.combine(start_date, dt_time.min, tzinfo=timezone.utc)
+    end = datetime.combine(end_date + timedelta(days=1), dt_time.min, tzinfo=timezone.utc)
+    return start, end
+
+
+def ensure_log_indexes(collection):
+    # Every pipeline starts with a timestamp range, optionally narrowed to one API.
+    collection.create_index([("timestamp", 1)])
+    collection.create_index([("api", 1), ("timestamp", 1)])
+
+
+# Runs each widget's aggregate as a Mongo pipeline over api_usage_logs so only
+# the grouped rows (a handful per API, day, user or country) leave the
+# database, instead of every log document in the date range.
+class DashboardQueries:
+    group_fields = {
+        "api": "$api",
+        "endpoint": "$endpoint",
+        "user_id": "$user_id",
+        "country": "$country",
+        "status_code": "$status_code",
+        "day": {"$dateToString": {"format": _DAY_FORMAT, "date": "$timestamp"}},
+        "month": {"$dateToString": {"format": _MONTH_FORMAT, "date": "$timestamp"}},
+    }
+
+    def __init__(self, collection, price_book=None, max_time_ms=DEFAULT_MAX_TIME_MS):
+        # price_book: a cost_engine.PriceBook; cost is summed server-side
+        # from its per-call price expression (untiered, see period_costs).
+        self.collection = collection
+        self.price_book = price_book
+        self.max_time_ms = max_time_ms
+
+    def match_stage(self, start, end, api=None):
+        match = {"timestamp": {"$gte": start, "$lt": end}}
+        if api is not None:
+            match["api"] = api
+        return match
+
+    def metric_accumulators(self):
+        return {
+            "calls": {"$sum": 1},
+            "latency_sum_ms": {"$sum": "$latency_ms"},
+            "cost": {"$sum": self.price_book.mongo_expression() if self.price_book else 0},
+        }
+
+    def pipeline(self, aggregate, start, end, api=None):
+        group_id = {field: self.group_fields[field] for field in aggregate.group_by} or None
+        group = {"_id": group_id}
+        group.update(self.metric_accumulators())
+        stages = [{"$match": self.match_stage(start, end, api)}, {"$group": group}]
+        if aggregate.sort_by == "day":
+            stages.append({"$sort": {"_id.day": 1}})
+        elif aggregate.sort_by:
+            stages.append({"$sort": {aggregate.sort_by: -1}})
+        if aggregate.limit:
+            stages.append({"$limit": aggregate.limit})
+        return stages
+
+    def rows(self, aggregate, start, end, api=None):
+        # Grouped rows with summed metrics (calls, latency_sum_ms, cost), so
+        # results over adjacent ranges can be merged before averaging.
+        rows = []
+        for doc in self.collection.aggregate(self.pipeline(aggregate, start, end, api), maxTimeMS=self.max_time_ms):
+            row = dict(doc["_id"] or {})
+            row["calls"] = doc.get("calls", 0)
+            row["latency_sum_ms"] = doc.get("latency_sum_ms", 0.0)
+            row["cost"] = doc.get("cost", 0.0)
+            rows.append(row)
+        return rows
+
+    def run(self, widget, start_date, end_date, api=None):
+        aggregate = WIDGET_AGGREGATES[widget] if isinstance(widget, str) else widget
+        start, end = day_bounds(start_date, end_date)
+        rows = self.rows(aggregate, start, end, api)
+        for row in rows:
+            calls = row["calls"]
+            row["latency_avg_ms"] = row.pop("latency_sum_ms") / calls if calls else 0.0
+        df = pd.DataFrame(rows, columns=list(aggregate.group_by) + ["calls", "latency_avg_ms", "cost"])
+        if "day" in df.columns:
+            df["day"] = pd.to_datetime(df["day"], format=_DAY_FORMAT, utc=True)
+        return df
+
+    def totals(self, start_date, end_date, api=None):
+        df = self.run(WIDGET_TOTALS, start_date, end_date, api=api)
+        if df.empty:
+            return {"calls": 0, "latency_avg_ms": 0.0, "cost": 0.0}
+        row = df.iloc[0]
+        return {"calls": int(row["calls"]), "latency_avg_ms": float(row["latency_avg_ms"]), "cost": float(row["cost"])}
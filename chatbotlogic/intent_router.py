@@ -0,0 +1,175 @@
+from collections import deque, namedtuple
+
+INTENT_SHOW_API_KEYS = "show_api_keys"
+INTENT_NEW_TICKET = "new_ticket"
+INTENT_SHOW_TICKETS = "show_tickets"
+INTENT_SHOW_STATS = "show_stats"
+INTENT_SHOW_CONTACT = "show_contact"
+INTENT_GET_API_KEY = "get_api_key"
+INTENT_SHOW_HELP = "show_help"
+INTENT_GREETING = "greeting"
+INTENT_INTRODUCTION = "introduction"
+
+GREETING_REPLY = "Hello! I'm APIMAN, your APIHub assistant. How can I help with our APIs today?"
+INTRODUCTION_REPLY = "I'm APIMAN, the dedicated assistant for APIHub services. Ask me about our APIs, endpoints, or authentication!"
+
+GREETINGS = (
+    "hi", "hello", "hey", "greetings", "hii", "hiii", "hiya", "heyy", "helloo", "hellooo",
+    "good morning", "good afternoon", "good evening", "good night", "gm", "gn", "ga",
+    "morning", "afternoon", "evening", "sup", "what's up", "wassup", "yo", "hola",
+    "howdy", "ahoy", "salutations", "hi there", "hello there", "hey there",
+    "greetings", "good day", "good to see you", "nice to see you", "long time no see",
+    "how are you", "how's it going", "how's things", "what's new", "what's happening",
+    "hi friend", "hello friend", "hey friend", "hiya", "how do you do", "hi hi",
+    "hey hey", "hello hello", "hi again", "hello again", "hey again", "hiya", "heyo",
+    "hi folks", "hello everyone", "hey all", "hi team", "hello team", "hey team",
+    "hi sir", "hello sir", "hey sir", "hi ma'am", "hello ma'am", "hey ma'am",
+    "hi pal", "hello pal", "hey pal", "hi buddy", "hello buddy", "hey buddy",
+    "hi mate", "hello mate", "hey mate", "hi dude", "hello dude", "hey dude",
+    "hiya", "heya", "howdy doody", "hi-ya", "hello-o", "hey-o", "hi-oh",
+    "hi people", "hello people", "hey people", "hi guys", "hello guys", "hey guys",
+    "hi folks", "hello folks", "hey folks", "hi y'all", "hello y'all", "hey y'all",
+    "hi beautiful", "hello beautiful", "hey beautiful", "hi handsome", "hello handsome", "hey handsome",
+    "hi stranger", "hello stranger", "hey stranger", "hi sunshine", "hello sunshine", "hey sunshine",
+    "hi captain", "hello captain", "hey captain", "hi boss", "hello boss", "hey boss",
+    "hi champ", "hello champ", "hey champ", "hi sport", "hello sport", "hey sport",
+    "hi there", "hello there", "hey there", "hi you", "hello you", "hey you"
+)
+
+INTRODUCTION_QUESTIONS = (
+    "who are you", "what are you", "your name", "your purpose", "who is this",
+    "what is your name", "what's your name", "who might you be", "who exactly are you",
+    "what do you do", "what's your purpose", "what can you do", "what are your capabilities",
+    "tell me about yourself", "describe yourself", "introduce yourself", "give me your intro",
+    "who created you", "who made you", "who developed you", "who programmed you",
+    "what are you called", "by what name are you called", "how should i call you",
+    "what should i call you", "what do people call you", "what's your identity",
+    "what's your function", "what's your job", "what's your role", "what's your mission",
+    "what's your objective", "what's your goal", "what's your aim", "what's your task",
+    "are you a bot", "are you a robot", "are you ai", "are you artificial intelligence",
+    "are you human", "are you real", "are you a person", "are you a program",
+    "what kind of bot are you", "what type of ai are you", "what sort of program are you",
+    "what's your nature", "what's your essence", "what's your being", "what's your existence",
+    "who are you really", "what are you exactly", "what exactly are you", "who exactly are you",
+    "what's your deal", "what's your story", "what's your background", "what's your history",
+    "what are you here for", "why do you exist", "why were you created", "why are you here",
+    "what's your function", "what's your primary function", "what's your main purpose",
+    "what do you specialize in", "what are you good at", "what can you help with",
+    "what's your expertise", "what's your specialty", "what's your domain",
+    "what's your focus", "what's your concentration", "what's your area",
+    "what's your field", "what's your subject", "what's your topic",
+    "what are you about", "what do you represent", "what do you stand for",
+    "what's your brand", "what's your identity", "what's your character",
+    "what's your personality", "what's your nature", "what's your disposition"
+)
+
+# Higher priority wins when several intents match the same message, so
+# "show api keys" is no longer shadowed by the shorter "api key" command.
+INTENT_DEFINITIONS = (
+    (INTENT_SHOW_API_KEYS, 100, ("show api keys", "my api keys", "show my api keys", "list api keys")),
+    (INTENT_NEW_TICKET, 90, ("create manual support ticket", "new ticket")),
+    (INTENT_SHOW_TICKETS, 80, ("show recent support tickets", "show tickets")),
+    (INTENT_SHOW_STATS, 80, ("show api usage statistics", "show api stats")),
+    (INTENT_SHOW_CONTACT, 80, ("show contact information", "show contact", "contact support")),
+    (INTENT_GET_API_KEY, 70, ("apikey", "apikeys", "api key", "api keys", "get api key")),
+    (INTENT_SHOW_HELP, 60, ("show help", "commands")),
+    (INTENT_GREETING, 20, GREETINGS),
+    (INTENT_INTRODUCTION, 10, INTRODUCTION_QUESTIONS),
+)
+
+IntentMatch = namedtuple("IntentMatch", ["intent", "priority", "start", "end", "phrase"])
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+def normalize_text(text):
+    return " ".join(text.lower().replace("\u2019", "'").split())
+
+
+# Aho-Corasick automaton over every intent phrase. All phrases are matched in a
+# single left-to-right pass; a hit only counts when it starts and ends on a word
+# boundary, so "hi" no longer fires inside "this" and "ga" inside "data".
+class IntentEngine:
+    def __init__(self, definitions):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._patterns = []
+        for intent, priority, phrases in definitions:
+            for phrase in dict.fromkeys(normalize_text(p) for p in phrases):
+                self._add_pattern(intent, priority, phrase)
+        self._build_failure_links()
+
+    def _add_pattern(self, intent, priority, phrase):
+        node = 0
+        for ch in phrase:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = nxt
+        self._output[node].append(len(self._patterns))
+        self._patterns.append((intent, priority, phrase))
+
+    def _build_failure_links(self):
+        # Fold the failure links into a full transition table so matching is a
+        # single dict lookup per character with no fallback loop.
+        self._delta = [None] * len(self._goto)
+        self._delta[0] = dict(self._goto[0])
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+            transitions = dict(self._delta[self._fail[node]])
+            transitions.update(self._goto[node])
+            self._delta[node] = transitions
+
+    @property
+    def pattern_count(self):
+        return len(self._patterns)
+
+    def find_all(self, text):
+        text = normalize_text(text)
+        delta, output, patterns = self._delta, self._output, self._patterns
+        last = len(text) - 1
+        matches = []
+        node = 0
+        for end, ch in enumerate(text):
+            node = delta[node].get(ch, 0)
+            if not output[node] or (end < last and _is_word_char(text[end + 1])):
+                continue
+            for pattern_id in output[node]:
+                intent, priority, phrase = patterns[pattern_id]
+                start = end - len(phrase) + 1
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                matches.append(IntentMatch(intent, priority, start, end + 1, phrase))
+        return matches
+
+    def resolve(self, text):
+        matches = self.find_all(text)
+        if not matches:
+            return None
+        return min(matches, key=lambda m: (-m.priority, -(m.end - m.start), m.start))
+
+
+INTENT_ENGINE = IntentEngine(INTENT_DEFINITIONS)
+
+
+def find_intents(text):
+    return INTENT_ENGINE.find_all(text)
+
+
+def resolve_intent(text):
+    return INTENT_ENGINE.resolve(text)
@@ -0,0 +1,148 @@
+import math
+import os
+import random
+import threading
+import time
+import zlib
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+PROVIDER_GROQ = "groq"
+PROVIDER_MOCK = "mock"
+DEFAULT_PROVIDER = os.getenv("LLM_PROVIDER", PROVIDER_GROQ).lower()
+
+MOCK_LLM_LATENCY = os.getenv("MOCK_LLM_LATENCY", "lognormal:p50=0.6,p95=2.0")
+MOCK_LLM_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", "0"))
+MOCK_LLM_SEED = int(os.getenv("MOCK_LLM_SEED", "7"))
+
+_Z_95 = 1.6448536269514722
+
+
+class InjectedProviderError(RuntimeError):
+    def __init__(self, message, status_code=503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# Latency specs are strings so they can come from env vars and CLI flags:
+#   "0.5" or "constant:0.5", "uniform:0.2,1.5", "lognormal:p50=0.6,p95=2.0"
+class LatencyDistribution:
+    def __init__(self, kind="constant", low=0.0, high=0.0, mu=0.0, sigma=0.0):
+        self.kind = kind
+        self.low = low
+        self.high = high
+        self.mu = mu
+        self.sigma = sigma
+
+    @classmethod
+    def parse(cls, spec):
+        if isinstance(spec, cls):
+            return spec
+        if spec is None or isinstance(spec, (int, float)):
+            return cls("constant", low=float(spec or 0.0))
+        kind, _, params = str(spec).strip().partition(":")
+        if not params:
+            return cls("constant", low=float(kind))
+        kind = kind.lower()
+        if kind == "constant":
+            return cls("constant", low=float(params))
+        if kind == "uniform":
+            low, high = (float(v) for v in params.split(","))
+            return cls("uniform", low=low, high=high)
+        if kind == "lognormal":
+            values = dict(item.split("=") for item in params.split(","))
+            p50, p95 = float(values["p50"]), float(values["p95"])
+            # Fit mu/sigma so the median and 95th percentile land where asked.
+            return cls("lognormal", mu=math.log(p50), sigma=max(0.0, math.log(p95 / p50) / _Z_95))
+        raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, rng):
+        if self.kind == "uniform":
+            return rng.uniform(self.low, self.high)
+        if self.kind == "lognormal":
+            return rng.lognormvariate(self.mu, self.sigma)
+        return self.low
+
+
+def _last_human_text(messages):
+    for message in reversed(messages or []):
+        if getattr(message, "type", None) == "human":
+            return message.content if isinstance(message.content, str) else str(message.content)
+    return ""
+
+
+# Local stand-in for a LangChain chat model. Replies, latencies and injected
+# failures are derived from the seed, the prompt and how often that prompt has
+# been seen, so a run replays identically no matter how threads interleave.
+class FakeChatModel:
+    def __init__(self, reply=None, latency=0.0, error_rate=0.0, hang_rate=0.0, hang_seconds=60.0,
+                 chunk_seconds=0.0, chunk_words=4, seed=0):
+        self.reply = reply
+        self.latency = LatencyDistribution.parse(latency)
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.chunk_seconds = chunk_seconds
+        self.chunk_words = chunk_words
+        self.seed = seed
+        self.calls = 0
+        self.failures = 0
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def _start_call(self, messages):
+        question = _last_human_text(messages)
+        key = zlib.crc32(question.encode("utf-8"))
+        with self._lock:
+            self.calls += 1
+            occurrence = self._seen.get(key, 0)
+            self._seen[key] = occurrence + 1
+        rng = random.Random(f"{self.seed}:{key}:{occurrence}")
+        roll = rng.random()
+        fail = roll < self.error_rate
+        if fail:
+            with self._lock:
+                self.failures += 1
+            time.sleep(self.latency.sample(rng))
+            raise InjectedProviderError("Injected chat model failure")
+        if roll < self.error_rate + self.hang_rate:
+            time.sleep(self.hang_seconds)
+        else:
+            time.sleep(self.latency.sample(rng))
+        if self.reply is not None:
+            return self.reply
+        return f"Mock answer about \"{' '.join(question.split())[:80]}\". Check the APIHub documentation for details."
+
+    def invoke(self, messages, **kwargs):
+        return AIMessage(content=self._start_call(messages))
+
+    def stream(self, messages, **kwargs):
+        words = self._start_call(messages).split(" ")
+        for start in range(0, len(words), self.chunk_words):
+            if start and self.chunk_seconds:
+                time.sleep(self.chunk_seconds)
+            piece = " ".join(words[start:start + self.chunk_words])
+            yield AIMessageChunk(content=piece if start == 0 else " " + piece)
+
+
+def _create_groq_model(model, api_key):
+    from langchain.chat_models import init_chat_model
+    return init_chat_model(model=model, model_provider="groq", api_key=api_key, temperature=0)
+
+
+def _create_mock_model(model, api_key):
+    return FakeChatModel(latency=MOCK_LLM_LATENCY, error_rate=MOCK_LLM_ERROR_RATE, seed=f"{MOCK_LLM_SEED}:{model}")
+
+
+CHAT_PROVIDERS = {
+    PROVIDER_GROQ: _create_groq_model,
+    PROVIDER_MOCK: _create_mock_model,
+}
+
+
+def create_chat_model(model, api_key, provider=DEFAULT_PROVIDER):
+    try:
+        factory = CHAT_PROVIDERS[provider]
+    except KeyError:
+        raise ValueError(f"Unknown LLM provider {provider!r}; expected one of {', '.join(CHAT_PROVIDERS)}")
+    return factory(model, api_key)
@@ -0,0 +1,251 @@
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+# Once a stream has started, the longest wait for its next chunk. A healthy
+# reply may stream for longer than the timeout above.
+DEFAULT_STREAM_IDLE_SECONDS = float(os.getenv("LLM_STREAM_IDLE_SECONDS", "10"))
+DEFAULT_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+DEFAULT_BASE_BACKOFF_SECONDS = float(os.getenv("LLM_BASE_BACKOFF_SECONDS", "0.5"))
+DEFAULT_MAX_BACKOFF_SECONDS = float(os.getenv("LLM_MAX_BACKOFF_SECONDS", "4"))
+DEFAULT_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+DEFAULT_RESET_TIMEOUT_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+# Hung provider calls are abandoned, not killed, so the pool bounds how many can
+# pile up behind an outage.
+DEFAULT_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "16"))
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+DEGRADED_REPLY = (
+    "APIMAN's AI assistant is temporarily unavailable. Please try again in a minute, "
+    "or type `show help` for the commands that still work."
+)
+
+_STREAM_DONE = object()
+
+
+class LLMUnavailableError(RuntimeError):
+    pass
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+class DeadlineExceededError(TimeoutError):
+    pass
+
+
+class StreamInterruptedError(LLMUnavailableError):
+    pass
+
+
+def _is_retryable(exc):
+    # Client errors other than throttling will fail the same way on every attempt.
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500 and status not in (408, 409, 429):
+        return False
+    return not isinstance(exc, (CircuitOpenError, TypeError, ValueError))
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = BREAKER_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._counters = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == BREAKER_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return BREAKER_HALF_OPEN
+            return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == BREAKER_CLOSED:
+                return True
+            if self._state == BREAKER_OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._counters["rejected"] += 1
+                    return False
+                self._state = BREAKER_HALF_OPEN
+            # Half-open: let exactly one probe through until it reports back.
+            if self._probe_in_flight:
+                self._counters["rejected"] += 1
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = BREAKER_CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            self._probe_in_flight = False
+            if self._state == BREAKER_HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != BREAKER_OPEN:
+                    self._counters["opened"] += 1
+                self._state = BREAKER_OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            stats = dict(self._counters)
+            stats["consecutive_failures"] = self._consecutive_failures
+        stats["state"] = state
+        return stats
+
+
+# Same invoke/stream surface as the wrapped model. When the primary's breaker is
+# open or its retries are spent the optional fallback model is tried the same
+# way; if neither answers, LLMUnavailableError tells the caller to serve a
+# cached or canned reply instead of opening a ticket.
+class ResilientChatModel:
+    def __init__(self, primary, fallback=None, timeout=DEFAULT_TIMEOUT_SECONDS, max_retries=DEFAULT_MAX_RETRIES,
+                 base_backoff=DEFAULT_BASE_BACKOFF_SECONDS, max_backoff=DEFAULT_MAX_BACKOFF_SECONDS,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT_SECONDS,
+                 max_workers=DEFAULT_MAX_WORKERS, stream_idle_timeout=DEFAULT_STREAM_IDLE_SECONDS):
+        self.timeout = timeout
+        self.stream_idle_timeout = stream_idle_timeout
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._providers = [("primary", primary, CircuitBreaker("primary", failure_threshold, reset_timeout))]
+        if fallback is not None:
+            self._providers.append(("fallback", fallback, CircuitBreaker("fallback", failure_threshold, reset_timeout)))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-call")
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._counters = {
+            "calls": 0, "attempts": 0, "retries": 0, "timeouts": 0, "errors": 0,
+            "fallback_calls": 0, "short_circuited": 0, "unavailable": 0, "stream_interrupted": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _backoff(self, attempt):
+        # Full jitter keeps sessions that failed together from retrying together.
+        return self._random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def _run(self, attempt_fn):
+        self._count("calls")
+        last_error = None
+        for index, (name, model, breaker) in enumerate(self._providers):
+            if index:
+                self._count("fallback_calls")
+            deadline = time.monotonic() + self.timeout
+            for attempt in range(self.max_retries + 1):
+                if not breaker.allow():
+                    self._count("short_circuited")
+                    last_error = last_error or CircuitOpenError(f"{name} model circuit is open")
+                    break
+                self._count("attempts" if attempt == 0 else "retries")
+                try:
+                    result = attempt_fn(model, deadline)
+                except DeadlineExceededError as e:
+                    self._count("timeouts")
+                    breaker.record_failure()
+                    last_error = e
+                    # The deadline covers all attempts on this model.
+                    break
+                except Exception as e:
+                    self._count("errors")
+                    breaker.record_failure()
+                    last_error = e
+                    if not _is_retryable(e):
+                        break
+                    if attempt < self.max_retries:
+                        delay = self._backoff(attempt)
+                        if time.monotonic() + delay >= deadline:
+                            break
+                        time.sleep(delay)
+                    continue
+                breaker.record_success()
+                return result
+        self._count("unavailable")
+        raise LLMUnavailableError(f"No chat model could answer: {last_error}") from last_error
+
+    def _invoke_attempt(self, model, messages, deadline):
+        future = self._executor.submit(model.invoke, messages)
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            raise DeadlineExceededError(f"Chat model did not answer within {self.timeout:.1f}s")
+
+    def invoke(self, messages):
+        return self._run(lambda model, deadline: self._invoke_attempt(model, messages, deadline))
+
+    def _open_stream(self, model, messages, deadline):
+        # The provider's iterator runs on a pool thread and hands chunks over a
+        # queue, so a stalled stream can be abandoned at the deadline.
+        chunks = queue.Queue()
+        abandoned = threading.Event()
+
+        def pump():
+            try:
+                for chunk in model.stream(messages):
+                    if abandoned.is_set():
+                        return
+                    chunks.put(chunk)
+                chunks.put(_STREAM_DONE)
+            except Exception as e:
+                chunks.put(e)
+
+        self._executor.submit(pump)
+
+        def next_item(timeout):
+            try:
+                item = chunks.get(timeout=max(0.0, timeout))
+            except queue.Empty:
+                abandoned.set()
+                raise DeadlineExceededError(f"Chat model stream stalled for {timeout:.1f}s")
+            if isinstance(item, Exception):
+                raise item
+            return item
+
+        # The deadline only bounds the wait for the first chunk; failures
+        # before it are retried like invoke.
+        first = next_item(deadline - time.monotonic())
+        return first, next_item
+
+    def stream(self, messages):
+        first, next_item = self._run(lambda model, deadline: self._open_stream(model, messages, deadline))
+        item = first
+        while item is not _STREAM_DONE:
+            yield item
+            try:
+                item = next_item(self.stream_idle_timeout)
+            except Exception as e:
+                # Text has already reached the user, so there is no retry;
+                # the caller serves its degraded reply instead.
+                self._count("stream_interrupted")
+                raise StreamInterruptedError(f"Chat model stream broke off: {e}") from e
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        for name, _, breaker in self._providers:
+            stats[f"{name}_breaker"] = breaker.stats()
+        stats["breaker_state"] = self._providers[0][2].state
+        return stats
@@ -0,0 +1,56 @@
+import re
+import time
+from collections import namedtuple
+
+_DIV_CLOSE_RE = re.compile(r'</\s*div\s*>')
+
+# Re-rendering the bubble on every chunk floods the websocket; batch updates.
+DEFAULT_RENDER_INTERVAL_SECONDS = 0.05
+
+CompletionTiming = namedtuple("CompletionTiming", ["streamed", "time_to_first_token", "total_seconds", "chunks"])
+
+
+def sanitize_llm_output(text):
+    return _DIV_CLOSE_RE.sub('', text).strip()
+
+
+def _chunk_text(chunk):
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    # Some providers stream content blocks instead of plain strings.
+    return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content or [])
+
+
+def stream_chat_completion(chat_model, messages, on_text=None, render_interval=DEFAULT_RENDER_INTERVAL_SECONDS):
+    started = time.perf_counter()
+    first_token_at = None
+    last_render = 0.0
+    parts = []
+    chunks = 0
+    for chunk in chat_model.stream(messages):
+        piece = _chunk_text(chunk)
+        if not piece:
+            continue
+        now = time.perf_counter()
+        if first_token_at is None:
+            first_token_at = now
+        parts.append(piece)
+        chunks += 1
+        if on_text is not None and now - last_render >= render_interval:
+            on_text(sanitize_llm_output("".join(parts)))
+            last_render = now
+    text = sanitize_llm_output("".join(parts))
+    if on_text is not None:
+        on_text(text)
+    finished = time.perf_counter()
+    ttft = (first_token_at or finished) - started
+    return text, CompletionTiming(True, ttft, finished - started, chunks)
+
+
+def invoke_chat_completion(chat_model, messages):
+    started = time.perf_counter()
+    text = sanitize_llm_output(chat_model.invoke(messages).content)
+    elapsed = time.perf_counter() - started
+    # Without streaming the first visible token arrives with the full reply.
+    return text, CompletionTiming(False, elapsed, elapsed, 1)
@@ -0,0 +1,96 @@
+import os
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from dashboard_queries import day_bounds
+
+DEFAULT_LOAD_BATCH_SIZE = int(os.getenv("LOG_LOAD_BATCH_SIZE", "10000"))
+
+# Column layout of a loaded api_usage_logs frame: kind and the value used when
+# a document lacks the field. Low-cardinality strings become categoricals;
+# status codes fit in int16 and latency in float32.
+CATEGORY = "category"
+INT16 = "int16"
+FLOAT32 = "float32"
+TIMESTAMP = "timestamp"
+
+LOG_COLUMNS = {
+    "api": (CATEGORY, "unknown_api"),
+    "timestamp": (TIMESTAMP, None),
+    "user_id": (CATEGORY, "unknown_user"),
+    "status_code": (INT16, 200),
+    "country": (CATEGORY, "Unknown"),
+    "api_version": (CATEGORY, "v1.0"),
+    "endpoint": (CATEGORY, "/default"),
+    "latency_ms": (FLOAT32, 50.0),
+}
+
+_ARRAY_TYPECODES = {CATEGORY: "i", INT16: "h", FLOAT32: "f", TIMESTAMP: "q"}
+
+
+def _epoch_ms(dt_obj):
+    # Mongo dates are millisecond precision; pymongo hands back naive UTC.
+    if dt_obj.tzinfo is not None:
+        dt_obj = dt_obj.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt_obj.toordinal() - 719163) * 86400000 + (
+        dt_obj.hour * 3600 + dt_obj.minute * 60 + dt_obj.second
+    ) * 1000 + dt_obj.microsecond // 1000
+
+
+# Accumulates one column straight into a typed buffer while the cursor is
+# read; categoricals keep a value -> code dictionary and only store codes.
+class _ColumnBuilder:
+    def __init__(self, kind, default):
+        self.kind = kind
+        self.default = default
+        self.values = array(_ARRAY_TYPECODES[kind])
+        self.categories = {}
+
+    def append(self, value):
+        if value is None:
+            value = self.default
+        if self.kind == CATEGORY:
+            code = self.categories.get(value)
+            if code is None:
+                code = self.categories[value] = len(self.categories)
+            self.values.append(code)
+        elif self.kind == TIMESTAMP:
+            self.values.append(_epoch_ms(value))
+        else:
+            self.values.append(value)
+
+    def build(self):
+        data = np.frombuffer(self.values, dtype=self.values.typecode) if self.values else np.array([], dtype=self.values.typecode)
+        if self.kind == CATEGORY:
+            codes = data.astype(np.int8 if len(self.categories) < 127 else np.int32, copy=False)
+            return pd.Categorical.from_codes(codes, categories=list(self.categories))
+        if self.kind == TIMESTAMP:
+            return pd.to_datetime(data, unit="ms", utc=True)
+        return data
+
+
+def load_logs(collection, start_date=None, end_date=None, api=None, columns=None, batch_size=DEFAULT_LOAD_BATCH_SIZE):
+    # Raw logs for an inclusive date range as a compact frame: only `columns`
+    # are projected (all of LOG_COLUMNS by default, never _id), documents are
+    # read in cursor batches and each field goes straight into its typed
+    # buffer, so no list of dicts or object-dtype frame is ever built.
+    columns = list(columns or LOG_COLUMNS)
+    query = {}
+    if start_date:
+        query.setdefault("timestamp", {})["$gte"] = day_bounds(start_date, start_date)[0]
+    if end_date:
+        query.setdefault("timestamp", {})["$lt"] = day_bounds(end_date, end_date)[1]
+    if api is not None:
+        query["api"] = api
+    projection = {"_id": 0, "timestamp": 1}
+    projection.update({column: 1 for column in columns})
+    builders = {column: _ColumnBuilder(*LOG_COLUMNS[column]) for column in columns}
+    for doc in collection.find(query, projection, batch_size=batch_size):
+        if not isinstance(doc.get("timestamp"), datetime):
+            continue
+        for column, builder in builders.items():
+            builder.append(doc.get(column))
+    return pd.DataFrame({column: builder.build() for column, builder in builders.items()}, copy=False)
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+DEFAULT_TODAY_TTL_SECONDS = float(os.getenv("LOG_CACHE_TODAY_TTL_SECONDS", "60"))
+DEFAULT_MAX_MB = float(os.getenv("LOG_CACHE_MAX_MB", "256"))
+
+
+def _concat_frames(frames):
+    # pd.concat turns categoricals with different categories into object
+    # columns; union the categories first so the result stays compact.
+    frames = [frame for frame in frames if len(frame.columns)]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    columns = {}
+    for column in frames[0].columns:
+        pieces = [frame[column] for frame in frames]
+        if isinstance(pieces[0].dtype, pd.CategoricalDtype):
+            columns[column] = union_categoricals(pieces)
+        else:
+            columns[column] = pd.concat(pieces, ignore_index=True)
+    return pd.DataFrame(columns, copy=False)
+
+
+# Raw log frames cached as one partition per UTC day. A date range is put
+# together from the cached days, and only the days not held yet are fetched,
+# one query per run of consecutive missing days. A partition loaded after its
+# day ended doesn't change and stays until evicted (least recently used
+# first, past max_bytes). One loaded while its day was still running may be
+# missing later logs, so it expires after today_ttl seconds, also once the
+# day is over.
+class LogPartitionCache:
+    def __init__(self, loader, today_ttl=DEFAULT_TODAY_TTL_SECONDS, max_bytes=int(DEFAULT_MAX_MB * 1024 * 1024)):
+        # loader(start_date, end_date) -> frame of logs for those inclusive
+        # dates with a UTC "timestamp" column, e.g. log_loader.load_logs.
+        self.loader = loader
+        self.today_ttl = today_ttl
+        self.max_bytes = max_bytes
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "fetches": 0, "evictions": 0}
+        self._bytes = 0
+
+    def _fresh(self, entry, now):
+        _, _, loaded_at, complete = entry
+        return complete or now - loaded_at < self.today_ttl
+
+    def _store(self, day, frame, now, complete):
+        size = int(frame.memory_usage(deep=True).sum())
+        old = self._partitions.pop(day, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._partitions[day] = (frame, size, now, complete)
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._partitions) > 1:
+            _, (_, evicted_size, _, _) = self._partitions.popitem(last=False)
+            self._bytes -= evicted_size
+            self._counters["evictions"] += 1
+
+    def _fetch(self, start_day, end_day):
+        frame = self.loader(start_day, end_day)
+        days = [start_day + timedelta(days=offset) for offset in range((end_day - start_day).days + 1)]
+        if frame.empty:
+            empty = frame.iloc[0:0]
+            return {day: empty for day in days}
+        day_numbers = (
+            (frame["timestamp"].dt.normalize() - pd.Timestamp(start_day, tz="UTC")) // pd.Timedelta(days=1)
+        ).to_numpy()
+        positions = pd.Series(day_numbers).groupby(day_numbers, sort=False).indices
+        empty = frame.iloc[0:0]
+        return {
+            day: frame.iloc[positions[offset]].reset_index(drop=True) if offset in positions else empty
+            for offset, day in enumerate(days)
+        }
+
+    def get(self, start_date, end_date):
+        now = time.monotonic()
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        partitions = {}
+        with self._lock:
+            missing = []
+            for day in days:
+                entry = self._partitions.get(day)
+                if entry is not None and self._fresh(entry, now):
+                    self._partitions.move_to_end(day)
+                    partitions[day] = entry[0]
+                    self._counters["hits"] += 1
+                else:
+                    missing.append(day)
+                    self._counters["misses"] += 1
+        runs = []
+        for day in missing:
+            if runs and day - runs[-1][1] == timedelta(days=1):
+                runs[-1][1] = day
+            else:
+                runs.append([day, day])
+        fetched = {}
+        # Whether a day had ended is decided before its logs are read, so a
+        # log written around midnight can't be left out of a "complete" day.
+        today = datetime.now(timezone.utc).date()
+        for run_start, run_end in runs:
+            fetched.update(self._fetch(run_start, run_end))
+        with self._lock:
+            self._counters["fetches"] += len(runs)
+            for day, frame in fetched.items():
+                self._store(day, frame, now, complete=day < today)
+        partitions.update(fetched)
+        return _concat_frames([partitions[day] for day in days])
+
+    def clear(self):
+        with self._lock:
+            self._partitions.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            stats["partitions"] = len(self._partitions)
+            stats["bytes"] = self._bytes
+        return stats
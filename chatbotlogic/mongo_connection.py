@@ -0,0 +1,154 @@
+import os
+import threading
+
+from pymongo import MongoClient, monitoring
+
+DATABASE_NAME = "apiman"
+# "mongomock://" URIs get an in-process stand-in (pip install mongomock) for
+# offline runs and load tests.
+MOCK_URI_SCHEME = "mongomock://"
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+# zlib ships with Python; add zstd/snappy here when their packages are installed.
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "pools": 0, "pool_clears": 0,
+            "connections_created": 0, "connections_closed": 0, "connections_open": 0,
+            "checked_out": 0, "max_checked_out": 0, "checkouts": 0, "checkout_failures": 0,
+            "checkout_wait_ms_total": 0.0, "checkout_wait_ms_max": 0.0,
+        }
+
+    def _inc(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def pool_created(self, event):
+        self._inc("pools")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._inc("pool_clears")
+
+    def pool_closed(self, event):
+        self._inc("pools", -1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._stats["connections_created"] += 1
+            self._stats["connections_open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._stats["connections_closed"] += 1
+            self._stats["connections_open"] -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._inc("checkout_failures")
+
+    def connection_checked_out(self, event):
+        # Checkout duration is reported by PyMongo 4.7+.
+        wait_ms = (getattr(event, "duration", None) or 0.0) * 1000
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["checked_out"] += 1
+            self._stats["max_checked_out"] = max(self._stats["max_checked_out"], self._stats["checked_out"])
+            self._stats["checkout_wait_ms_total"] += wait_ms
+            self._stats["checkout_wait_ms_max"] = max(self._stats["checkout_wait_ms_max"], wait_ms)
+
+    def connection_checked_in(self, event):
+        self._inc("checked_out", -1)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["checkout_wait_ms_avg"] = stats["checkout_wait_ms_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+
+# One listener per client, so each pool's usage is measured against its own
+# maxPoolSize.
+_pool_listeners = {}
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client_key(uri, analytics):
+    # Both kinds share one mongomock client so they see the same data.
+    if not analytics or (uri and uri.startswith(MOCK_URI_SCHEME)):
+        return uri
+    return (uri, "analytics")
+
+
+def get_mongo_client(uri=None, analytics=False):
+    # One client per URI per process. Streamlit re-executes page scripts on every
+    # interaction, so creating clients there would spin up new pools and monitor
+    # threads each time.
+    #
+    # Analytics clients (dashboard, rollup backfill) have no socket timeout:
+    # a long aggregation is bounded server-side by its maxTimeMS instead of
+    # having its connection cut at MONGO_SOCKET_TIMEOUT_MS.
+    uri = uri or os.getenv("MONGODB_URI")
+    key = _client_key(uri, analytics)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None and uri and uri.startswith(MOCK_URI_SCHEME):
+            import mongomock
+            client = _clients[key] = mongomock.MongoClient()
+        if client is None:
+            listener = _pool_listeners[key] = PoolStatsListener()
+            client = MongoClient(
+                uri,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=None if analytics else MONGO_SOCKET_TIMEOUT_MS,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                compressors=MONGO_COMPRESSORS,
+                appname="apiman-analytics" if analytics else "apiman",
+                event_listeners=[listener],
+            )
+            _clients[key] = client
+        return client
+
+
+def get_database(uri=None, name=DATABASE_NAME):
+    return get_mongo_client(uri)[name]
+
+
+def get_analytics_database(uri=None, name=DATABASE_NAME):
+    return get_mongo_client(uri, analytics=True)[name]
+
+
+def pool_stats(uri=None, analytics=False):
+    # Connection pool usage of the client get_mongo_client(uri, analytics)
+    # returns; all zeros before it connects and for mongomock.
+    key = _client_key(uri or os.getenv("MONGODB_URI"), analytics)
+    with _clients_lock:
+        listener = _pool_listeners.get(key) or PoolStatsListener()
+        clients = len(_clients)
+    stats = listener.snapshot()
+    stats["clients"] = clients
+    stats["max_pool_size"] = MONGO_MAX_POOL_SIZE
+    stats["utilization"] = stats["max_checked_out"] / MONGO_MAX_POOL_SIZE if MONGO_MAX_POOL_SIZE else 0.0
+    return stats
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from notifications import format_ticket_notification
+
+DEFAULT_WINDOW_SECONDS = float(os.getenv("NOTIFY_COALESCE_WINDOW_SECONDS", "30"))
+DEFAULT_MAX_PER_MINUTE = int(os.getenv("NOTIFY_MAX_PER_MINUTE", "6"))
+DEFAULT_MAX_DIGEST_TICKETS = int(os.getenv("NOTIFY_MAX_DIGEST_TICKETS", "25"))
+
+# WhatsApp bodies are capped at 1600 characters; leave room for the footer.
+_MAX_BODY_CHARS = 1500
+_TITLE_CHARS = 80
+
+
+def _as_utc(dt_obj):
+    if dt_obj.tzinfo is None:
+        return dt_obj.replace(tzinfo=timezone.utc)
+    return dt_obj.astimezone(timezone.utc)
+
+
+def format_ticket_digest(tickets):
+    if len(tickets) == 1:
+        ticket = tickets[0]
+        return format_ticket_notification(
+            str(ticket["_id"]), ticket.get("title", ""), ticket.get("description", ""),
+            ticket.get("contact", ""), ticket["notification"].get("enqueued_at")
+        )
+    opened = sorted(_as_utc(t["notification"]["enqueued_at"]) for t in tickets)
+    header = (
+        f"\n{len(tickets)} New Support Tickets\n\n"
+        f"Opened between {opened[0].strftime('%H:%M:%S')} and {opened[-1].strftime('%H:%M:%S UTC')}\n\n"
+    )
+    lines = []
+    length = len(header)
+    for index, ticket in enumerate(tickets, 1):
+        title = ticket.get("title", "").split("\n")[0]
+        if len(title) > _TITLE_CHARS:
+            title = title[:_TITLE_CHARS - 3] + "..."
+        line = f"{index}. #{str(ticket['_id'])[-6:]} {title} ({ticket.get('contact') or 'Not provided'})\n"
+        if length + len(line) > _MAX_BODY_CHARS:
+            lines.append(f"...and {len(tickets) - index + 1} more. See the dashboard for details.\n")
+            break
+        lines.append(line)
+        length += len(line)
+    return header + "".join(lines)
+
+
+class NotificationCoalescer:
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS, max_per_minute=DEFAULT_MAX_PER_MINUTE,
+                 max_digest_tickets=DEFAULT_MAX_DIGEST_TICKETS):
+        self.window_seconds = window_seconds
+        self.max_per_minute = max_per_minute
+        self.max_digest_tickets = max_digest_tickets
+        self._sent_at = deque()
+        self._lock = threading.Lock()
+        self._counters = {"tickets_notified": 0, "messages_sent": 0, "digests_sent": 0, "cap_waits": 0}
+
+    def seconds_until_ready(self, oldest_enqueued_at, pending_count, now=None):
+        # A batch goes out once its oldest ticket has waited a full window, or
+        # as soon as it is large enough to fill a digest.
+        if pending_count >= self.max_digest_tickets:
+            return 0.0
+        now = now or datetime.now(timezone.utc)
+        waited = (now - _as_utc(oldest_enqueued_at)).total_seconds()
+        return max(0.0, self.window_seconds - waited)
+
+    def seconds_until_slot(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._sent_at and now - self._sent_at[0] >= 60:
+                self._sent_at.popleft()
+            if len(self._sent_at) < self.max_per_minute:
+                return 0.0
+            self._counters["cap_waits"] += 1
+            return 60 - (now - self._sent_at[0])
+
+    def record_sent(self, ticket_count):
+        with self._lock:
+            self._sent_at.append(time.monotonic())
+            self._counters["tickets_notified"] += ticket_count
+            self._counters["messages_sent"] += 1
+            if ticket_count > 1:
+                self._counters["digests_sent"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["sent_last_minute"] = len(self._sent_at)
+        stats["messages_saved"] = stats["tickets_notified"] - stats["messages_sent"]
+        stats["window_seconds"] = self.window_seconds
+        stats["max_per_minute"] = self.max_per_minute
+        return stats
@@ -0,0 +1,86 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def format_ticket_notification(ticket_id, title, description, contact_info="", opened_at=None):
+    opened_at = opened_at or datetime.now(timezone.utc)
+    return f"""
+New Support Ticket #{ticket_id}
+
+Title: {title}
+
+Description:
+{description}
+
+Contact: {contact_info if contact_info else 'Not provided'}
+
+Opened at: {opened_at.strftime('%Y-%m-%d %H:%M:%S UTC')}
+"""
+
+
+class FakeMessage:
+    def __init__(self, sid, body, from_, to):
+        self.sid = sid
+        self.body = body
+        self.from_ = from_
+        self.to = to
+        self.date_created = datetime.now(timezone.utc)
+
+
+class FakeMessageList:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, body, from_, to, **kwargs):
+        return self._client._create(body, from_, to)
+
+
+# Drop-in stand-in for twilio.rest.Client that records messages locally instead
+# of calling Twilio. Latency and failure injection make retries observable.
+class FakeTwilioClient:
+    def __init__(self, latency_seconds=0.0, failure_rate=0.0, seed=None):
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self.sent = []
+        self.failures = 0
+        self.messages = FakeMessageList(self)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _create(self, body, from_, to):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        with self._lock:
+            if self._random.random() < self.failure_rate:
+                self.failures += 1
+                raise RuntimeError("Injected Twilio failure")
+            message = FakeMessage(f"SMFAKE{len(self.sent):08d}", body, from_, to)
+            self.sent.append(message)
+            return message
+
+
+class WhatsAppSender:
+    def __init__(self, client, from_number, to_number):
+        self.client = client
+        self.from_number = from_number
+        self.to_number = to_number
+
+    def send(self, body):
+        if self.client is None:
+            raise RuntimeError("Twilio client is not configured.")
+        if not self.from_number or not self.to_number:
+            raise RuntimeError("Twilio WhatsApp numbers are not configured.")
+        return self.client.messages.create(
+            body=body,
+            from_="whatsapp:" + self.from_number,
+            to="whatsapp:" + self.to_number
+        )
+
+
+def create_twilio_client(account_sid, auth_token, use_fake=False):
+    if use_fake:
+        return FakeTwilioClient()
+    from twilio.rest import Client
+    return Client(account_sid, auth_token)
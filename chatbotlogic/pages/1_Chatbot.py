@@ -1,13 +1,16 @@
 import os
 import streamlit as st
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from twilio.rest import Client
-from datetime import datetime, timedelta, timezone
-import pandas as pd
-import re
-from langchain.chat_models import init_chat_model
-from langchain.schema.messages import AIMessage, HumanMessage, SystemMessage
+import uuid
+from mongo_connection import pool_stats
+from session_store import sign_session_id, verify_session_token
+from chat_rendering import ChatRenderer, render_user_message, DEFAULT_RENDER_WINDOW
+from telemetry import STAGES, STAGE_SANITIZE, configure_logging
+from prompt_tokens import EXACT_COUNTS
+from chat_engine import (
+    ChatEngine, load_settings, ACTION_SHOW_API_KEYS, ACTION_NEW_TICKET_FORM,
+    SOURCE_TICKET, SOURCE_ERROR, API_KEY_DASHBOARD_URL
+)
 
 st.set_page_config(
     page_title="APIMAN - APIHub Chat Assistant",
@@ -17,230 +20,48 @@ st.set_page_config(
 )
 
 load_dotenv()
+configure_logging()
+
+def _setting(key, default=None):
+    return os.getenv(key) or st.secrets.get(key, default)
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY") or st.secrets.get("GROQ_API_KEY")
-TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID") or st.secrets.get("TWILIO_ACCOUNT_SID")
-TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN") or st.secrets.get("TWILIO_AUTH_TOKEN")
-TWILIO_NUMBER = os.getenv("TWILIO_NUMBER") or st.secrets.get("TWILIO_NUMBER")
-SUPPORT_PHONE_NUMBER = os.getenv("SUPPORT_PHONE_NUMBER") or st.secrets.get("SUPPORT_PHONE_NUMBER")
-MONGO_URI = os.getenv("MONGODB_URI") or st.secrets.get("MONGODB_URI")
+SETTINGS = load_settings(lookup=_setting)
 
-if not SUPPORT_PHONE_NUMBER:
+if not SETTINGS.support_phone_number:
     st.error("Configuration Error: SUPPORT_PHONE_NUMBER environment variable not set.")
     st.stop()
-if not GROQ_API_KEY:
+if not SETTINGS.groq_api_key:
     st.error("Configuration Error: GROQ_API_KEY is not set.")
     st.stop()
-if not MONGO_URI:
+if not SETTINGS.mongo_uri:
     st.error("Configuration Error: MONGODB_URI is not set.")
     st.stop()
-if not TWILIO_ACCOUNT_SID or not TWILIO_AUTH_TOKEN or not TWILIO_NUMBER:
+if not SETTINGS.twilio_account_sid or not SETTINGS.twilio_auth_token or not SETTINGS.twilio_number:
     st.warning("Warning: Twilio credentials not fully configured.")
 
-try:
-    mongo_client = MongoClient(MONGO_URI)
-    db = mongo_client["apiman"]
-    tickets_collection = db["support_tickets"]
-    api_keys_collection = db["user_api_keys"]
-except Exception as e:
-    st.error(f"Database Connection Failed: {e}")
-    st.stop()
-
+# The page is a thin client: routing, caches, the LLM call and ticketing all
+# live in the engine, which can also be served headless by chat_server.py.
 @st.cache_resource
-def get_chat_model():
+def get_chat_engine():
     try:
-        return init_chat_model(
-            model="llama3-8b-8192",
-            model_provider="groq",
-            api_key=GROQ_API_KEY,
-            temperature=0
-        )
+        return ChatEngine(SETTINGS)
     except Exception as e:
-        st.error(f"AI Model Initialization Failed: {e}")
+        st.error(f"Chat Engine Initialization Failed: {e}")
         st.stop()
 
-chat_model = get_chat_model()
-
-def send_whatsapp_notification(ticket_id, title, description, contact_info=""):
-    try:
-        twilio_rest_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-        message_body = f"""
-New Support Ticket #{ticket_id}
-
-Title: {title}
-
-Description:
-{description}
-
-Contact: {contact_info if contact_info else 'Not provided'}
-
-Opened at: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}
-"""
-        twilio_rest_client.messages.create(
-            body=message_body,
-            from_="whatsapp:" + TWILIO_NUMBER,
-            to="whatsapp:" + SUPPORT_PHONE_NUMBER
-        )
-    except Exception as e:
-        st.warning(f"Failed to send WhatsApp notification. Error: {e}")
-
-def create_support_ticket(title, description, contact_info="anonymous user"):
-    ticket_data = {
-        "title": title,
-        "description": description,
-        "contact": contact_info,
-        "status": "open",
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "last_updated": datetime.now(timezone.utc).isoformat()
-    }
-    try:
-        result = tickets_collection.insert_one(ticket_data)
-        ticket_id = str(result.inserted_id)
-        send_whatsapp_notification(ticket_id, title, description, contact_info)
-        return ticket_id
-    except Exception as e:
-        st.error(f"Failed to create support ticket. Error: {e}")
-        return None
+engine = get_chat_engine()
 
 def store_api_key(user_id, api_key):
     try:
-        api_keys_collection.update_one(
-            {"user_id": user_id},
-            {"$set": {"api_key": api_key, "updated_at": datetime.now(timezone.utc).isoformat()}},
-            upsert=True
-        )
+        engine.store_api_key(user_id, api_key)
         return True
     except Exception as e:
         st.error(f"Failed to store API key. Error: {e}")
         return False
 
-def get_user_api_keys(user_id):
-    try:
-        records = api_keys_collection.find({"user_id": user_id})
-        return [record["api_key"] for record in records] if records else []
-    except Exception as e:
-        st.error(f"Failed to retrieve API keys. Error: {e}")
-        return []
-
-def get_open_tickets():
-    try:
-        open_tickets = list(tickets_collection.find({"status": "open"}).sort("created_at", -1))
-        return open_tickets
-    except Exception as e:
-        st.error(f"Failed to fetch open tickets. Error: {e}")
-        return []
-
-
-SYSTEM_PROMPT = """
-You are APIMAN, an advanced, highly intelligent, and helpful chatbot exclusively for APIHub. Your purpose is to assist users with APIHub-related questions and provide accurate, concise information about our APIs.
-Role: APIMAN is the dedicated chatbot for APIHub, specializing in API-related queries. Maintain a professional, friendly, and precise tone.
-
-Scope of Expertise
-Only answer questions about these APIHub services:
-
-Image API
-Endpoints: /postimg, /getyourimage, /getimagetotext, /reset-your-post
-Functions: Upload, retrieve, search, delete images.
-
-Video API
-Endpoint: /getvideo
-Function: Fetch video links by name/title.
-
-Ecommerce API
-Endpoints: /createproduct, /getallproduct, /deleteproduct
-Functions: CRUD operations for product data.
-
-QR Code Generator API
-Endpoint: /qrcodegenerator
-Function: Generate QR codes from text/URLs.
-
-Weather API
-Endpoint: /getweatherdata
-Function: Fetch weather data by city name.
-
-Profile Photo API
-Endpoint: /namedphoto
-Function: Generate profile pictures from initials.
-
-Jokes API
-Endpoint: /jokesapi
-Function: Fetch random jokes.
-
-Response Rules
-1. Greetings/Introduction (Respond politely, DO NOT create ticket):
-   - "Hi", "Hello", "Hey" → "Hello! I'm APIMAN, your APIHub assistant. How can I help with our APIs today?"
-   - "Who are you?" → "I'm APIMAN, the dedicated assistant for APIHub services. Ask me about our APIs, endpoints, or authentication!"
-
-2. On-Topic Questions (Answer clearly):
-   - Endpoints, authentication (keys/tokens), rate limits, errors, data formats.
-   - Example: "How do I authenticate with the Image API?" → Explain auth process.
-
-3. Off-Topic/Unclear Questions → Create Support Ticket:
-   - "How do I reset my password?" → "I cannot resolve this. A support ticket will be created."
-   - "Tell me about cats." → "I specialize in APIs. A support ticket will be created for this query."
-
-4. Code/Docs Requests: Direct users to relevant API sections or provide concise examples.
-
-Tone & Fallback
-- Friendly but professional: Avoid slang; use clear, technical language.
-- Uncertainty: If unsure, say: "Let me check... A support ticket will be created for further assistance."
-"""
-def _get_recent_tickets_markdown():
-    markdown_output = "### Recent Support Tickets\n"
-    try:
-        recent_tickets_data = get_open_tickets()
-        if recent_tickets_data:
-            ticket_records = []
-            for t in recent_tickets_data:
-                subject = t["title"].split('\n')[0]
-                if len(subject) > 50:
-                    subject = subject[:47] + "..."
-                ticket_records.append({
-                    "ID": str(t["_id"])[-6:],
-                    "Subject": subject,
-                    "Status": t["status"].capitalize(),
-                    "Created": datetime.fromisoformat(t["created_at"]).strftime("%Y-%m-%d %H:%M")
-                })
-            recent_tickets_df = pd.DataFrame(ticket_records)
-            markdown_output += recent_tickets_df.to_markdown(index=False)
-        else:
-            markdown_output += "No open tickets found in the database.\n"
-    except Exception as e:
-        markdown_output += f"Could not load recent tickets: {e}\n"
-    return markdown_output
-
-def _get_api_stats_markdown():
-    markdown_output = "### API Usage Statistics\n"
-    markdown_output += "Insights into your API consumption (mock data):\n\n"
-    markdown_output += "**Total Requests (24h):** 1,245,678\n"
-    markdown_output += "**Avg Latency (ms):** 75\n\n"
-    markdown_output += "#### Daily Request Volume\n"
-    chart_data = pd.DataFrame(
-        {
-            "Date": pd.to_datetime(pd.date_range(end=datetime.now(), periods=7, freq='D')),
-            "Requests": [1500, 1800, 2200, 1900, 2500, 2300, 2700],
-        }
-    )
-    markdown_output += "```\n"
-    markdown_output += "Date          Requests\n"
-    markdown_output += "----------  ----------\n"
-    for index, row in chart_data.iterrows():
-        markdown_output += f"{row['Date'].strftime('%Y-%m-%d')}  {row['Requests']}\n"
-    markdown_output += "```\n"
-    return markdown_output
-
-def _get_contact_info_markdown():
-    markdown_output = "### APIHUB Contact Info\n"
-    markdown_output += "- whatsapp community: https://chat.whatsapp.com/J8iljiMAZcvB58RS9GYwjH\n"
-    markdown_output += "- discord community: https://discord.com/invite/Fj28zvaz\n"
-    markdown_output += "- linkedin: https://www.linkedin.com/in/apihub/\n\n"
-    markdown_output += "### APIMAN Contact Info\n"
-    markdown_output += "- email: apimancompany@gmail.com\n"
-    return markdown_output
-
 def _get_api_key_help_markdown():
     markdown_output = "### API Key Management\n"
-    markdown_output += "To get your API key, visit: [APIHub Key Dashboard](https://www.apihub.digital/dashboard/getkey)\n\n"
+    markdown_output += f"To get your API key, visit: [APIHub Key Dashboard]({API_KEY_DASHBOARD_URL})\n\n"
     markdown_output += "You can store your API key here for future reference:\n"
     
     with st.expander("Store Your API Key"):
@@ -260,13 +81,13 @@ def _get_api_key_help_markdown():
 def _get_user_api_keys_markdown(user_id):
     markdown_output = "### Your API Keys\n"
     try:
-        api_keys = get_user_api_keys(user_id)
+        api_keys = engine.get_user_api_keys(user_id)
         if api_keys:
             for idx, key in enumerate(api_keys, 1):
                 markdown_output += f"{idx}. `{key[:4]}...{key[-4:]}`\n"
         else:
             markdown_output += "No API keys found for your account.\n"
-        markdown_output += "\nTo get a new API key, visit: [APIHub Key Dashboard](https://www.apihub.digital/dashboard/getkey)\n"
+        markdown_output += f"\nTo get a new API key, visit: [APIHub Key Dashboard]({API_KEY_DASHBOARD_URL})\n"
     except Exception as e:
         markdown_output += f"Error retrieving API keys: {e}\n"
     return markdown_output
@@ -288,12 +109,20 @@ def render_manual_ticket_form():
             if not (subject and details):
                 st.warning("Please provide both a Subject and a Full Description for the ticket.")
             else:
-                new_ticket_id = create_support_ticket(subject, details, contact if contact else "anonymous")
-                if new_ticket_id:
-                    st.success(f"Ticket #{new_ticket_id} submitted successfully!")
+                ticket = engine.create_support_ticket(subject, details, contact if contact else "anonymous")
+                if ticket:
+                    if ticket.merged:
+                        st.info(f"This matches open ticket #{ticket.ticket_id}; your request was added to it.")
+                        confirmation = f"Your request matches open ticket #{ticket.ticket_id} and was added to it. Our team will get back to you shortly."
+                    else:
+                        st.success(f"Ticket #{ticket.ticket_id} submitted successfully!")
+                        confirmation = f"Manual ticket #{ticket.ticket_id} has been created. Our team will get back to you shortly."
                     st.session_state.show_manual_form = False
-                    st.session_state.chat_history.append({"role": "assistant", "content": f"Manual ticket #{new_ticket_id} has been created. Our team will get back to you shortly."})
+                    st.session_state.chat_session.history.append({"role": "assistant", "content": confirmation})
+                    engine.session_store.save(st.session_state.chat_session)
                     st.rerun()
+                else:
+                    st.error("Failed to create support ticket. Please try again.")
         elif back_to_chat_button:
             st.session_state.show_manual_form = False
             st.rerun()
@@ -418,8 +247,35 @@ st.markdown("""
 
 st.markdown("<h1>APIMAN: Your APIHub Assistant</h1>", unsafe_allow_html=True)
 
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+@st.cache_resource
+def get_session_secret():
+    secret = _setting("CHAT_SESSION_SECRET")
+    if not secret:
+        # Links then only work on this replica until it restarts.
+        st.warning("Warning: CHAT_SESSION_SECRET is not set; using a random per-process secret.")
+        secret = uuid.uuid4().hex
+    return secret
+
+# The session id rides in the URL so any replica can pick the conversation up
+# from the session store; reruns only fetch messages this replica has not seen.
+# The id is HMAC-signed, so only a link this app handed out opens a stored
+# conversation; a missing or forged one starts a new session.
+session_secret = get_session_secret()
+session_id = verify_session_token(st.query_params.get("sid"), session_secret)
+if session_id is None:
+    session_id = uuid.uuid4().hex
+    st.query_params["sid"] = sign_session_id(session_id, session_secret)
+if "chat_session" not in st.session_state or st.session_state.chat_session.session_id != session_id:
+    st.session_state.chat_session = engine.open_session(session_id)
+else:
+    engine.session_store.refresh(st.session_state.chat_session)
+if "chat_renderer" not in st.session_state or st.session_state.get("rendered_session_id") != st.session_state.chat_session.session_id:
+    st.session_state.chat_renderer = ChatRenderer()
+    st.session_state.rendered_session_id = st.session_state.chat_session.session_id
+if "render_window" not in st.session_state:
+    st.session_state.render_window = DEFAULT_RENDER_WINDOW
+if "pending_input" not in st.session_state:
+    st.session_state.pending_input = None
 if "show_success_alert" not in st.session_state:
     st.session_state.show_success_alert = False
 if "success_ticket_id" not in st.session_state:
@@ -435,6 +291,131 @@ if "show_api_keys" not in st.session_state:
 if "current_user_id" not in st.session_state:
     st.session_state.current_user_id = ""
 
+chat_session = st.session_state.chat_session
+chat_renderer = st.session_state.chat_renderer
+
+ASSISTANT_BUBBLE_OPEN = """
+                    <div class="chat-message chat-message-assistant">
+                        <div class="chat-avatar assistant-avatar">A</div>
+                        <div class="message-bubble">
+                """
+ASSISTANT_BUBBLE_CLOSE = """
+                        </div>
+                    </div>
+                """
+
+with st.sidebar:
+    st.subheader("Assistant Diagnostics")
+    engine_stats = engine.stats()
+    router_stats = engine_stats["router"]
+    st.metric("LLM Calls Saved by Router", f"{router_stats['llm_calls_saved']:,}")
+    st.caption(
+        f"Routed {router_stats['total_routed']:,} queries: {router_stats['answered_by_llm']:,} to the LLM, "
+        f"{router_stats['ticketed']:,} ticketed, {router_stats['canned']:,} canned "
+        f"(confidence threshold {router_stats['confidence_threshold']:.2f})."
+    )
+    canned_stats = engine_stats["canned_answers"]
+    st.caption(
+        f"Canned catalog answers: {canned_stats['hits']:,} turns ({canned_stats['traffic_share']:.0%} of traffic) "
+        f"answered from {canned_stats['entries']:,} precomputed answers with no LLM call."
+    )
+    cache_stats = engine_stats["response_cache"]
+    st.metric("Response Cache Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+    st.caption(
+        f"{cache_stats['local_hits']:,} local hits, {cache_stats['shared_hits']:,} shared hits, "
+        f"{cache_stats['misses']:,} misses, {cache_stats['local_entries']:,} entries held."
+    )
+    if chat_session.llm_timings:
+        recent_ttft = [t["ttft_ms"] for t in chat_session.llm_timings]
+        st.metric("Time to First Token (last reply)", f"{recent_ttft[-1]:,.0f} ms")
+        st.caption(f"Median over the last {len(recent_ttft)} replies: {sorted(recent_ttft)[len(recent_ttft) // 2]:,.0f} ms.")
+    outbox_stats = engine_stats["outbox"]
+    st.metric("Notification Queue Depth", "n/a" if outbox_stats["queue_depth"] is None else f"{outbox_stats['queue_depth']:,}")
+    st.caption(
+        f"{outbox_stats['delivered']:,} delivered, {outbox_stats['retries']:,} retries, {outbox_stats['failed']:,} failed; "
+        f"delivery latency p50 {outbox_stats['delivery_latency_p50_s']:.1f}s / p95 {outbox_stats['delivery_latency_p95_s']:.1f}s."
+    )
+    st.caption(
+        f"WhatsApp digests: {outbox_stats['messages_sent']:,} messages for {outbox_stats['tickets_notified']:,} tickets "
+        f"({outbox_stats['messages_saved']:,} saved, cap {outbox_stats['max_per_minute']}/min)."
+    )
+    dedup_stats = engine_stats["ticket_dedup"]
+    st.caption(
+        f"Ticket dedup: {dedup_stats['duplicates']:,} of {dedup_stats['checked']:,} tickets merged into "
+        f"{dedup_stats['indexed_open_tickets']:,} indexed open tickets."
+    )
+    mongo_pool = pool_stats(SETTINGS.mongo_uri)
+    st.caption(
+        f"Mongo pool: {mongo_pool['checked_out']}/{mongo_pool['max_pool_size']} connections in use "
+        f"(peak {mongo_pool['max_checked_out']}, {mongo_pool['connections_open']} open), "
+        f"avg checkout wait {mongo_pool['checkout_wait_ms_avg']:.1f} ms."
+    )
+    if chat_session.prompt_token_log:
+        last_prompt = chat_session.prompt_token_log[-1]
+        st.metric(
+            f"Prompt Tokens (last reply{'' if EXACT_COUNTS else ', approximate'})", f"{last_prompt['tokens_sent']:,}",
+            delta=f"{last_prompt['tokens_sent'] - last_prompt['tokens_full_catalog']:,} vs full catalog",
+            delta_color="inverse"
+        )
+        st.caption(
+            f"History context: {last_prompt['history_tokens']:,} tokens within a {SETTINGS.context_token_budget:,} budget, "
+            f"{last_prompt['history_tokens_saved']:,} saved vs the last five messages "
+            f"({last_prompt['summarized_turns']} older turns summarized, {last_prompt['dropped_commands']} command outputs dropped)."
+        )
+    semantic_stats = engine_stats["semantic_cache"]
+    st.caption(
+        f"Semantic cache: {semantic_stats['hits']:,} paraphrase hits / {semantic_stats['misses']:,} misses, "
+        f"{semantic_stats['entries']:,} answers indexed (similarity >= {semantic_stats['similarity_threshold']:.2f})."
+    )
+    stage_summaries = engine_stats["stages"]
+    if stage_summaries:
+        st.caption("Stage latency (p50 / p95 ms): " + ", ".join(
+            f"{stage} {stage_summaries[stage]['p50_ms']:.1f} / {stage_summaries[stage]['p95_ms']:.1f}"
+            for stage in STAGES if stage in stage_summaries
+        ))
+    limiter_stats = engine_stats["rate_limiter"]
+    st.caption(
+        f"Rate limiter: {limiter_stats['allowed']:,} allowed, {limiter_stats['session_limit']:,} session / "
+        f"{limiter_stats['global_limit']:,} global / {limiter_stats['concurrency_limit']:,} concurrency refusals; "
+        f"{limiter_stats['in_flight']}/{limiter_stats['max_concurrency']} LLM calls in flight."
+    )
+    flight_stats = engine_stats["single_flight"]
+    st.caption(
+        f"Single-flight: {flight_stats['coalesced']:,} of {flight_stats['calls']:,} LLM requests shared an "
+        f"in-flight call ({flight_stats['executions']:,} provider calls made)."
+    )
+    session_stats = engine_stats["sessions"]
+    st.caption(
+        f"Session store: {session_stats['active']:,} sessions held, {session_stats['messages_written']:,} messages in "
+        f"{session_stats['writes']:,} write-behind updates, {session_stats['pending_messages']:,} pending, "
+        f"{session_stats['evicted']:,} idle sessions evicted."
+    )
+    render_stats = chat_renderer.stats()
+    st.caption(
+        f"Chat rendering: {render_stats['cached_fragments']:,} messages pre-rendered, "
+        f"newest {st.session_state.render_window} shown."
+    )
+    llm_stats = engine_stats["llm"]
+    st.caption(
+        f"LLM calls: breaker {llm_stats['breaker_state'].replace('_', '-')}, {llm_stats['retries']:,} retries, "
+        f"{llm_stats['timeouts']:,} timeouts, {llm_stats['fallback_calls']:,} fallback attempts, "
+        f"{llm_stats['unavailable']:,} degraded replies."
+    )
+
+def streaming_bubble():
+    # The bubble is only drawn once the first chunk arrives, so cached and
+    # canned replies never flash an empty placeholder.
+    placeholder = None
+
+    def on_text(text):
+        nonlocal placeholder
+        if placeholder is None:
+            st.markdown(ASSISTANT_BUBBLE_OPEN, unsafe_allow_html=True)
+            placeholder = st.empty()
+            st.markdown(ASSISTANT_BUBBLE_CLOSE, unsafe_allow_html=True)
+        placeholder.markdown(text)
+    return on_text
+
 main_col = st.columns([1])[0]
 
 with main_col:
@@ -456,32 +437,19 @@ with main_col:
             st.markdown(_get_user_api_keys_markdown(st.session_state.current_user_id))
     else:
         st.subheader("Chat with APIMAN")
-        st.markdown('<div id="chat-history-scroll-area" class="chat-container">', unsafe_allow_html=True)
-
-        for msg in st.session_state.chat_history:
-            if msg["role"] == "user":
-                st.markdown(f"""
-                    <div class="chat-message chat-message-user">
-                        <div class="message-bubble">
-                            <strong>You:</strong> {msg['content']}
-                        </div>
-                        <div class="chat-avatar user-avatar">U</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-            elif msg["role"] == "assistant":
-                clean_md = re.sub(r"</?div[^>]*>", "", msg["content"], flags=re.IGNORECASE)
-                st.markdown("""
-                    <div class="chat-message chat-message-assistant">
-                        <div class="chat-avatar assistant-avatar">A</div>
-                        <div class="message-bubble">
-                """, unsafe_allow_html=True)
-                st.markdown(clean_md, unsafe_allow_html=False)
-                st.markdown("""
-                        </div>
-                    </div>
-                """, unsafe_allow_html=True)
-
-        st.markdown('</div>', unsafe_allow_html=True)
+        # Messages are sanitized and turned into HTML once, the first time
+        # they are seen; a rerun only joins the newest window of fragments
+        # into a single element. Older messages are paged in on request.
+        engine.telemetry.record(STAGE_SANITIZE, chat_renderer.sync(chat_session.history))
+        pending = [render_user_message(st.session_state.pending_input)] if st.session_state.pending_input else []
+        hidden_count, window_html = chat_renderer.window(st.session_state.render_window, extra=pending)
+        if hidden_count and st.button(f"Show {min(hidden_count, DEFAULT_RENDER_WINDOW)} earlier messages"):
+            st.session_state.render_window += DEFAULT_RENDER_WINDOW
+            st.rerun()
+        st.markdown(
+            f'<div id="chat-history-scroll-area" class="chat-container">\n\n{window_html}\n\n</div>',
+            unsafe_allow_html=True
+        )
 
         st.markdown("""
             <script>
@@ -495,149 +463,29 @@ with main_col:
         user_input = st.chat_input("Ask APIMAN about APIHub or type 'show help' for commands...", key="chat_input")
 
         if user_input:
-            st.session_state.chat_history.append({"role": "user", "content": user_input})
+            st.session_state.pending_input = user_input
             st.session_state.show_success_alert = False
             st.session_state.show_error_alert = False
             st.rerun()
 
-        if st.session_state.chat_history and st.session_state.chat_history[-1]["role"] == "user":
-            current_user_query = st.session_state.chat_history[-1]["content"].lower().strip()
-            bot_response_content = ""
-
-            if "show recent support tickets" in current_user_query or "show tickets" in current_user_query:
-                bot_response_content = _get_recent_tickets_markdown()
-            elif "show api usage statistics" in current_user_query or "show api stats" in current_user_query:
-                bot_response_content = _get_api_stats_markdown()
-            elif "show contact information" in current_user_query or "show contact" in current_user_query or "contact support" in current_user_query:
-                bot_response_content = _get_contact_info_markdown()
-            elif "apikey" in current_user_query or "api key" in current_user_query or "get api key" in current_user_query:
-                bot_response_content = "You can get your API key here: [APIHub Key Dashboard](https://www.apihub.digital/dashboard/getkey)"
-            elif "show api keys" in current_user_query or "my api keys" in current_user_query:
+        if st.session_state.pending_input:
+            pending_input, st.session_state.pending_input = st.session_state.pending_input, None
+            result = engine.handle_turn(chat_session, pending_input, on_text=streaming_bubble())
+            if result.action == ACTION_SHOW_API_KEYS:
                 st.session_state.show_api_keys = True
-                st.rerun()
-            elif "show help" in current_user_query or "commands" in current_user_query:
-                bot_response_content = """
-                ### APIMAN Commands:
-                You can ask me to:
-                - `show recent support tickets` or `show tickets`: See a list of your latest support tickets.
-                - `show api usage statistics` or `show api stats`: Get an overview of your API consumption.
-                - `show contact information` or `show contact`: Find ways to reach our support team.
-                - `apikey` or `get api key`: Get your APIHub API key.
-                - `create manual support ticket` or `new ticket`: Open a form to submit a detailed support ticket.
-                - And of course, ask any question about APIHub endpoints, authentication, rate limits, errors, and data formats!
-                """
-            elif "create manual support ticket" in current_user_query or "new ticket" in current_user_query:
+            elif result.action == ACTION_NEW_TICKET_FORM:
                 st.session_state.show_manual_form = True
-                st.session_state.chat_history.append({"role": "assistant", "content": "Alright, please fill out the details for your support ticket."})
-                st.rerun()
-            else:
-                try:
-                  
-                    greetings = [
-    "hi", "hello", "hey", "greetings", "hii", "hiii", "hiya", "heyy", "helloo", "hellooo",
-    "good morning", "good afternoon", "good evening", "good night", "gm", "gn", "ga",
-    "morning", "afternoon", "evening", "sup", "what's up", "wassup", "yo", "hola",
-    "howdy", "ahoy", "salutations", "hi there", "hello there", "hey there",
-    "greetings", "good day", "good to see you", "nice to see you", "long time no see",
-    "how are you", "how's it going", "how's things", "what's new", "what's happening",
-    "hi friend", "hello friend", "hey friend", "hiya", "how do you do", "hi hi",
-    "hey hey", "hello hello", "hi again", "hello again", "hey again", "hiya", "heyo",
-    "hi folks", "hello everyone", "hey all", "hi team", "hello team", "hey team",
-    "hi sir", "hello sir", "hey sir", "hi ma'am", "hello ma'am", "hey ma'am",
-    "hi pal", "hello pal", "hey pal", "hi buddy", "hello buddy", "hey buddy",
-    "hi mate", "hello mate", "hey mate", "hi dude", "hello dude", "hey dude",
-    "hiya", "heya", "howdy doody", "hi-ya", "hello-o", "hey-o", "hi-oh",
-    "hi people", "hello people", "hey people", "hi guys", "hello guys", "hey guys",
-    "hi folks", "hello folks", "hey folks", "hi y'all", "hello y'all", "hey y'all",
-    "hi beautiful", "hello beautiful", "hey beautiful", "hi handsome", "hello handsome", "hey handsome",
-    "hi stranger", "hello stranger", "hey stranger", "hi sunshine", "hello sunshine", "hey sunshine",
-    "hi captain", "hello captain", "hey captain", "hi boss", "hello boss", "hey boss",
-    "hi champ", "hello champ", "hey champ", "hi sport", "hello sport", "hey sport",
-    "hi there", "hello there", "hey there", "hi you", "hello you", "hey you"
-                          ]
-                    introduction_questions = [
-    "who are you", "what are you", "your name", "your purpose", "who is this",
-    "what is your name", "what's your name", "who might you be", "who exactly are you",
-    "what do you do", "what's your purpose", "what can you do", "what are your capabilities",
-    "tell me about yourself", "describe yourself", "introduce yourself", "give me your intro",
-    "who created you", "who made you", "who developed you", "who programmed you",
-    "what are you called", "by what name are you called", "how should i call you",
-    "what should i call you", "what do people call you", "what's your identity",
-    "what's your function", "what's your job", "what's your role", "what's your mission",
-    "what's your objective", "what's your goal", "what's your aim", "what's your task",
-    "are you a bot", "are you a robot", "are you ai", "are you artificial intelligence",
-    "are you human", "are you real", "are you a person", "are you a program",
-    "what kind of bot are you", "what type of ai are you", "what sort of program are you",
-    "what's your nature", "what's your essence", "what's your being", "what's your existence",
-    "who are you really", "what are you exactly", "what exactly are you", "who exactly are you",
-    "what's your deal", "what's your story", "what's your background", "what's your history",
-    "what are you here for", "why do you exist", "why were you created", "why are you here",
-    "what's your function", "what's your primary function", "what's your main purpose",
-    "what do you specialize in", "what are you good at", "what can you help with",
-    "what's your expertise", "what's your specialty", "what's your domain",
-    "what's your focus", "what's your concentration", "what's your area",
-    "what's your field", "what's your subject", "what's your topic",
-    "what are you about", "what do you represent", "what do you stand for",
-    "what's your brand", "what's your identity", "what's your character",
-    "what's your personality", "what's your nature", "what's your disposition"
-]
-                    
-                    current_user_query_lower = current_user_query.lower()
-                    
-                   
-                    is_greeting = any(greet in current_user_query_lower for greet in greetings)
-                    
-                    
-                    is_intro_question = any(q in current_user_query_lower for q in introduction_questions)
-                    
-                    if is_greeting:
-                        bot_response_content = "Hello! I'm APIMAN, your APIHub assistant. How can I help with our APIs today?"
-                    elif is_intro_question:
-                        bot_response_content = "I'm APIMAN, the dedicated assistant for APIHub services. Ask me about our APIs, endpoints, or authentication!"
-                    else:
-                       
-                        messages = [SystemMessage(content=SYSTEM_PROMPT)] + [
-                            HumanMessage(content=msg["content"]) if msg["role"] == "user" else AIMessage(content=msg["content"])
-                            for msg in st.session_state.chat_history[-5:]
-                        ]
-                        if not messages or messages[-1].content.lower().strip() != current_user_query or messages[-1].type != "human":
-                             messages.append(HumanMessage(content=current_user_query))
-
-                        llm_response = chat_model.invoke(messages).content
-                        llm_response = re.sub(r'</\s*div\s*>', '', llm_response).strip()
-
-                        api_related_keywords = [
-                            "api", "endpoint", "authentication", "token", "key",
-                            "image api", "video api", "ecommerce api", "qr code",
-                            "weather api", "profile photo", "jokes api", "apihub",
-                            "post", "get", "put", "delete", "request", "response",
-                            "header", "body", "parameter", "query", "status code"
-                        ]
-                        
-                        is_api_related = any(keyword in current_user_query_lower for keyword in api_related_keywords)
-
-                        if not is_api_related:
-                            ticket_title = "Non-API Question: " + (current_user_query[:50] + "..." if len(current_user_query) > 50 else current_user_query)
-                            ticket_id_for_bot = create_support_ticket(ticket_title, current_user_query)
-                            if ticket_id_for_bot:
-                                bot_response_content = "I cannot resolve this. A support ticket has been created."
-                                st.session_state.show_success_alert = True
-                                st.session_state.success_ticket_id = ticket_id_for_bot
-                            else:
-                                bot_response_content = "I cannot resolve this. Please contact support directly."
-                        else:
-                            bot_response_content = llm_response
-
-                except Exception as e:
-                    ticket_title = "AI Chatbot Failure: " + (current_user_query[:30] + "..." if len(current_user_query) > 30 else current_user_query)
-                    ticket_id_on_error = create_support_ticket(ticket_title, f"Error while processing: {current_user_query}\n\nError: {e}")
-                    if ticket_id_on_error:
-                        bot_response_content = "An error occurred. A support ticket has been created."
-                        st.session_state.show_error_alert = True
-
-            st.session_state.chat_history.append({"role": "assistant", "content": bot_response_content})
+            elif result.source == SOURCE_TICKET and result.ticket_id:
+                st.session_state.show_success_alert = True
+                st.session_state.success_ticket_id = result.ticket_id
+                st.session_state.success_ticket_merged = result.ticket_merged
+            elif result.source == SOURCE_ERROR and result.ticket_id:
+                st.session_state.show_error_alert = True
             st.rerun()
         if st.session_state.show_success_alert and st.session_state.success_ticket_id:
-            st.success(f"Ticket #{st.session_state.success_ticket_id} created by APIMAN.")
+            if st.session_state.get("success_ticket_merged"):
+                st.success(f"Your question was added to open ticket #{st.session_state.success_ticket_id}.")
+            else:
+                st.success(f"Ticket #{st.session_state.success_ticket_id} created by APIMAN.")
         if st.session_state.show_error_alert:
-            st.error("An error occurred. A support ticket has been created.")
\ No newline at end of file
+            st.error("An error occurred. It has been reported to our support team.")
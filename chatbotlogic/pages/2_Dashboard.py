@@ -2,7 +2,6 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from pymongo import MongoClient
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
@@ -10,17 +9,32 @@ import os
 import numpy as np
 import uuid
 
+from mongo_connection import get_analytics_database, pool_stats
+from telemetry import load_stage_summaries, METRICS_COLLECTION, STAGES, STAGE_CANNED_ANSWER
+from dashboard_queries import (
+    DashboardQueries, ensure_log_indexes, LOGS_COLLECTION, WIDGET_CALLS_BY_API, WIDGET_DAILY_CALLS, WIDGET_DAILY_CALLS_BY_API,
+    WIDGET_TOP_USERS, WIDGET_CALLS_BY_COUNTRY
+)
+from log_loader import load_logs
+from log_partition_cache import LogPartitionCache
+from api_configs import API_CONFIGS
+from cost_engine import PriceBook, month_offsets, period_costs
+from usage_rollups import (
+    UsageRollups, RollupQueries, ensure_rollup_indexes, ROLLUPS_COLLECTION, ROLLUP_STATE_COLLECTION
+)
+
 load_dotenv()
 
 mongo_uri = os.getenv("MONGODB_URI")
 
 try:
-    client = MongoClient(mongo_uri)
-    db = client["apiman"]
-    logs_collection = db["api_usage_logs"]
+    db = get_analytics_database(mongo_uri)
+    logs_collection = db[LOGS_COLLECTION]
+    rollups_collection = db[ROLLUPS_COLLECTION]
     tickets_collection = db["support_tickets"]
     api_keys_collection = db["api_keys"] 
     users_collection = db["users"] 
+    chat_metrics_collection = db[METRICS_COLLECTION]
 except Exception as e:
     st.error(f"Could not connect to MongoDB: {e}")
     st.stop()
@@ -28,92 +42,24 @@ except Exception as e:
 
 st.set_page_config(layout="wide", page_title="API Admin Dashboard", initial_sidebar_state="collapsed")
 
-API_CONFIGS = {
-    "Image API": {
-        "cost_per_call": 0.001,
-        "quota_daily": 10000,
-        "rate_limit_per_second": 10,
-        "base_latency_ms": 50,
-        "latency_variation": 20,
-        "base_error_rate_percent": 0.5,
-        "error_rate_variation": 0.5,
-        "documentation_url": "https://www.apihub.digital/dashboard/Imageapi",
-        "latest_version": "v2.1",
-        "endpoints": ["/process", "/info", "/status"]
-    },
-    "Video API": {
-        "cost_per_call": 0.002,
-        "quota_daily": 5000,
-        "rate_limit_per_second": 5,
-        "base_latency_ms": 80,
-        "latency_variation": 30,
-        "base_error_rate_percent": 1.2,
-        "error_rate_variation": 1.0,
-        "documentation_url": "https://www.apihub.digital/dashboard/videoapi",
-        "latest_version": "v1.5",
-        "endpoints": ["/stream", "/upload", "/metadata"]
-    },
-    "Weather API": {
-        "cost_per_call": 0.0005,
-        "quota_daily": 20000,
-        "rate_limit_per_second": 20,
-        "base_latency_ms": 30,
-        "latency_variation": 10,
-        "base_error_rate_percent": 0.1,
-        "error_rate_variation": 0.1,
-        "documentation_url": "https://www.apihub.digital/dashboard/weatherapi",
-        "latest_version": "v3.0",
-        "endpoints": ["/current", "/forecast", "/historical"]
-    },
-    "Ecommerce API": {
-        "cost_per_call": 0.0007,
-        "quota_daily": 15000,
-        "rate_limit_per_second": 15,
-        "base_latency_ms": 60,
-        "latency_variation": 25,
-        "base_error_rate_percent": 0.8,
-        "error_rate_variation": 0.7,
-        "documentation_url": "https://www.apihub.digital/dashboard/ecommerceapi",
-        "latest_version": "v2.3",
-        "endpoints": ["/products", "/orders", "/users", "/checkout"]
-    },
-    "QR Code API": {
-        "cost_per_call": 0.0012,
-        "quota_daily": 8000,
-        "rate_limit_per_second": 8,
-        "base_latency_ms": 45,
-        "latency_variation": 15,
-        "base_error_rate_percent": 0.3,
-        "error_rate_variation": 0.3,
-        "documentation_url": "https://www.apihub.digital/dashboard/Qrcodeapi",
-        "latest_version": "v1.2",
-        "endpoints": ["/generate", "/decode"]
-    },
-    "Profile Photo API": {
-        "cost_per_call": 0.0014,
-        "quota_daily": 7000,
-        "rate_limit_per_second": 7,
-        "base_latency_ms": 70,
-        "latency_variation": 28,
-        "base_error_rate_percent": 0.6,
-        "error_rate_variation": 0.6,
-        "documentation_url": "https://www.apihub.digital/dashboard/profilepic",
-        "latest_version": "v2.0",
-        "endpoints": ["/upload", "/crop", "/filter"]
-    },
-    "Jokes API": {
-        "cost_per_call": 0.0004,
-        "quota_daily": 25000,
-        "rate_limit_per_second": 25,
-        "base_latency_ms": 25,
-        "latency_variation": 10,
-        "base_error_rate_percent": 0.05,
-        "error_rate_variation": 0.05,
-        "documentation_url": "https://www.apihub.digital/dashboard/jokesapi",
-        "latest_version": "v1.0",
-        "endpoints": ["/random", "/category", "/search"]
-    }
-}
+
+@st.cache_resource
+def prepare_log_indexes():
+    try:
+        ensure_log_indexes(logs_collection)
+        ensure_rollup_indexes(rollups_collection)
+    except Exception as e:
+        st.warning(f"Could not create log indexes. Error: {e}")
+
+prepare_log_indexes()
+
+price_book = PriceBook.from_api_configs(API_CONFIGS)
+usage_rollups = UsageRollups(logs_collection, rollups_collection, db[ROLLUP_STATE_COLLECTION], price_book=price_book)
+# Overview and per-API widgets read the hourly rollups, plus raw logs for the
+# hours after the rollup watermark.
+dashboard_queries = RollupQueries(
+    rollups_collection, DashboardQueries(logs_collection, price_book=price_book), usage_rollups.watermark
+)
 
 
 def make_utc_aware(dt_obj):
@@ -163,6 +109,7 @@ if logs_collection.count_documents({}) == 0:
     st.info("No logs found. Generating dummy data...")
     dummy_logs = generate_dummy_log_data(50000)
     logs_collection.insert_many(dummy_logs)
+    usage_rollups.record(dummy_logs)
     st.success("Dummy log data generated!")
     st.cache_data.clear()
     st.rerun()
@@ -198,45 +145,55 @@ if tickets_collection.count_documents({}) == 0:
     st.success("Dummy tickets generated!")
     st.cache_data.clear()
     st.rerun()
-@st.cache_data(ttl=600)
+@st.cache_data(ttl=60)
+def get_chat_stage_metrics(start_date, end_date):
+    start = datetime.combine(start_date, datetime.min.time(), tzinfo=timezone.utc)
+    end = datetime.combine(end_date + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return load_stage_summaries(chat_metrics_collection, start, end)
+
+@st.cache_resource
+def get_log_partition_cache():
+    return LogPartitionCache(lambda start, end: load_logs(logs_collection, start_date=start, end_date=end))
+
 def get_api_logs(start_date=None, end_date=None):
-    query = {}
-    if start_date:
-        query["timestamp"] = {"$gte": make_utc_aware(datetime.combine(start_date, datetime.min.time()))}
-    if end_date:
-        if "timestamp" not in query:
-            query["timestamp"] = {}
-        query["timestamp"]["$lte"] = make_utc_aware(datetime.combine(end_date, datetime.max.time()))
-            
-    logs = list(logs_collection.find(query))
-    df = pd.DataFrame(logs)
-    if 'timestamp' in df.columns and not df.empty:
-        df["timestamp"] = pd.to_datetime(df["timestamp"], errors='coerce')
-        df.dropna(subset=['timestamp'], inplace=True)
-        if not df.empty:
-            if df["timestamp"].dt.tz is None:
-                df["timestamp"] = df["timestamp"].dt.tz_localize(timezone.utc).dt.tz_convert(timezone.utc)
-            else:
-                df["timestamp"] = df["timestamp"].dt.tz_convert(timezone.utc)
-    else:
-        df['timestamp'] = pd.to_datetime([])
-        
-    expected_cols = ["api", "timestamp", "user_id", "status_code", "country", "api_version", "endpoint", "latency_ms"]
-    for col in expected_cols:
-        if col not in df.columns:
-            if col == 'api': df[col] = "unknown_api"
-            elif col == 'user_id': df[col] = "unknown_user"
-            elif col == 'status_code': df[col] = 200
-            elif col == 'country': df[col] = "Unknown"
-            elif col == 'api_version': df[col] = "v1.0"
-            elif col == 'endpoint': df[col] = "/default"
-            elif col == 'latency_ms': df[col] = 50.0
-            else: df[col] = None
-    
-    return df.copy()
+    # Projected, batched and typed (categoricals, int16, float32); see log_loader.py.
+    # Bounded ranges come from the per-day partition cache, so moving the
+    # range only fetches the days not held yet. The frame is shared with the
+    # cache: derive new frames from it rather than modifying it in place.
+    if start_date is None or end_date is None:
+        return load_logs(logs_collection, start_date=start_date, end_date=end_date)
+    return get_log_partition_cache().get(start_date, end_date)
+
+@st.cache_resource
+def start_usage_rollups():
+    # One background catch-up thread per dashboard process, so no page load
+    # waits on a backfill; the widgets only read the watermark.
+    return usage_rollups.start()
+
+start_usage_rollups()
+
+@st.cache_data(ttl=600)
+def get_widget_data(widget, start_date, end_date, api=None):
+    return dashboard_queries.run(widget, start_date, end_date, api=api)
+
+@st.cache_data(ttl=600)
+def get_usage_totals(start_date, end_date, api=None):
+    return dashboard_queries.totals(start_date, end_date, api=api)
+
+@st.cache_data(ttl=600)
+def get_period_costs(start_date, end_date, api=None):
+    return period_costs(dashboard_queries, start_date, end_date, api=api)
+
+@st.cache_data(ttl=600)
+def get_month_offsets(start_date):
+    return month_offsets(dashboard_queries, start_date)
 
-def calculate_daily_usage(df, api_name=None, start_date=None, end_date=None):
-    if df.empty:
+@st.cache_data(ttl=600)
+def get_latency_summary(start_date, end_date, api=None):
+    return dashboard_queries.latency_summary(start_date, end_date, api=api)
+
+def calculate_daily_usage(df_daily, api_name=None, start_date=None, end_date=None):
+    if df_daily.empty:
         end_date_default = make_utc_aware(end_date) if end_date else datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
         start_date_default = make_utc_aware(start_date) if start_date else end_date_default - timedelta(days=29)
         all_dates = pd.date_range(start=start_date_default, end=end_date_default, freq='D')
@@ -253,19 +210,14 @@ def calculate_daily_usage(df, api_name=None, start_date=None, end_date=None):
             
         return pd.DataFrame({"Date": all_dates, "Count": dummy_counts})
 
-    df_filtered = df
-    if api_name:
-        df_filtered = df_filtered[df_filtered["api"] == api_name]
-    
-    df_daily = df_filtered.groupby(pd.Grouper(key="timestamp", freq="D")).size().reset_index(name="Count")
-    df_daily.columns = ["Date", "Count"]
+    df_daily = df_daily[["day", "calls"]].rename(columns={"day": "Date", "calls": "Count"})
 
-    end_date_range = df_daily['Date'].max() if not df_daily.empty else datetime.now(timezone.utc)
-    start_date_range = df_daily['Date'].min() if not df_daily.empty else end_date_range - timedelta(days=29)
+    end_date_range = df_daily['Date'].max()
+    start_date_range = df_daily['Date'].min()
     
     if start_date and end_date:
         start_date_range = make_utc_aware(datetime.combine(start_date, datetime.min.time()))
-        end_date_range = make_utc_aware(datetime.combine(end_date, datetime.max.time()))
+        end_date_range = make_utc_aware(datetime.combine(end_date, datetime.min.time()))
         
     all_dates = pd.date_range(start=start_date_range, end=end_date_range, freq='D')
     full_df = pd.DataFrame(all_dates, columns=["Date"])
@@ -273,13 +225,9 @@ def calculate_daily_usage(df, api_name=None, start_date=None, end_date=None):
     daily_usage = pd.merge(full_df, df_daily, on="Date", how="left").fillna(0)
     return daily_usage
 
-def calculate_current_daily_usage(df, api_name):
-    if 'api' not in df.columns or df.empty:
-        return 0
-
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    current_day_usage = df[(df["api"] == api_name) & (df["timestamp"] >= today_start)].shape[0]
-    return current_day_usage
+def calculate_current_daily_usage(api_name):
+    today = datetime.now(timezone.utc).date()
+    return int(get_usage_totals(today, today, api=api_name)["calls"])
 
 def get_api_health(api_name):
     config = API_CONFIGS.get(api_name, {})
@@ -356,18 +304,29 @@ with st.sidebar:
     st.markdown("---")
     
    
+    with st.expander("MongoDB Connection Pool"):
+        mongo_pool = pool_stats(mongo_uri, analytics=True)
+        st.metric("Connections In Use", f"{mongo_pool['checked_out']} / {mongo_pool['max_pool_size']}")
+        st.caption(
+            f"Peak {mongo_pool['max_checked_out']} in use, {mongo_pool['connections_open']} open, "
+            f"{mongo_pool['checkout_failures']} checkout failures, "
+            f"max checkout wait {mongo_pool['checkout_wait_ms_max']:.1f} ms."
+        )
+
     auto_refresh = st.checkbox("Enable Auto-Refresh (Every 60s)", value=False, key="auto_refresh_checkbox")
     if auto_refresh:
         from streamlit_extras.rerun_with_delay import rerun_with_delay
         rerun_with_delay(delay_seconds=60)
 
 
-df_logs = get_api_logs(start_date=selected_start_date, end_date=selected_end_date)
-df_logs = df_logs[df_logs['api'] != 'unknown_api'] 
+# Widgets ask Mongo for their own aggregates (see dashboard_queries.py); the
+# raw logs are only loaded for the export in the Overview tab.
+api_counts_df = get_widget_data(WIDGET_CALLS_BY_API, selected_start_date, selected_end_date)
+api_counts_df = api_counts_df[api_counts_df["api"].isin(list(API_CONFIGS))]
 
 st.markdown(" ")
 
-api_tabs_list = ["Overview"] + sorted(list(API_CONFIGS.keys())) + ["Users", "Changelog"]
+api_tabs_list = ["Overview"] + sorted(list(API_CONFIGS.keys())) + ["Users", "Changelog", "Chatbot Latency"]
 selected_api_tab = st.tabs(api_tabs_list)
 
 for i, tab_name in enumerate(api_tabs_list):
@@ -376,27 +335,27 @@ for i, tab_name in enumerate(api_tabs_list):
             st.subheader("Overall API Usage Summary")
             
             col1, col2, col3 = st.columns(3)
-            total_calls_overall = df_logs.shape[0]
-            total_cost_overall = df_logs.apply(lambda row: API_CONFIGS.get(row["api"], {}).get("cost_per_call", 0), axis=1).sum()
+            total_calls_overall = int(api_counts_df["calls"].sum())
+            api_costs_df = get_period_costs(selected_start_date, selected_end_date)
+            api_costs_df = api_costs_df[api_costs_df["api"].isin(list(API_CONFIGS))]
+            total_cost_overall = float(api_costs_df["cost"].sum())
 
             with col1:
                 st.metric(label="Total Calls (Selected Period)", value=f"{total_calls_overall:,}")
             with col2:
                 st.metric(label="Total Estimated Cost (Selected Period)", value=f"${total_cost_overall:,.2f}")
             with col3:
-                avg_latency_overall = df_logs['latency_ms'].mean() if not df_logs.empty else 0
+                avg_latency_overall = (api_counts_df["latency_avg_ms"] * api_counts_df["calls"]).sum() / total_calls_overall if total_calls_overall else 0
                 st.metric(label="Avg Latency (Selected Period)", value=f"{avg_latency_overall:.1f} ms")
 
-            if not df_logs.empty and 'api' in df_logs.columns and df_logs['api'].any():
-                api_counts = df_logs["api"].value_counts().reset_index()
-                api_counts.columns = ["API", "Calls"]
-                api_counts["Cost ($)"] = api_counts.apply(
-                    lambda row: round(row["Calls"] * API_CONFIGS.get(row["API"], {}).get("cost_per_call", 0), 3), axis=1
-                )
-                st.dataframe(api_counts, use_container_width=True)
+            if not api_counts_df.empty:
+                api_counts = api_costs_df[["api", "calls", "cost"]].rename(columns={"api": "API", "calls": "Calls", "cost": "Cost ($)"})
+                api_counts["Cost ($)"] = api_counts["Cost ($)"].round(3)
+                st.dataframe(api_counts.reset_index(drop=True), use_container_width=True)
 
                 st.subheader("API Usage Over Time (All APIs Combined)")
-                df_daily_all = df_logs.groupby([pd.Grouper(key="timestamp", freq="D"), "api"]).size().reset_index(name="Count")
+                df_daily_all = get_widget_data(WIDGET_DAILY_CALLS_BY_API, selected_start_date, selected_end_date)
+                df_daily_all = df_daily_all.rename(columns={"day": "timestamp", "calls": "Count"})
                 
                 if not df_daily_all.empty and df_daily_all['Count'].sum() > 0:
                     fig_all_usage = px.line(df_daily_all, x="timestamp", y="Count", color="api", title="Daily API Usage (All APIs Combined)", template="plotly_white")
@@ -448,17 +407,17 @@ for i, tab_name in enumerate(api_tabs_list):
 
             
             st.subheader("Top API Consumers")
-            if not df_logs.empty and 'user_id' in df_logs.columns:
-                top_users = df_logs["user_id"].value_counts().reset_index()
-                top_users.columns = ["User ID", "Total Calls"]
-                st.dataframe(top_users.head(10), use_container_width=True)
+            top_users = get_widget_data(WIDGET_TOP_USERS, selected_start_date, selected_end_date)
+            if not top_users.empty:
+                top_users = top_users[["user_id", "calls"]].rename(columns={"user_id": "User ID", "calls": "Total Calls"})
+                st.dataframe(top_users, use_container_width=True)
             else:
                 st.info("No user data available.")
 
             st.subheader("Geographical Usage Overview")
-            if not df_logs.empty and 'country' in df_logs.columns and df_logs['country'].nunique() > 1:
-                country_counts = df_logs['country'].value_counts().reset_index()
-                country_counts.columns = ['Country', 'Calls']
+            country_counts = get_widget_data(WIDGET_CALLS_BY_COUNTRY, selected_start_date, selected_end_date)
+            if len(country_counts) > 1:
+                country_counts = country_counts[["country", "calls"]].rename(columns={"country": "Country", "calls": "Calls"})
                 
                 country_coords = {
                     "USA": (37.0902, -95.7129), "Germany": (51.1657, 10.4515), "India": (20.5937, 78.9629),
@@ -487,10 +446,14 @@ for i, tab_name in enumerate(api_tabs_list):
             
             current_time_utc = datetime.now(timezone.utc)
             first_day_of_month = current_time_utc.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            df_current_month = df_logs[df_logs["timestamp"] >= first_day_of_month]
+            month_start_date = max(selected_start_date, first_day_of_month.date())
+            if month_start_date <= selected_end_date:
+                month_costs = get_period_costs(month_start_date, selected_end_date)
+            else:
+                month_costs = pd.DataFrame(columns=["api", "calls", "cost"])
             
-            current_month_cost = df_current_month.apply(lambda row: API_CONFIGS.get(row["api"], {}).get("cost_per_call", 0), axis=1).sum()
-            current_month_calls = df_current_month.shape[0]
+            current_month_cost = float(month_costs["cost"].sum())
+            current_month_calls = int(month_costs["calls"].sum())
 
             col_curr_cost, col_proj_cost = st.columns(2)
             with col_curr_cost:
@@ -512,6 +475,27 @@ for i, tab_name in enumerate(api_tabs_list):
                 else:
                     st.success("Projected cost is within limits.")
 
+            with st.expander("Raw Log Export"):
+                st.caption("Loads every log document in the selected period; the widgets above only fetch aggregates.")
+                if st.button("Load Raw Logs", key="load_raw_logs"):
+                    df_raw_logs = get_api_logs(start_date=selected_start_date, end_date=selected_end_date)
+                    df_raw_logs = df_raw_logs.assign(cost=price_book.log_costs(
+                        df_raw_logs, offsets=get_month_offsets(selected_start_date) if price_book.has_tiers else None
+                    ))
+                    st.metric(label="Log Rows", value=f"{len(df_raw_logs):,}")
+                    log_cache_stats = get_log_partition_cache().stats()
+                    st.caption(
+                        f"Log cache: {log_cache_stats['hit_rate']:.0%} of days served from cache, "
+                        f"{log_cache_stats['partitions']} day partitions, {log_cache_stats['bytes'] / 1024 / 1024:.1f} MB held."
+                    )
+                    st.download_button(
+                        label="Download Raw Logs",
+                        data=df_raw_logs.to_csv(index=False).encode('utf-8'),
+                        file_name=f"api_logs_{selected_start_date}_{selected_end_date}.csv",
+                        mime="text/csv",
+                        key="download_raw_logs"
+                    )
+
         elif tab_name in API_CONFIGS:
             st.header(f"{tab_name} - Detailed Monitoring")
             api_config = API_CONFIGS.get(tab_name, {})
@@ -542,18 +526,21 @@ for i, tab_name in enumerate(api_tabs_list):
 
             for metric_index, selected_option_label in enumerate(sub_options):
                 with metric_tabs[metric_index]:
-                    df_api_filtered = df_logs[df_logs["api"] == tab_name]
+                    df_api_daily = get_widget_data(WIDGET_DAILY_CALLS, selected_start_date, selected_end_date, api=tab_name)
 
                     if selected_option_label == "Usage per API":
                         st.subheader(f"Daily API Usage Trend for {tab_name}")
                         
-                        daily_usage_df = calculate_daily_usage(df_api_filtered, tab_name, start_date=selected_start_date, end_date=selected_end_date)
+                        daily_usage_df = calculate_daily_usage(df_api_daily, tab_name, start_date=selected_start_date, end_date=selected_end_date)
                         
-                        total_calls = df_api_filtered.shape[0] if not df_api_filtered.empty else daily_usage_df['Count'].sum()
+                        total_calls = int(daily_usage_df['Count'].sum())
 
                         col_metric, col_graph = st.columns([1, 3])
                         with col_metric:
                             st.metric(label=f"Total Calls for {tab_name} (Selected Period)", value=f"{total_calls:,}")
+                            latency_summary = get_latency_summary(selected_start_date, selected_end_date, api=tab_name)
+                            if latency_summary["count"]:
+                                st.metric(label="Latency p50 / p95", value=f"{latency_summary['p50_ms']:.0f} / {latency_summary['p95_ms']:.0f} ms")
                             st.markdown("<p>Daily API calls over the selected period.</p>", unsafe_allow_html=True)
                             st.download_button(
                                 label="Download Usage Data",
@@ -577,7 +564,7 @@ for i, tab_name in enumerate(api_tabs_list):
                             st.info(f"Configured Daily Quota: {quota_val:,} calls")
                             st.info(f"Cost per Call: ${cost_per_call}")
 
-                            current_daily_usage = calculate_current_daily_usage(df_api_filtered, tab_name)
+                            current_daily_usage = calculate_current_daily_usage(tab_name)
                             remaining_quota = quota_val - current_daily_usage
 
                             col_metric_quota, col_graph_quota = st.columns([1, 3])
@@ -592,7 +579,7 @@ for i, tab_name in enumerate(api_tabs_list):
                                     st.success("Daily quota is within limits.")
                             
                             with col_graph_quota:
-                                daily_usage_for_quota = calculate_daily_usage(df_api_filtered, tab_name, start_date=selected_start_date, end_date=selected_end_date)
+                                daily_usage_for_quota = calculate_daily_usage(df_api_daily, tab_name, start_date=selected_start_date, end_date=selected_end_date)
                                 daily_usage_dict = daily_usage_for_quota.set_index('Date')['Count'].to_dict()
 
                                 all_dates_for_plot = pd.date_range(start=daily_usage_for_quota['Date'].min(), end=daily_usage_for_quota['Date'].max(), freq='D')
@@ -664,10 +651,16 @@ for i, tab_name in enumerate(api_tabs_list):
                         st.subheader(f"Projected Daily Cost for {tab_name}")
 
                         api_config = API_CONFIGS.get(tab_name, {})
-                        cost_per_call = api_config.get("cost_per_call", 0)
+                        cost_per_call = price_book.unit_price(tab_name)
                         
                         if cost_per_call > 0:
-                            current_daily_usage = calculate_current_daily_usage(df_api_filtered, tab_name)
+                            today = datetime.now(timezone.utc).date()
+                            today_costs = get_period_costs(today, today, api=tab_name)
+                            current_daily_usage = int(today_costs["calls"].sum())
+                            current_daily_cost = float(today_costs["cost"].sum())
+                            if current_daily_usage:
+                                # Effective price so far today: endpoint mix and volume tiers included.
+                                cost_per_call = current_daily_cost / current_daily_usage
                             
                             hours_passed = (datetime.now(timezone.utc) - datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds() / 3600
                             if hours_passed == 0: hours_passed = 0.1
@@ -686,7 +679,7 @@ for i, tab_name in enumerate(api_tabs_list):
                             with col_proj_graph:
                                 cost_data = pd.DataFrame({
                                     "Category": ["Current Cost", "Projected Additional Cost"],
-                                    "Cost": [current_daily_usage * cost_per_call, (projected_total_daily_calls - current_daily_usage) * cost_per_call]
+                                    "Cost": [current_daily_usage * cost_per_call, projected_cost - current_daily_usage * cost_per_call]
                                 })
                                 fig_cost_proj = px.bar(cost_data, x="Category", y="Cost", 
                                                         title=f"Cost Projection for {tab_name}",
@@ -883,6 +876,52 @@ for i, tab_name in enumerate(api_tabs_list):
                     """, unsafe_allow_html=True)
                 st.markdown("---")
 
+        elif tab_name == "Chatbot Latency":
+            st.subheader("Chatbot Latency by Stage")
+            stage_summaries, hourly_means = get_chat_stage_metrics(selected_start_date, selected_end_date)
+            if stage_summaries:
+                df_stages = pd.DataFrame([
+                    {"Stage": stage, "Samples": summary["count"], "Mean (ms)": summary["mean_ms"],
+                     "p50 (ms)": summary["p50_ms"], "p95 (ms)": summary["p95_ms"],
+                     "p99 (ms)": summary["p99_ms"], "Max (ms)": summary["max_ms"]}
+                    for stage, summary in sorted(
+                        stage_summaries.items(),
+                        key=lambda item: STAGES.index(item[0]) if item[0] in STAGES else len(STAGES)
+                    )
+                ])
+                turn_summary = stage_summaries.get("turn")
+                if turn_summary:
+                    canned_count = stage_summaries.get(STAGE_CANNED_ANSWER, {}).get("count", 0)
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric(label="Chat Turns (Selected Period)", value=f"{turn_summary['count']:,}")
+                    with col2:
+                        st.metric(label="Turn p50", value=f"{turn_summary['p50_ms']:,.0f} ms")
+                    with col3:
+                        st.metric(label="Turn p95", value=f"{turn_summary['p95_ms']:,.0f} ms")
+                    with col4:
+                        st.metric(label="Answered from Canned Tier",
+                                  value=f"{canned_count / turn_summary['count']:.1%}" if turn_summary['count'] else "0%")
+
+                df_stage_bars = df_stages[df_stages["Stage"] != "turn"].melt(
+                    id_vars="Stage", value_vars=["p50 (ms)", "p95 (ms)", "p99 (ms)"],
+                    var_name="Percentile", value_name="Latency (ms)"
+                )
+                fig_stages = px.bar(df_stage_bars, x="Stage", y="Latency (ms)", color="Percentile", barmode="group",
+                                    title="Per-Stage Latency Percentiles", template="plotly_white", log_y=True)
+                st.plotly_chart(fig_stages, use_container_width=True)
+                st.dataframe(df_stages.round(1), use_container_width=True, hide_index=True)
+
+                if hourly_means:
+                    df_hourly = pd.DataFrame(hourly_means)
+                    df_hourly = df_hourly[df_hourly["stage"] != "turn"]
+                    fig_hourly = px.area(df_hourly, x="hour", y="mean_ms", color="stage",
+                                         title="Mean Time per Stage (Hourly)", template="plotly_white",
+                                         labels={"hour": "Hour (UTC)", "mean_ms": "Mean (ms)", "stage": "Stage"})
+                    st.plotly_chart(fig_hourly, use_container_width=True)
+            else:
+                st.info("No chatbot latency metrics recorded for the selected period yet.")
+
 
 st.markdown("---")
 st.subheader("Support Tickets")
@@ -915,7 +954,7 @@ with support_tabs[0]:
             <div class="ticket-card" style="border-left: 8px solid {border_color};">
                 <div class="ticket-header">
                     <span class="ticket-title"><strong>{ticket.get('query', 'No title provided')}</strong></span>
-                    <span class="ticket-aging">Active: <strong>{hours_open} hours</strong></span>
+                    <span class="ticket-aging">Active: <strong>{hours_open} hours</strong> | Reported: <strong>{ticket.get('occurrence_count', 1)}x</strong></span>
                 </div>
                 <div class="ticket-subheader">
                     <span class="ticket-id">Ticket ID: <code>{ticket['_id']}</code></span>
@@ -937,7 +976,8 @@ with support_tabs[0]:
             </div>
             """, unsafe_allow_html=True)
             if st.button("Close Ticket", key=f"close_btn_{ticket['_id']}", use_container_width=True):
-                tickets_collection.update_one({"_id": ticket["_id"]}, {"$set": {"status": "closed", "closed_at": datetime.now(timezone.utc).isoformat()}}) 
+                closed_at_iso = datetime.now(timezone.utc).isoformat()
+                tickets_collection.update_one({"_id": ticket["_id"]}, {"$set": {"status": "closed", "closed_at": closed_at_iso, "last_updated": closed_at_iso}})
                 st.success(f"Ticket #{ticket['_id']} closed!")
                 st.rerun()
 
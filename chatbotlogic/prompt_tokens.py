@@ -0,0 +1,30 @@
+import re
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+# False when tiktoken (or its vocabulary download) is unavailable and counts
+# come from the approximation below.
+EXACT_COUNTS = _ENCODING is not None
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+# Chat templates wrap every message in role markers.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    # Offline approximation of a BPE vocabulary: one token per punctuation mark
+    # and roughly one per four characters of each word.
+    return sum(max(1, (len(piece) + 3) // 4) for piece in _PIECE_RE.findall(text))
+
+
+def count_message_tokens(messages):
+    return sum(count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS for message in messages)
@@ -0,0 +1,98 @@
+import math
+import os
+import re
+import threading
+from collections import namedtuple
+
+from intent_router import INTENT_GREETING, INTENT_INTRODUCTION, GREETING_REPLY, INTRODUCTION_REPLY, resolve_intent
+
+ROUTE_ANSWER = "answer"
+ROUTE_TICKET = "ticket"
+ROUTE_CANNED = "canned"
+
+DEFAULT_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.5"))
+
+# Lexical evidence that a query is about APIHub. Catalog names and endpoints are
+# strong signals. Generic HTTP and error vocabulary ("get", "request", "error",
+# "header") is enough on its own, as it was for the keyword list this replaced:
+# "what does error 401 mean" is a support question, not an off-topic one.
+API_TERM_WEIGHTS = {
+    "apihub": 3.0, "api": 2.0, "endpoint": 2.0, "authentication": 2.0, "authenticate": 2.0,
+    "auth": 1.5, "token": 1.5, "key": 1.0, "apikey": 2.0, "rate limit": 2.0, "status code": 1.5,
+    "image": 1.0, "video": 1.0, "ecommerce": 1.5, "qr": 1.5, "qr code": 2.0, "weather": 1.0,
+    "profile photo": 1.5, "joke": 1.0, "product": 0.75, "quota": 1.5,
+    "postimg": 3.0, "getyourimage": 3.0, "getimagetotext": 3.0, "reset-your-post": 3.0,
+    "getvideo": 3.0, "createproduct": 3.0, "getallproduct": 3.0, "deleteproduct": 3.0,
+    "qrcodegenerator": 3.0, "getweatherdata": 3.0, "namedphoto": 3.0, "jokesapi": 3.0,
+    "post": 1.0, "get": 1.0, "put": 1.0, "delete": 1.0, "request": 1.0, "response": 1.0,
+    "header": 1.0, "body": 1.0, "parameter": 1.0, "query": 1.0, "error": 1.0, "status": 1.0, "json": 1.0,
+}
+
+# Logistic calibration: a single generic term lands on 0.5, the default
+# threshold, and a single strong term comfortably above it.
+_SCORE_BIAS = 1.0
+_SCORE_SCALE = 1.25
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9\-']*")
+
+RouteDecision = namedtuple("RouteDecision", ["action", "confidence", "reply", "matched_terms"])
+
+_UNRESOLVED = object()
+
+
+def _tokenize(text):
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token not in API_TERM_WEIGHTS and token.endswith("s") and token[:-1] in API_TERM_WEIGHTS:
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def score_api_relatedness(text):
+    tokens = _tokenize(text)
+    terms = set(tokens)
+    terms.update(" ".join(pair) for pair in zip(tokens, tokens[1:]))
+    matched = sorted(term for term in terms if term in API_TERM_WEIGHTS)
+    score = sum(API_TERM_WEIGHTS[term] for term in matched)
+    confidence = 1.0 / (1.0 + math.exp(-(score - _SCORE_BIAS) * _SCORE_SCALE))
+    return confidence, matched
+
+
+class QueryRouter:
+    def __init__(self, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD):
+        self.confidence_threshold = confidence_threshold
+        self._lock = threading.Lock()
+        self._counts = {ROUTE_ANSWER: 0, ROUTE_TICKET: 0, ROUTE_CANNED: 0}
+
+    def route(self, query, intent=_UNRESOLVED):
+        query_lower = query.lower().strip()
+        if intent is _UNRESOLVED:
+            intent = resolve_intent(query_lower)
+        intent_name = intent.intent if intent else None
+        if intent_name == INTENT_GREETING:
+            decision = RouteDecision(ROUTE_CANNED, 1.0, GREETING_REPLY, [])
+        elif intent_name == INTENT_INTRODUCTION:
+            decision = RouteDecision(ROUTE_CANNED, 1.0, INTRODUCTION_REPLY, [])
+        else:
+            confidence, matched = score_api_relatedness(query_lower)
+            action = ROUTE_ANSWER if confidence >= self.confidence_threshold else ROUTE_TICKET
+            decision = RouteDecision(action, confidence, None, matched)
+        with self._lock:
+            self._counts[decision.action] += 1
+        return decision
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        return {
+            "total_routed": total,
+            "answered_by_llm": counts[ROUTE_ANSWER],
+            "ticketed": counts[ROUTE_TICKET],
+            "canned": counts[ROUTE_CANNED],
+            # Off-topic queries used to go through chat_model.invoke before being
+            # ticketed; every ticket decision is now one provider call avoided.
+            "llm_calls_saved": counts[ROUTE_TICKET],
+            "confidence_threshold": self.confidence_threshold,
+        }
@@ -0,0 +1,179 @@
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+DEFAULT_SESSION_BURST = float(os.getenv("RATE_LIMIT_SESSION_BURST", "5"))
+DEFAULT_SESSION_REFILL_PER_MINUTE = float(os.getenv("RATE_LIMIT_SESSION_PER_MINUTE", "10"))
+DEFAULT_GLOBAL_BURST = float(os.getenv("RATE_LIMIT_GLOBAL_BURST", "60"))
+DEFAULT_GLOBAL_REFILL_PER_MINUTE = float(os.getenv("RATE_LIMIT_GLOBAL_PER_MINUTE", "300"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+DEFAULT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+_PRUNE_INTERVAL = 500
+
+REASON_ALLOWED = "allowed"
+REASON_SESSION = "session_limit"
+REASON_GLOBAL = "global_limit"
+REASON_CONCURRENCY = "concurrency_limit"
+
+SLOW_DOWN_REPLY = "You're sending questions faster than APIMAN can answer them. Please wait about {wait} and try again."
+BUSY_REPLY = "APIMAN is answering a lot of questions right now. Please try again in a few seconds."
+
+LimitDecision = namedtuple("LimitDecision", ["allowed", "reason", "retry_after"])
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, decision):
+        super().__init__(decision.reason)
+        self.decision = decision
+
+    @property
+    def reply(self):
+        if self.decision.reason == REASON_SESSION:
+            seconds = max(1, math.ceil(self.decision.retry_after))
+            return SLOW_DOWN_REPLY.format(wait=f"{seconds} second{'s' if seconds != 1 else ''}")
+        return BUSY_REPLY
+
+
+class TokenBucket:
+    def __init__(self, capacity, refill_per_second, now=None):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+            self.updated = now
+
+    def take(self, now, amount=1.0):
+        self._refill(now)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        if self.refill_per_second <= 0:
+            return math.inf
+        return (amount - self.tokens) / self.refill_per_second
+
+    def give_back(self, amount=1.0):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+# Gatekeeper in front of the chat model: a token bucket per session, one shared
+# bucket for the whole process, and a semaphore so concurrent sessions queue for
+# a provider slot instead of all calling Groq at once.
+class RateLimiter:
+    def __init__(self, session_burst=DEFAULT_SESSION_BURST, session_per_minute=DEFAULT_SESSION_REFILL_PER_MINUTE,
+                 global_burst=DEFAULT_GLOBAL_BURST, global_per_minute=DEFAULT_GLOBAL_REFILL_PER_MINUTE,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, queue_timeout=DEFAULT_QUEUE_TIMEOUT_SECONDS):
+        self.session_burst = session_burst
+        self.session_refill = session_per_minute / 60.0
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._global = TokenBucket(global_burst, global_per_minute / 60.0)
+        self._sessions = {}
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._checks = 0
+        self._counters = {
+            REASON_ALLOWED: 0, REASON_SESSION: 0, REASON_GLOBAL: 0, REASON_CONCURRENCY: 0,
+            "queued": 0, "queue_wait_seconds_total": 0.0, "max_in_flight": 0,
+        }
+
+    def check(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._checks += 1
+            if self._checks % _PRUNE_INTERVAL == 0:
+                self._prune(now)
+            bucket = self._sessions.get(session_id)
+            if bucket is None:
+                bucket = self._sessions[session_id] = TokenBucket(self.session_burst, self.session_refill, now)
+            wait = bucket.take(now)
+            if wait:
+                self._counters[REASON_SESSION] += 1
+                return LimitDecision(False, REASON_SESSION, wait)
+            wait = self._global.take(now)
+            if wait:
+                # The session did nothing wrong; don't charge it for the global refusal.
+                bucket.give_back()
+                self._counters[REASON_GLOBAL] += 1
+                return LimitDecision(False, REASON_GLOBAL, wait)
+            self._counters[REASON_ALLOWED] += 1
+            return LimitDecision(True, REASON_ALLOWED, 0.0)
+
+    def _prune(self, now):
+        # A full bucket is indistinguishable from a new one, so it can go.
+        for session_id in [s for s, bucket in self._sessions.items() if bucket.is_full(now)]:
+            del self._sessions[session_id]
+
+    def refund(self, session_id):
+        # Returns the tokens check() took, for a request that was allowed but
+        # then never reached the provider.
+        with self._lock:
+            bucket = self._sessions.get(session_id)
+            if bucket is not None:
+                bucket.give_back()
+            self._global.give_back()
+
+    def _acquire_slot(self):
+        started = time.monotonic()
+        if not self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self._counters["queued"] += 1
+            if not self._semaphore.acquire(timeout=self.queue_timeout):
+                with self._lock:
+                    self._counters[REASON_CONCURRENCY] += 1
+                raise RateLimitExceeded(LimitDecision(False, REASON_CONCURRENCY, self.queue_timeout))
+        with self._lock:
+            self._counters["queue_wait_seconds_total"] += time.monotonic() - started
+            self._in_flight += 1
+            self._counters["max_in_flight"] = max(self._counters["max_in_flight"], self._in_flight)
+
+    def _release_slot(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._semaphore.release()
+
+    @contextmanager
+    def slot(self):
+        # Only the provider-slot half of limit(), for callers that checked
+        # the token buckets themselves.
+        self._acquire_slot()
+        try:
+            yield
+        finally:
+            self._release_slot()
+
+    @contextmanager
+    def limit(self, session_id):
+        decision = self.check(session_id)
+        if not decision.allowed:
+            raise RateLimitExceeded(decision)
+        try:
+            self._acquire_slot()
+        except RateLimitExceeded:
+            # Refused while queueing: the request never ran, so it keeps its tokens.
+            self.refund(session_id)
+            raise
+        try:
+            yield decision
+        finally:
+            self._release_slot()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = self._in_flight
+            stats["tracked_sessions"] = len(self._sessions)
+        stats["max_concurrency"] = self.max_concurrency
+        stats["denied"] = stats[REASON_SESSION] + stats[REASON_GLOBAL] + stats[REASON_CONCURRENCY]
+        return stats
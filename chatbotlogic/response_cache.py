@@ -0,0 +1,164 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+DEFAULT_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+DEFAULT_MAX_SHARED_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_SHARED_ENTRIES", "20000"))
+
+# How many shared-tier writes happen between size-limit sweeps.
+_SHARED_TRIM_INTERVAL = 100
+
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s?!.]+$")
+
+
+def normalize_query(query):
+    return _TRAILING_PUNCTUATION_RE.sub("", " ".join(query.lower().split()))
+
+
+def prompt_fingerprint(system_prompt):
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    def __init__(self, system_prompt, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 collection=None, max_shared_entries=DEFAULT_MAX_SHARED_ENTRIES):
+        self.prompt_hash = prompt_fingerprint(system_prompt)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_shared_entries = max_shared_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "local_hits": 0, "shared_hits": 0, "misses": 0, "stores": 0,
+            "evictions": 0, "expirations": 0, "shared_errors": 0,
+        }
+        self._shared_writes = 0
+        self._collection = collection
+        if collection is not None:
+            self._init_shared_tier()
+
+    def _init_shared_tier(self):
+        try:
+            # Keys include the prompt hash, so answers produced under a
+            # different SYSTEM_PROMPT are never read and age out here.
+            self._collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception:
+            self._count("shared_errors")
+            self._collection = None
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def make_key(self, query, context=""):
+        # context: fingerprint of the earlier turns (see
+        # context_builder.context_fingerprint); a follow-up is only answered
+        # from a conversation that led up to it the same way.
+        return hashlib.sha256(
+            f"{self.prompt_hash}\x00{context}\x00{normalize_query(query)}".encode("utf-8")
+        ).hexdigest()
+
+    def get(self, query, context=""):
+        key = self.make_key(query, context)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._counters["local_hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+                self._counters["expirations"] += 1
+
+        response = self._get_shared(key)
+        if response is not None:
+            self._put_local(key, response)
+            self._count("shared_hits")
+            return response
+        self._count("misses")
+        return None
+
+    def put(self, query, response, context=""):
+        if not response:
+            return
+        key = self.make_key(query, context)
+        self._put_local(key, response)
+        self._count("stores")
+        self._put_shared(key, query, response)
+
+    def _put_local(self, key, response):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _get_shared(self, key):
+        if self._collection is None:
+            return None
+        try:
+            doc = self._collection.find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"response": 1}
+            )
+            return doc["response"] if doc else None
+        except Exception:
+            self._count("shared_errors")
+            return None
+
+    def _put_shared(self, key, query, response):
+        if self._collection is None:
+            return
+        now = datetime.now(timezone.utc)
+        try:
+            self._collection.replace_one(
+                {"_id": key},
+                {
+                    "prompt_hash": self.prompt_hash,
+                    "query": normalize_query(query),
+                    "response": response,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds),
+                },
+                upsert=True
+            )
+            with self._lock:
+                self._shared_writes += 1
+                trim_due = self._shared_writes % _SHARED_TRIM_INTERVAL == 0
+            if trim_due:
+                self._trim_shared()
+        except Exception:
+            self._count("shared_errors")
+
+    def _trim_shared(self):
+        overflow = self._collection.estimated_document_count() - self.max_shared_entries
+        if overflow <= 0:
+            return
+        oldest = self._collection.find({}, {"_id": 1}).sort("created_at", 1).limit(overflow)
+        self._collection.delete_many({"_id": {"$in": [doc["_id"] for doc in oldest]}})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._collection is not None:
+            try:
+                self._collection.delete_many({})
+            except Exception:
+                self._count("shared_errors")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["local_entries"] = len(self._entries)
+        lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["local_hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        stats["shared_tier"] = self._collection is not None
+        stats["prompt_hash"] = self.prompt_hash
+        return stats
@@ -0,0 +1,249 @@
+import json
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from response_cache import normalize_query, prompt_fingerprint
+
+DEFAULT_SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+DEFAULT_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "604800"))
+DEFAULT_PERSIST_INTERVAL_SECONDS = float(os.getenv("SEMANTIC_CACHE_PERSIST_SECONDS", "5"))
+DEFAULT_CACHE_DIR = os.getenv(
+    "SEMANTIC_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".semantic_cache")
+)
+
+EMBEDDING_DIM = 2048
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset((
+    "a", "an", "the", "i", "me", "my", "we", "you", "your", "it", "is", "are", "was", "be", "do", "does",
+    "did", "how", "what", "which", "can", "could", "should", "would", "to", "for", "of", "on", "in", "with",
+    "and", "or", "about", "please", "tell", "explain", "use", "used", "using", "there", "this", "that", "any", "way",
+))
+
+# Two questions are only interchangeable when they are about the same APIs and
+# endpoints; "auth the image api" must never be answered from "auth the video api".
+CATALOG_ENTITIES = {
+    "image": "image", "img": "image", "video": "video", "ecommerce": "ecommerce", "product": "ecommerce",
+    "qr": "qr", "qrcode": "qr", "weather": "weather", "profile": "profile", "photo": "profile",
+    "joke": "jokes", "jokes": "jokes",
+    "postimg": "/postimg", "getyourimage": "/getyourimage", "getimagetotext": "/getimagetotext",
+    "reset": "/reset-your-post", "getvideo": "/getvideo", "createproduct": "/createproduct",
+    "getallproduct": "/getallproduct", "deleteproduct": "/deleteproduct",
+    "qrcodegenerator": "/qrcodegenerator", "getweatherdata": "/getweatherdata",
+    "namedphoto": "/namedphoto", "jokesapi": "/jokesapi",
+}
+
+
+def _stem(word):
+    for suffix in ("ication", "ation", "ing", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def _content_words(text):
+    return [word for word in _WORD_RE.findall(normalize_query(text)) if word not in STOPWORDS]
+
+
+def _add_feature(vector, feature, weight):
+    h = zlib.crc32(feature.encode("utf-8"))
+    vector[h % EMBEDDING_DIM] += weight if h & 0x80000000 else -weight
+
+
+def embed(text):
+    # Hashing vectorizer over stemmed words, 4-char word prefixes and character
+    # trigrams: cheap, CPU-only, deterministic across processes, and tolerant of
+    # abbreviations such as "auth" vs "authentication".
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in _content_words(text):
+        stem = _stem(word)
+        _add_feature(vector, "w:" + stem, 1.0)
+        _add_feature(vector, "p:" + stem[:4], 1.0)
+        padded = f"<{stem}>"
+        for i in range(len(padded) - 2):
+            _add_feature(vector, "c:" + padded[i:i + 3], 0.25)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def extract_entities(text):
+    return sorted({CATALOG_ENTITIES[word] for word in _content_words(text) if word in CATALOG_ENTITIES})
+
+
+# Entries live in a fixed ring of max_entries slots: once full, each put()
+# overwrites the oldest slot, and expired entries are skipped by lookups until
+# their slot comes round. A background thread writes a snapshot to cache_dir
+# every persist_interval seconds when something changed, so a put() on the
+# chat path never touches the disk; stop() writes whatever is still pending.
+# The snapshot is one file replaced in a single step, so processes sharing
+# cache_dir never pair one writer's vectors with another's entries.
+class SemanticCache:
+    def __init__(self, system_prompt, cache_dir=DEFAULT_CACHE_DIR, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD,
+                 max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 persist_interval=DEFAULT_PERSIST_INTERVAL_SECONDS):
+        self.prompt_hash = prompt_fingerprint(system_prompt)
+        self.cache_dir = cache_dir
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_interval = persist_interval
+        self._lock = threading.Lock()
+        # Serializes writers of the snapshot: the flusher thread and stop().
+        self._persist_lock = threading.Lock()
+        self._vectors = np.zeros((max_entries, EMBEDDING_DIM), dtype=np.float32)
+        self._entries = [None] * max_entries
+        self._count = 0
+        self._next = 0
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "persists": 0, "persist_errors": 0}
+        self._load()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="semantic-cache-persister", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.persist_interval):
+            self.flush()
+
+    @property
+    def _snapshot_path(self):
+        return os.path.join(self.cache_dir, "semantic_cache.npz")
+
+    def _load(self):
+        try:
+            with np.load(self._snapshot_path, allow_pickle=False) as snapshot:
+                vectors = snapshot["vectors"]
+                meta = json.loads(str(snapshot["meta"]))
+        except (OSError, ValueError, KeyError):
+            return
+        entries = meta.get("entries", [])
+        if (meta.get("prompt_hash") != self.prompt_hash or vectors.shape[1:] != (EMBEDDING_DIM,)
+                or len(entries) != len(vectors)):
+            return
+        now = time.time()
+        for row, entry in zip(vectors, entries):
+            if entry["expires_at"] > now:
+                self._store(row, entry)
+
+    def _slots_oldest_first(self):
+        if self._count < self.max_entries:
+            return list(range(self._count))
+        return list(range(self._next, self.max_entries)) + list(range(self._next))
+
+    def flush(self):
+        # Snapshot under the lock, write outside it; lookups and puts only wait
+        # for the copy, not for the disk.
+        with self._persist_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                now = time.time()
+                slots = [slot for slot in self._slots_oldest_first() if self._entries[slot]["expires_at"] > now]
+                vectors = self._vectors[slots]
+                entries = [dict(self._entries[slot]) for slot in slots]
+                self._dirty = False
+            meta = json.dumps({"prompt_hash": self.prompt_hash, "entries": entries})
+            tmp_path = f"{self._snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(tmp_path, "wb") as f:
+                    np.savez(f, vectors=vectors, meta=np.array(meta))
+                os.replace(tmp_path, self._snapshot_path)
+            except OSError:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                with self._lock:
+                    self._dirty = True
+                    self._counters["persist_errors"] += 1
+                return
+            with self._lock:
+                self._counters["persists"] += 1
+
+    def lookup(self, query, similarity_threshold=None):
+        threshold = self.similarity_threshold if similarity_threshold is None else similarity_threshold
+        vector = embed(query)
+        entities = extract_entities(query)
+        now = time.time()
+        with self._lock:
+            count = self._count
+            if count and vector.any():
+                scores = self._vectors[:count] @ vector
+                for row in np.argsort(scores)[::-1]:
+                    score = float(scores[row])
+                    if score < threshold:
+                        break
+                    entry = self._entries[row]
+                    if entry["entities"] == entities and entry["expires_at"] > now:
+                        entry["hits"] += 1
+                        self._counters["hits"] += 1
+                        return entry["response"], score
+            self._counters["misses"] += 1
+        return None, 0.0
+
+    def get(self, query):
+        return self.lookup(query)[0]
+
+    def _store(self, vector, entry):
+        # Caller holds the lock (or is the constructor).
+        if self._count == self.max_entries:
+            self._counters["evictions"] += 1
+        self._vectors[self._next] = vector
+        self._entries[self._next] = entry
+        self._next = (self._next + 1) % self.max_entries
+        self._count = min(self._count + 1, self.max_entries)
+
+    def put(self, query, response):
+        vector = embed(query)
+        if not response or not vector.any():
+            return
+        entry = {
+            "query": normalize_query(query),
+            "entities": extract_entities(query),
+            "response": response,
+            "expires_at": time.time() + self.ttl_seconds,
+            "hits": 0,
+        }
+        with self._lock:
+            self._store(vector, entry)
+            self._counters["stores"] += 1
+            self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._entries = [None] * self.max_entries
+            self._count = 0
+            self._next = 0
+            self._dirty = True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = self._count
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["similarity_threshold"] = self.similarity_threshold
+        return stats
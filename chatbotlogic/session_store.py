@@ -0,0 +1,221 @@
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+
+SESSIONS_COLLECTION = "chat_sessions"
+DEFAULT_FLUSH_INTERVAL_SECONDS = float(os.getenv("CHAT_SESSION_FLUSH_SECONDS", "1"))
+DEFAULT_IDLE_SECONDS = float(os.getenv("CHAT_SESSION_IDLE_SECONDS", "1800"))
+DEFAULT_TTL_HOURS = float(os.getenv("CHAT_SESSION_TTL_HOURS", "72"))
+# Per-reply timings kept for the sidebar's "last 20 replies" figures.
+RECENT_LLM_TIMINGS = 20
+# Prompt token breakdowns kept per session; the sidebar shows the last one.
+RECENT_PROMPT_TOKEN_LOGS = 20
+
+logger = logging.getLogger("apiman.session_store")
+
+
+class ChatSession:
+    def __init__(self, session_id=None, history=None):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.history = history if history is not None else []
+        # Messages of history already persisted or queued for persisting.
+        self.stored_length = len(self.history)
+        self.llm_timings = deque(maxlen=RECENT_LLM_TIMINGS)
+        self.prompt_token_log = deque(maxlen=RECENT_PROMPT_TOKEN_LOGS)
+        self.lock = threading.Lock()
+
+
+def sign_session_id(session_id, secret):
+    # "<session_id>.<mac>": a link to a conversation that can't be made up
+    # by guessing or copying someone else's session id.
+    mac = hmac.new(secret.encode("utf-8"), session_id.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+    return f"{session_id}.{mac}"
+
+
+def verify_session_token(token, secret):
+    # -> the session id of a token from sign_session_id, or None if it was
+    # not signed with this secret.
+    session_id, _, mac = (token or "").rpartition(".")
+    if not session_id or not hmac.compare_digest(sign_session_id(session_id, secret), token):
+        return None
+    return session_id
+
+
+def ensure_session_indexes(collection, ttl_hours=DEFAULT_TTL_HOURS):
+    # Sessions nobody has touched for ttl_hours are removed by Mongo itself.
+    collection.create_index("last_active", expireAfterSeconds=int(timedelta(hours=ttl_hours).total_seconds()))
+
+
+# Chat history kept outside the web process, so any replica can serve any
+# session and a restart loses nothing. One document per session:
+#   {_id: session_id, messages: [...], length: n, last_active: datetime}
+# Appends are write-behind: save() only queues the new messages and a
+# background thread pushes each session's batch with one update every flush
+# interval. Reads are incremental: refresh() asks only for messages past the
+# ones already held, and an up-to-date session costs one _id lookup that
+# returns nothing. Sessions idle in this process are dropped from memory.
+class SessionStore:
+    def __init__(self, collection=None, flush_interval=DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._last_used = {}
+        self._pending = defaultdict(list)
+        self._stop = threading.Event()
+        self._thread = None
+        self._counters = {
+            "opened": 0, "loaded": 0, "refreshes": 0, "messages_read": 0, "messages_queued": 0,
+            "messages_written": 0, "writes": 0, "write_errors": 0, "evicted": 0,
+        }
+        self._last_error = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="session-store-flusher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            self.evict_idle()
+
+    def open(self, session_id=None):
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock:
+            session = self._sessions.get(session_id)
+            self._last_used[session_id] = time.monotonic()
+            self._counters["opened"] += 1
+        if session is not None:
+            self.refresh(session)
+            return session
+        history = []
+        if self.collection is not None:
+            try:
+                doc = self.collection.find_one({"_id": session_id}, {"messages": 1})
+                history = doc.get("messages", []) if doc else []
+            except Exception as e:
+                logger.warning("could not load chat session %s: %s", session_id, e)
+        session = ChatSession(session_id, history=history)
+        with self._lock:
+            # Another thread may have opened the same session meanwhile.
+            session = self._sessions.setdefault(session_id, session)
+            self._counters["loaded"] += 1
+            self._counters["messages_read"] += len(history)
+        return session
+
+    def refresh(self, session):
+        # Pulls messages another replica appended since this one last looked.
+        # Skipped while this process still has unflushed messages for the
+        # session, since it is then the one writing.
+        if self.collection is None:
+            return 0
+        with self._lock:
+            if self._pending.get(session.session_id):
+                return 0
+            self._counters["refreshes"] += 1
+        known = session.stored_length
+        try:
+            doc = self.collection.find_one(
+                {"_id": session.session_id, "length": {"$gt": known}},
+                {"length": 1, "messages": {"$slice": [known, 100000]}}
+            )
+        except Exception as e:
+            logger.warning("could not refresh chat session %s: %s", session.session_id, e)
+            return 0
+        if not doc:
+            return 0
+        new_messages = doc.get("messages", [])
+        with session.lock:
+            if session.stored_length != known:
+                return 0
+            session.history.extend(new_messages)
+            session.stored_length += len(new_messages)
+        with self._lock:
+            self._counters["messages_read"] += len(new_messages)
+        return len(new_messages)
+
+    def save(self, session):
+        # Queues whatever was appended to session.history since the last save.
+        with session.lock:
+            new_messages = session.history[session.stored_length:]
+            session.stored_length = len(session.history)
+        with self._lock:
+            self._sessions.setdefault(session.session_id, session)
+            self._last_used[session.session_id] = time.monotonic()
+            if new_messages and self.collection is not None:
+                self._pending[session.session_id].extend(dict(m) for m in new_messages)
+                self._counters["messages_queued"] += len(new_messages)
+        return len(new_messages)
+
+    def flush(self):
+        if self.collection is None:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(list)
+        written = 0
+        now = datetime.now(timezone.utc)
+        for session_id, messages in pending.items():
+            if not messages:
+                continue
+            try:
+                self.collection.update_one(
+                    {"_id": session_id},
+                    {
+                        "$push": {"messages": {"$each": messages}},
+                        "$inc": {"length": len(messages)},
+                        "$set": {"last_active": now},
+                        "$setOnInsert": {"created_at": now},
+                    },
+                    upsert=True
+                )
+                written += len(messages)
+                with self._lock:
+                    self._counters["writes"] += 1
+            except Exception as e:
+                # Put the batch back in front of anything queued since.
+                with self._lock:
+                    self._pending[session_id][:0] = messages
+                    self._counters["write_errors"] += 1
+                    self._last_error = str(e)
+        with self._lock:
+            self._counters["messages_written"] += written
+        return written
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [
+                sid for sid, used in self._last_used.items()
+                if used < cutoff and not self._pending.get(sid)
+            ]
+            for sid in idle:
+                self._sessions.pop(sid, None)
+                del self._last_used[sid]
+            self._counters["evicted"] += len(idle)
+        return len(idle)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["active"] = len(self._sessions)
+            stats["pending_messages"] = sum(len(messages) for messages in self._pending.values())
+            stats["last_error"] = self._last_error
+        stats["flusher_alive"] = self._thread is not None and self._thread.is_alive()
+        return stats
@@ -0,0 +1,89 @@
+import hashlib
+import threading
+
+from response_cache import normalize_query
+
+
+def prompt_key(messages):
+    # Whitespace, case and trailing punctuation in the user's message do not
+    # change the answer, so "How do I use /getqr?" and "how do i use /getqr"
+    # share a flight. Earlier messages must match exactly.
+    digest = hashlib.sha256()
+    last = len(messages) - 1
+    for index, message in enumerate(messages):
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        if index == last and message.type == "human":
+            content = normalize_query(content)
+        digest.update(message.type.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.completed = False
+        self.followers = 0
+
+
+# Process-wide: concurrent callers with the same key share one execution of fn.
+# The first caller runs it; the rest block until it finishes and receive the
+# same result or Exception. Anything else the leader raises (a Streamlit rerun
+# or stop, KeyboardInterrupt) belongs to the leader alone: its followers start
+# a new flight instead.
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._counters = {"calls": 0, "executions": 0, "coalesced": 0, "max_followers": 0}
+
+    def do(self, key, fn):
+        while True:
+            outcome = self._do_once(key, fn)
+            if outcome is not None:
+                return outcome
+
+    def _do_once(self, key, fn):
+        with self._lock:
+            self._counters["calls"] += 1
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self._counters["executions"] += 1
+                leader = True
+            else:
+                flight.followers += 1
+                self._counters["coalesced"] += 1
+                self._counters["max_followers"] = max(self._counters["max_followers"], flight.followers)
+                leader = False
+        if not leader:
+            flight.done.wait()
+            if not flight.completed:
+                return None
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = fn()
+            flight.completed = True
+        except Exception as e:
+            flight.error = e
+            flight.completed = True
+            raise
+        finally:
+            # Remove before waking followers so a caller arriving afterwards
+            # starts a fresh flight instead of reading a finished one.
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._flights)
+        return stats
@@ -0,0 +1,240 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+METRICS_COLLECTION = "chat_metrics"
+DEFAULT_FLUSH_INTERVAL_SECONDS = float(os.getenv("METRICS_FLUSH_INTERVAL_SECONDS", "10"))
+DEFAULT_RETENTION_DAYS = int(os.getenv("METRICS_RETENTION_DAYS", "30"))
+DEFAULT_LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+STAGE_TURN = "turn"
+STAGE_INTENT = "intent"
+STAGE_ROUTING = "routing"
+# Recorded only when a canned answer is served, so its sample count is also the
+# number of turns answered from that tier.
+STAGE_CANNED_ANSWER = "canned_answer"
+STAGE_CACHE = "cache"
+STAGE_CONTEXT = "context_build"
+STAGE_LLM = "llm"
+STAGE_SANITIZE = "sanitize"
+STAGE_TICKET_INSERT = "ticket_insert"
+STAGE_NOTIFY = "notify"
+STAGES = (
+    STAGE_INTENT, STAGE_ROUTING, STAGE_CANNED_ANSWER, STAGE_CACHE, STAGE_CONTEXT, STAGE_LLM,
+    STAGE_SANITIZE, STAGE_TICKET_INSERT, STAGE_NOTIFY, STAGE_TURN,
+)
+
+
+def configure_logging(level=DEFAULT_LOG_LEVEL):
+    # Sends the apiman.* loggers (prompt token counts, degraded replies,
+    # notification failures) to stderr; neither Streamlit nor uvicorn sets up
+    # a handler for them. Safe to call on every Streamlit rerun.
+    apiman_logger = logging.getLogger("apiman")
+    if not apiman_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        apiman_logger.addHandler(handler)
+        apiman_logger.propagate = False
+    apiman_logger.setLevel(level)
+
+
+# Log-spaced bucket upper bounds from 0.1 ms to about 65 s (x1.5 per bucket),
+# plus an overflow bucket. Fixed bounds let histograms from every process and
+# every minute be merged by adding counts.
+BUCKET_BOUNDS_MS = tuple(round(0.1 * 1.5 ** i, 4) for i in range(34))
+NUM_BUCKETS = len(BUCKET_BOUNDS_MS) + 1
+
+
+def bucket_index(duration_ms):
+    return bisect.bisect_left(BUCKET_BOUNDS_MS, duration_ms)
+
+
+def bucket_upper_ms(index):
+    return BUCKET_BOUNDS_MS[index] if index < len(BUCKET_BOUNDS_MS) else float("inf")
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * NUM_BUCKETS
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, duration_ms):
+        self.counts[bucket_index(duration_ms)] += 1
+        self.count += 1
+        self.sum_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def merge_counts(self, counts, count, sum_ms, max_ms):
+        for index, value in counts.items() if isinstance(counts, dict) else enumerate(counts):
+            self.counts[int(index)] += value
+        self.count += count
+        self.sum_ms += sum_ms
+        self.max_ms = max(self.max_ms, max_ms)
+
+    def percentile(self, fraction):
+        # Interpolates geometrically inside the bucket holding the rank, so the
+        # estimate stays close even though bucket bounds grow by x1.5.
+        if not self.count:
+            return 0.0
+        rank = max(1.0, fraction * self.count)
+        seen = 0
+        for index, value in enumerate(self.counts):
+            if value and seen + value >= rank:
+                lower = bucket_upper_ms(index - 1) if index else 0.0
+                upper = min(bucket_upper_ms(index), self.max_ms)
+                position = (rank - seen) / value
+                if lower <= 0.0 or upper <= lower:
+                    return upper * position if lower <= 0.0 else upper
+                return lower * (upper / lower) ** position
+            seen += value
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.sum_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+        }
+
+
+def _minute(ts):
+    return datetime.fromtimestamp(ts - ts % 60, timezone.utc)
+
+
+def ensure_metrics_indexes(collection, retention_days=DEFAULT_RETENTION_DAYS):
+    collection.create_index("minute", expireAfterSeconds=int(timedelta(days=retention_days).total_seconds()))
+    collection.create_index([("stage", 1), ("minute", 1)])
+
+
+# Process-wide span recorder. Durations go into in-memory histograms for the
+# sidebar and into per-minute histogram deltas that a background thread upserts
+# into chat_metrics every flush interval: thousands of spans become one small
+# upsert per (minute, stage), and a chat turn never waits on Mongo.
+class Telemetry:
+    def __init__(self, collection=None, flush_interval=DEFAULT_FLUSH_INTERVAL_SECONDS):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._histograms = defaultdict(LatencyHistogram)
+        self._pending = defaultdict(LatencyHistogram)
+        self._stop = threading.Event()
+        self._thread = None
+        self._counters = {"spans": 0, "flushes": 0, "flush_errors": 0, "docs_written": 0}
+        self._last_error = None
+
+    def start(self):
+        if self.collection is not None and (self._thread is None or not self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="telemetry-flusher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def record(self, stage, seconds):
+        duration_ms = seconds * 1000
+        now = time.time()
+        with self._lock:
+            self._histograms[stage].add(duration_ms)
+            if self.collection is not None:
+                self._pending[(_minute(now), stage)].add(duration_ms)
+            self._counters["spans"] += 1
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def flush(self):
+        if self.collection is None:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(LatencyHistogram)
+        if not pending:
+            return 0
+        written = 0
+        for (minute, stage), histogram in pending.items():
+            increments = {"count": histogram.count, "sum_ms": histogram.sum_ms}
+            increments.update({
+                f"buckets.{index}": value for index, value in enumerate(histogram.counts) if value
+            })
+            try:
+                self.collection.update_one(
+                    {"_id": f"{minute.isoformat()}|{stage}"},
+                    {
+                        "$inc": increments,
+                        "$max": {"max_ms": histogram.max_ms},
+                        "$setOnInsert": {"minute": minute, "stage": stage},
+                    },
+                    upsert=True
+                )
+                written += 1
+            except Exception as e:
+                # Keep the delta so the next flush retries it.
+                with self._lock:
+                    self._pending[(minute, stage)].merge_counts(
+                        histogram.counts, histogram.count, histogram.sum_ms, histogram.max_ms
+                    )
+                    self._counters["flush_errors"] += 1
+                    self._last_error = str(e)
+        with self._lock:
+            self._counters["flushes"] += 1
+            self._counters["docs_written"] += written
+        return written
+
+    def stage_summaries(self):
+        with self._lock:
+            return {stage: histogram.summary() for stage, histogram in self._histograms.items()}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["pending_docs"] = len(self._pending)
+            stats["last_error"] = self._last_error
+        stats["flusher_alive"] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+
+def load_stage_summaries(collection, start, end):
+    # Merges the stored per-minute histograms for [start, end) into one summary
+    # per stage, plus hourly means for charting.
+    totals = defaultdict(LatencyHistogram)
+    hourly = defaultdict(lambda: [0, 0.0])
+    cursor = collection.find(
+        {"minute": {"$gte": start, "$lt": end}},
+        {"minute": 1, "stage": 1, "count": 1, "sum_ms": 1, "max_ms": 1, "buckets": 1}
+    )
+    for doc in cursor:
+        totals[doc["stage"]].merge_counts(doc.get("buckets", {}), doc.get("count", 0), doc.get("sum_ms", 0.0), doc.get("max_ms", 0.0))
+        minute = doc["minute"]
+        hour = minute.replace(minute=0, second=0, microsecond=0)
+        entry = hourly[(hour, doc["stage"])]
+        entry[0] += doc.get("count", 0)
+        entry[1] += doc.get("sum_ms", 0.0)
+    summaries = {stage: histogram.summary() for stage, histogram in totals.items()}
+    hourly_means = [
+        {"hour": hour, "stage": stage, "count": count, "mean_ms": sum_ms / count if count else 0.0}
+        for (hour, stage), (count, sum_ms) in sorted(hourly.items())
+    ]
+    return summaries, hourly_means
@@ -0,0 +1,126 @@
+from datetime import date, datetime, timezone
+
+import mongomock
+import numpy as np
+import pandas as pd
+import pytest
+
+from api_configs import API_CONFIGS
+from cost_engine import ApiPricing, PriceBook, month_offsets, period_costs
+from dashboard_queries import DashboardQueries
+
+
+def _legacy_cost(df):
+    # The dashboard's original per-row pricing.
+    return df.apply(lambda row: API_CONFIGS.get(row["api"], {}).get("cost_per_call", 0), axis=1)
+
+
+def _frame(rows):
+    api, endpoint, timestamp = zip(*rows)
+    return pd.DataFrame({
+        "api": pd.Categorical(api),
+        "endpoint": pd.Categorical(endpoint),
+        "timestamp": pd.to_datetime(list(timestamp), utc=True),
+    })
+
+
+def test_unit_prices_match_legacy_apply():
+    rng = np.random.default_rng(3)
+    names = list(API_CONFIGS) + ["Retired API"]
+    df = pd.DataFrame({"api": pd.Categorical(rng.choice(names, size=500))})
+    df.loc[::50, "api"] = np.nan
+    prices = PriceBook.from_api_configs(API_CONFIGS).unit_prices(df["api"])
+    np.testing.assert_allclose(prices, _legacy_cost(df).fillna(0).to_numpy())
+
+
+def test_unit_prices_accept_plain_sequences():
+    book = PriceBook({"A": ApiPricing(0.5, {}, ())})
+    np.testing.assert_allclose(book.unit_prices(["A", "B", "A"]), [0.5, 0.0, 0.5])
+
+
+def test_endpoint_costs_override_the_api_price():
+    book = PriceBook.from_api_configs({"A": {"cost_per_call": 1.0, "endpoint_costs": {"/upload": 3.0}}})
+    assert book.unit_price("A", "/upload") == 3.0
+    assert book.unit_price("A", "/info") == 1.0
+    assert book.unit_price("B", "/upload") == 0.0
+    prices = book.unit_prices(pd.Series(["A", "A", None]), pd.Series(["/upload", None, "/upload"]))
+    np.testing.assert_allclose(prices, [3.0, 1.0, 0.0])
+
+
+TIERED = PriceBook.from_api_configs({
+    "A": {"cost_per_call": 1.0, "cost_tiers": [[2, 0.5], [3, 0.25]]},
+    "B": {"cost_per_call": 2.0},
+})
+
+
+def test_log_costs_applies_tiers_per_api_and_month():
+    df = _frame([
+        ("A", "/x", "2024-01-03"), ("A", "/x", "2024-01-01"), ("B", "/x", "2024-01-02"),
+        ("A", "/x", "2024-01-02"), ("A", "/x", "2024-01-04"), ("A", "/x", "2024-02-01"),
+    ])
+    costs = TIERED.log_costs(df)
+    # A's January calls in time order cost 1, 1, 0.5, 0.25; February starts over.
+    np.testing.assert_allclose(costs, [0.5, 1.0, 2.0, 1.0, 0.25, 1.0])
+    assert list(costs.index) == list(df.index)
+
+
+def test_log_costs_carries_on_from_month_offsets():
+    df = _frame([("A", "/x", "2024-01-20"), ("A", "/x", "2024-01-21"), ("A", "/x", "2024-02-01")])
+    costs = TIERED.log_costs(df, offsets={("A", "2024-01"): 2, ("Z", "2024-01"): 9})
+    np.testing.assert_allclose(costs, [0.5, 0.25, 1.0])
+
+
+def test_tier_factors_match_log_costs():
+    df = _frame([("A", "/x", f"2024-03-{day:02d}") for day in range(1, 8)])
+    total = TIERED.log_costs(df).sum()
+    factor = TIERED.tier_factors(pd.Series(["A"]), [0.0], [7.0])[0]
+    assert factor * 7 * 1.0 == pytest.approx(total)
+    # Split into two batches, the second starting where the first ended.
+    split = TIERED.tier_factors(pd.Series(["A", "A"]), [0.0, 3.0], [3.0, 4.0])
+    assert split[0] * 3 + split[1] * 4 == pytest.approx(total)
+    assert TIERED.tier_factors(pd.Series(["B"]), [0.0], [7.0])[0] == 1.0
+
+
+@pytest.fixture
+def logs():
+    collection = mongomock.MongoClient().db.api_usage_logs
+    rows = [
+        ("A", "/x", datetime(2024, 1, day, 12, tzinfo=timezone.utc)) for day in (1, 5, 10, 15, 20, 25)
+    ] + [
+        ("B", "/y", datetime(2024, 1, day, 12, tzinfo=timezone.utc)) for day in (2, 12)
+    ] + [("A", "/x", datetime(2024, 2, 1, 12, tzinfo=timezone.utc))]
+    collection.insert_many([
+        {"api": api, "endpoint": endpoint, "timestamp": ts, "latency_ms": 10.0} for api, endpoint, ts in rows
+    ])
+    return collection, _frame(rows)
+
+
+def test_mongo_expression_matches_unit_prices(logs):
+    collection, df = logs
+    book = PriceBook.from_api_configs({"A": {"cost_per_call": 1.0, "endpoint_costs": {"/x": 1.5}},
+                                       "B": {"cost_per_call": 2.0}})
+    docs = list(collection.aggregate([{"$project": {"price": book.mongo_expression()}}]))
+    np.testing.assert_allclose([doc["price"] for doc in docs], book.unit_prices(df["api"], df["endpoint"]))
+    assert PriceBook({}).mongo_expression() == 0
+
+
+def test_month_offsets_counts_earlier_calls_in_the_month(logs):
+    collection, _ = logs
+    queries = DashboardQueries(collection, price_book=TIERED)
+    assert month_offsets(queries, date(2024, 1, 11)) == {("A", "2024-01"): 3.0, ("B", "2024-01"): 1.0}
+    assert month_offsets(queries, date(2024, 1, 1)) == {}
+
+
+@pytest.mark.parametrize("book", [TIERED, PriceBook.from_api_configs({"A": {"cost_per_call": 1.0},
+                                                                      "B": {"cost_per_call": 2.0}})])
+def test_period_costs_match_log_costs(logs, book):
+    collection, df = logs
+    queries = DashboardQueries(collection, price_book=book)
+    start, end = date(2024, 1, 11), date(2024, 2, 28)
+    in_range = df[(df["timestamp"] >= "2024-01-11") & (df["timestamp"] < "2024-02-29")]
+    expected = book.log_costs(in_range, offsets=month_offsets(queries, start)).groupby(
+        in_range["api"], observed=True).sum()
+    result = period_costs(queries, start, end).set_index("api")
+    assert result.loc["A", "calls"] == 4
+    for api in ("A", "B"):
+        assert result.loc[api, "cost"] == pytest.approx(expected[api])
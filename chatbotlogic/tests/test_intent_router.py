@@ -0,0 +1,69 @@
+import pytest
+
+from intent_router import (
+    INTENT_GET_API_KEY, INTENT_GREETING, INTENT_INTRODUCTION, INTENT_NEW_TICKET, INTENT_SHOW_API_KEYS,
+    INTENT_SHOW_HELP, IntentEngine, find_intents, resolve_intent,
+)
+
+
+def _intent(text):
+    match = resolve_intent(text)
+    return match.intent if match else None
+
+
+@pytest.mark.parametrize("text", [
+    "this endpoint returns 500",
+    "where is the data for yesterday",
+    "which api has the highest quota",
+    "shipping costs",
+])
+def test_phrases_inside_words_do_not_match(text):
+    # "hi" in "this"/"highest"/"shipping", "ga" in "data", "yo" in "yesterday".
+    assert find_intents(text) == []
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("hi", INTENT_GREETING),
+    ("Hi!", INTENT_GREETING),
+    ("well, hello there", INTENT_GREETING),
+    ("who are you?", INTENT_INTRODUCTION),
+    ("show help", INTENT_SHOW_HELP),
+    ("new ticket please", INTENT_NEW_TICKET),
+])
+def test_phrases_on_word_boundaries_match(text, intent):
+    assert _intent(text) == intent
+
+
+def test_higher_priority_wins_over_shorter_command():
+    assert _intent("show api keys") == INTENT_SHOW_API_KEYS
+    assert _intent("get api key") == INTENT_GET_API_KEY
+
+
+def test_command_beats_greeting():
+    assert _intent("hi, can I get an api key") == INTENT_GET_API_KEY
+
+
+def test_matching_normalizes_case_whitespace_and_quotes():
+    assert _intent("  WHAT’S   your name ") == INTENT_INTRODUCTION
+
+
+def test_no_match_returns_none():
+    assert resolve_intent("how do I paginate /getallproduct") is None
+
+
+def test_overlapping_patterns_are_all_reported():
+    engine = IntentEngine((("a", 1, ("api key", "key")), ("b", 2, ("my api key",))))
+    phrases = sorted(match.phrase for match in engine.find_all("is my api key valid"))
+    assert phrases == ["api key", "key", "my api key"]
+    match = engine.resolve("is my api key valid")
+    assert (match.intent, match.start, match.end) == ("b", 3, 13)
+
+
+def test_longer_match_wins_at_equal_priority():
+    engine = IntentEngine((("short", 1, ("api",)), ("long", 1, ("api key",))))
+    assert engine.resolve("api key").intent == "long"
+
+
+def test_duplicate_phrases_are_indexed_once():
+    engine = IntentEngine((("a", 1, ("hiya", "Hiya", " hiya ")),))
+    assert engine.pattern_count == 1
@@ -0,0 +1,173 @@
+import threading
+import time
+
+import pytest
+
+from llm_resilience import (
+    BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN, CircuitBreaker, LLMUnavailableError, ResilientChatModel,
+    StreamInterruptedError,
+)
+
+
+class FakeModel:
+    # Plays back a script: an exception is raised, "hang" blocks until
+    # released, anything else is the answer.
+    def __init__(self, *script, chunks=("Hel", "lo")):
+        self.script = list(script)
+        self.chunks = chunks
+        self.calls = 0
+        self.release = threading.Event()
+
+    def _next(self):
+        self.calls += 1
+        step = self.script.pop(0) if self.script else "ok"
+        if isinstance(step, Exception):
+            raise step
+        if step == "hang":
+            self.release.wait(5)
+        return step
+
+    def invoke(self, messages):
+        return self._next()
+
+    def stream(self, messages):
+        self._next()
+        for chunk in self.chunks:
+            if chunk == "hang":
+                self.release.wait(5)
+                continue
+            yield chunk
+
+
+class HttpError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _model(primary, fallback=None, **kwargs):
+    options = dict(timeout=1.0, max_retries=2, base_backoff=0.0, max_backoff=0.0,
+                   failure_threshold=3, reset_timeout=60, stream_idle_timeout=0.2)
+    options.update(kwargs)
+    return ResilientChatModel(primary, fallback, **options)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == BREAKER_CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_breaker_success_resets_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == BREAKER_CLOSED
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["opened"] == 2
+
+
+def test_transient_errors_are_retried():
+    primary = FakeModel(ConnectionError("reset"), HttpError(503), "answer")
+    model = _model(primary)
+    assert model.invoke([]) == "answer"
+    stats = model.stats()
+    assert primary.calls == 3
+    assert stats["retries"] == 2 and stats["errors"] == 2
+    assert stats["breaker_state"] == BREAKER_CLOSED
+
+
+@pytest.mark.parametrize("error", [HttpError(400), HttpError(401), ValueError("bad messages")])
+def test_client_errors_are_not_retried(error):
+    primary = FakeModel(error)
+    with pytest.raises(LLMUnavailableError):
+        _model(primary).invoke([])
+    assert primary.calls == 1
+
+
+def test_throttling_is_retried():
+    primary = FakeModel(HttpError(429), "answer")
+    assert _model(primary).invoke([]) == "answer"
+
+
+def test_fallback_answers_when_primary_is_down():
+    primary = FakeModel(*[ConnectionError("down")] * 3)
+    fallback = FakeModel("from fallback")
+    model = _model(primary, fallback)
+    assert model.invoke([]) == "from fallback"
+    assert model.stats()["fallback_calls"] == 1
+
+
+def test_open_breaker_short_circuits_without_calling_model():
+    primary = FakeModel(*[ConnectionError("down")] * 3)
+    model = _model(primary)
+    with pytest.raises(LLMUnavailableError):
+        model.invoke([])
+    assert model.stats()["breaker_state"] == BREAKER_OPEN
+    with pytest.raises(LLMUnavailableError):
+        model.invoke([])
+    assert primary.calls == 3
+    assert model.stats()["short_circuited"] == 1
+
+
+def test_deadline_bounds_a_hung_call():
+    primary = FakeModel("hang")
+    model = _model(primary, timeout=0.1)
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailableError):
+        model.invoke([])
+    primary.release.set()
+    assert time.monotonic() - started < 1.0
+    # A timeout spends the whole deadline, so it is not retried.
+    assert primary.calls == 1
+    assert model.stats()["timeouts"] == 1
+
+
+def test_stream_yields_all_chunks():
+    model = _model(FakeModel(chunks=("Hel", "lo", "!")))
+    assert "".join(model.stream([])) == "Hello!"
+
+
+def test_stream_failure_before_first_chunk_is_retried():
+    primary = FakeModel(ConnectionError("reset"), chunks=("ok",))
+    assert list(_model(primary).stream([])) == ["ok"]
+    assert primary.calls == 2
+
+
+def test_stalled_stream_is_interrupted_after_idle_timeout():
+    primary = FakeModel(chunks=("Hel", "hang", "lo"))
+    model = _model(primary, stream_idle_timeout=0.1)
+    received = []
+    with pytest.raises(StreamInterruptedError):
+        for chunk in model.stream([]):
+            received.append(chunk)
+    primary.release.set()
+    assert received == ["Hel"]
+    assert model.stats()["stream_interrupted"] == 1
+    assert issubclass(StreamInterruptedError, LLMUnavailableError)
@@ -0,0 +1,72 @@
+import pytest
+
+from intent_router import GREETING_REPLY, resolve_intent
+from query_router import ROUTE_ANSWER, ROUTE_CANNED, ROUTE_TICKET, QueryRouter, score_api_relatedness
+
+
+def test_single_generic_term_lands_on_threshold():
+    confidence, matched = score_api_relatedness("what does error 401 mean")
+    assert matched == ["error"]
+    assert confidence == pytest.approx(0.5)
+
+
+def test_strong_term_scores_above_generic_term():
+    strong, _ = score_api_relatedness("how do I call /getweatherdata")
+    generic, _ = score_api_relatedness("what does this error mean")
+    assert strong > generic >= 0.5
+
+
+def test_off_topic_query_scores_low():
+    confidence, matched = score_api_relatedness("what is the capital of france")
+    assert matched == []
+    assert confidence < 0.5
+
+
+def test_plurals_and_bigrams_match():
+    _, matched = score_api_relatedness("Which endpoints need a status code check?")
+    assert "endpoint" in matched
+    assert "status code" in matched
+
+
+@pytest.mark.parametrize("query", [
+    "what does error 401 mean",
+    "which header carries my token",
+    "the response body is empty",
+])
+def test_support_questions_are_answered(query):
+    assert QueryRouter(0.5).route(query).action == ROUTE_ANSWER
+
+
+def test_off_topic_query_is_ticketed():
+    decision = QueryRouter(0.5).route("recommend me a good pizza place")
+    assert decision.action == ROUTE_TICKET
+    assert decision.reply is None
+
+
+def test_threshold_is_respected():
+    query = "what does error 401 mean"
+    assert QueryRouter(0.5).route(query).action == ROUTE_ANSWER
+    assert QueryRouter(0.51).route(query).action == ROUTE_TICKET
+
+
+def test_greeting_is_canned():
+    decision = QueryRouter().route("hello there")
+    assert decision.action == ROUTE_CANNED
+    assert decision.reply == GREETING_REPLY
+
+
+def test_pre_resolved_intent_is_used():
+    router = QueryRouter(0.5)
+    assert router.route("hello", intent=None).action == ROUTE_TICKET
+    assert router.route("apihub", intent=resolve_intent("hello")).action == ROUTE_CANNED
+
+
+def test_stats_count_decisions():
+    router = QueryRouter(0.5)
+    router.route("hi")
+    router.route("how do I authenticate with the image api")
+    router.route("recommend me a good pizza place")
+    stats = router.stats()
+    assert stats["total_routed"] == 3
+    assert stats["canned"] == stats["answered_by_llm"] == stats["ticketed"] == 1
+    assert stats["llm_calls_saved"] == 1
@@ -0,0 +1,130 @@
+import math
+import threading
+
+import pytest
+
+from rate_limiter import (
+    REASON_ALLOWED, REASON_CONCURRENCY, REASON_GLOBAL, REASON_SESSION, LimitDecision, RateLimiter,
+    RateLimitExceeded, TokenBucket,
+)
+
+
+def test_bucket_allows_burst_then_reports_wait():
+    bucket = TokenBucket(2, 0.5, now=0.0)
+    assert bucket.take(0.0) == 0.0
+    assert bucket.take(0.0) == 0.0
+    assert bucket.take(0.0) == pytest.approx(2.0)
+
+
+def test_bucket_refills_over_time_up_to_capacity():
+    bucket = TokenBucket(2, 1.0, now=0.0)
+    bucket.take(0.0)
+    bucket.take(0.0)
+    assert bucket.take(1.0) == 0.0
+    assert not bucket.is_full(1.0)
+    assert bucket.is_full(100.0)
+    assert bucket.tokens == 2
+
+
+def test_bucket_ignores_clock_going_backwards():
+    bucket = TokenBucket(1, 1.0, now=10.0)
+    bucket.take(10.0)
+    assert bucket.take(5.0) == pytest.approx(1.0)
+
+
+def test_bucket_without_refill_never_recovers():
+    bucket = TokenBucket(1, 0.0, now=0.0)
+    bucket.take(0.0)
+    assert bucket.take(1000.0) == math.inf
+
+
+def test_give_back_is_capped_at_capacity():
+    bucket = TokenBucket(1, 0.0, now=0.0)
+    bucket.give_back()
+    assert bucket.tokens == 1
+
+
+def test_session_limit_is_per_session():
+    limiter = RateLimiter(session_burst=2, session_per_minute=1, global_burst=100, global_per_minute=100)
+    assert limiter.check("a").allowed
+    assert limiter.check("a").allowed
+    decision = limiter.check("a")
+    assert decision.reason == REASON_SESSION
+    assert decision.retry_after > 0
+    assert limiter.check("b").reason == REASON_ALLOWED
+
+
+def test_global_refusal_does_not_charge_the_session():
+    limiter = RateLimiter(session_burst=2, session_per_minute=1, global_burst=1, global_per_minute=1)
+    assert limiter.check("a").allowed
+    assert limiter.check("b").reason == REASON_GLOBAL
+    # b's token was given back: once the global bucket has room, b still has its full burst.
+    limiter._global.give_back()
+    assert limiter.check("b").allowed
+    limiter._global.give_back()
+    assert limiter.check("b").allowed
+
+
+def test_refund_returns_both_tokens():
+    limiter = RateLimiter(session_burst=1, session_per_minute=1, global_burst=1, global_per_minute=1)
+    assert limiter.check("a").allowed
+    limiter.refund("a")
+    assert limiter.check("a").allowed
+
+
+def test_limit_raises_with_reply():
+    limiter = RateLimiter(session_burst=1, session_per_minute=1, global_burst=10, global_per_minute=10)
+    with limiter.limit("a"):
+        pass
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        with limiter.limit("a"):
+            pass
+    assert excinfo.value.decision.reason == REASON_SESSION
+    assert "60 seconds" in excinfo.value.reply
+
+
+def test_reply_wording():
+    assert "1 second " in RateLimitExceeded(LimitDecision(False, REASON_SESSION, 0.2)).reply
+    assert "try again in a few seconds" in RateLimitExceeded(LimitDecision(False, REASON_GLOBAL, 3)).reply
+
+
+def test_queue_timeout_refuses_and_refunds():
+    limiter = RateLimiter(session_burst=1, session_per_minute=1, global_burst=10, global_per_minute=10,
+                          max_concurrency=1, queue_timeout=0.05)
+    holding = threading.Event()
+    release = threading.Event()
+
+    def hold_slot():
+        with limiter.slot():
+            holding.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_slot)
+    holder.start()
+    holding.wait(5)
+    try:
+        with pytest.raises(RateLimitExceeded) as excinfo:
+            with limiter.limit("a"):
+                pass
+    finally:
+        release.set()
+        holder.join(5)
+    assert excinfo.value.decision.reason == REASON_CONCURRENCY
+    # Refused while queueing: the session kept its only token.
+    with limiter.limit("a"):
+        pass
+    stats = limiter.stats()
+    assert stats["queued"] == 1
+    assert stats[REASON_CONCURRENCY] == 1
+    assert stats["in_flight"] == 0
+    assert stats["max_in_flight"] == 1
+
+
+def test_stats_count_denials():
+    limiter = RateLimiter(session_burst=1, session_per_minute=1, global_burst=10, global_per_minute=10)
+    limiter.check("a")
+    limiter.check("a")
+    stats = limiter.stats()
+    assert stats[REASON_ALLOWED] == 1
+    assert stats["denied"] == 1
+    assert stats["tracked_sessions"] == 1
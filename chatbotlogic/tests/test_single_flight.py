@@ -0,0 +1,121 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from single_flight import SingleFlight, prompt_key
+
+
+def _message(type_, content):
+    return SimpleNamespace(type=type_, content=content)
+
+
+def _run_concurrently(flight, key, fn, followers):
+    # Starts the leader, waits until it is inside fn, then starts followers
+    # and lets the leader finish once they are all queued on the flight.
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except BaseException as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    fn.entered.wait(5)
+    threads = [threading.Thread(target=call) for _ in range(followers)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()["coalesced"] < followers:
+        threading.Event().wait(0.001)
+    fn.release.set()
+    for thread in [leader] + threads:
+        thread.join(5)
+    return results, errors
+
+
+class Blocking:
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.entered.set()
+        self.release.wait(5)
+        if isinstance(self.outcome, BaseException):
+            outcome, self.outcome = self.outcome, "retried"
+            raise outcome
+        return self.outcome
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    fn = Blocking("answer")
+    results, errors = _run_concurrently(flight, "k", fn, followers=3)
+    assert errors == []
+    assert fn.calls == 1
+    assert sorted(results) == [("answer", False)] + [("answer", True)] * 3
+    stats = flight.stats()
+    assert stats["executions"] == 1
+    assert stats["max_followers"] == 3
+    assert stats["in_flight"] == 0
+
+
+def test_followers_receive_the_leaders_exception():
+    flight = SingleFlight()
+    error = ConnectionError("provider down")
+    fn = Blocking(error)
+    results, errors = _run_concurrently(flight, "k", fn, followers=2)
+    assert results == []
+    assert errors == [error] * 3
+    assert fn.calls == 1
+
+
+def test_followers_start_a_new_flight_when_the_leader_is_interrupted():
+    flight = SingleFlight()
+    fn = Blocking(KeyboardInterrupt())
+    results, errors = _run_concurrently(flight, "k", fn, followers=2)
+    assert len(errors) == 1 and isinstance(errors[0], KeyboardInterrupt)
+    # One follower leads the second flight, the other joins it (or runs after it).
+    assert sorted(result for result, _ in results) == ["retried", "retried"]
+    assert fn.calls in (2, 3)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_sequential_calls_do_not_reuse_a_finished_flight():
+    flight = SingleFlight()
+    counter = iter(range(10))
+    assert flight.do("k", lambda: next(counter)) == (0, False)
+    assert flight.do("k", lambda: next(counter)) == (1, False)
+
+
+def test_different_keys_run_independently():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == (1, False)
+    assert flight.do("b", lambda: 2) == (2, False)
+    assert flight.stats()["coalesced"] == 0
+
+
+def test_error_clears_the_flight():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.do("k", lambda: "ok") == ("ok", False)
+
+
+def test_prompt_key_normalizes_only_the_last_human_message():
+    system = _message("system", "You are APIMAN.")
+    a = prompt_key([system, _message("human", "How do I use /getqr?")])
+    b = prompt_key([system, _message("human", "  how do i use /getqr ")])
+    assert a == b
+    history_a = prompt_key([system, _message("human", "Hi"), _message("ai", "Hello"), _message("human", "next")])
+    history_b = prompt_key([system, _message("human", "hi"), _message("ai", "Hello"), _message("human", "next")])
+    assert history_a != history_b
+
+
+def test_prompt_key_depends_on_roles():
+    assert prompt_key([_message("human", "ab")]) != prompt_key([_message("ai", "ab")])
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+
+from ticket_dedup import TicketDeduplicator, estimated_jaccard, minhash_signature, ticket_category
+
+TITLE = "Non-API Question: how do I cancel my subscription"
+DESCRIPTION = "User asked how to cancel their monthly subscription and get a refund."
+
+
+@pytest.fixture
+def tickets():
+    return mongomock.MongoClient().db.support_tickets
+
+
+def _insert(collection, title, description, status="open", age_hours=0):
+    created = (datetime.now(timezone.utc) - timedelta(hours=age_hours)).isoformat()
+    return collection.insert_one({
+        "title": title, "description": description, "status": status,
+        "created_at": created, "last_updated": created, "occurrence_count": 1,
+    }).inserted_id
+
+
+def test_signature_similarity_tracks_text_similarity():
+    base = minhash_signature(DESCRIPTION)
+    assert estimated_jaccard(base, minhash_signature(DESCRIPTION)) == 1.0
+    near = minhash_signature("User asked how to cancel their monthly subscription and get refund.")
+    far = minhash_signature("Weather endpoint returns stale forecasts for Berlin.")
+    assert estimated_jaccard(base, near) > 0.7
+    assert estimated_jaccard(base, far) < 0.2
+    assert minhash_signature("   ") is None
+
+
+def test_category_comes_from_title_prefix():
+    assert ticket_category("AI Chatbot Failure: timeout") == "ai chatbot failure"
+    assert ticket_category("no prefix") == ""
+
+
+def test_near_duplicate_merges_into_open_ticket(tickets):
+    ticket_id = _insert(tickets, TITLE, DESCRIPTION)
+    dedup = TicketDeduplicator(tickets, sync_interval=0)
+    merged = dedup.attach_if_duplicate(TITLE, DESCRIPTION.replace("a refund", "refunded"), "user@example.com")
+    assert merged == str(ticket_id)
+    doc = tickets.find_one({"_id": ticket_id})
+    assert doc["occurrence_count"] == 2
+    assert doc["occurrences"][0]["contact"] == "user@example.com"
+    assert dedup.stats()["duplicates"] == 1
+
+
+def test_unrelated_ticket_is_not_merged(tickets):
+    _insert(tickets, TITLE, DESCRIPTION)
+    dedup = TicketDeduplicator(tickets, sync_interval=0)
+    assert dedup.attach_if_duplicate(TITLE, "Weather endpoint returns stale forecasts for Berlin.") is None
+
+
+def test_tickets_in_other_categories_never_merge(tickets):
+    _insert(tickets, TITLE, DESCRIPTION)
+    dedup = TicketDeduplicator(tickets, sync_interval=0)
+    assert dedup.attach_if_duplicate("AI Chatbot Failure: how do I cancel my subscription", DESCRIPTION) is None
+
+
+def test_closed_and_old_tickets_are_ignored(tickets):
+    _insert(tickets, TITLE, DESCRIPTION, status="closed")
+    _insert(tickets, TITLE, DESCRIPTION, age_hours=100)
+    dedup = TicketDeduplicator(tickets, window_hours=72, sync_interval=0)
+    assert dedup.attach_if_duplicate(TITLE, DESCRIPTION) is None
+    assert dedup.stats()["indexed_open_tickets"] == 0
+
+
+def test_ticket_closed_after_sync_is_dropped(tickets):
+    ticket_id = _insert(tickets, TITLE, DESCRIPTION)
+    dedup = TicketDeduplicator(tickets, sync_interval=3600)
+    dedup.sync(force=True)
+    tickets.update_one({"_id": ticket_id}, {"$set": {"status": "closed"}})
+    # The index is stale, so the merge is attempted, refused by the status filter and the entry dropped.
+    assert dedup.attach_if_duplicate(TITLE, DESCRIPTION) is None
+    stats = dedup.stats()
+    assert stats["stale_candidates"] == 1
+    assert stats["indexed_open_tickets"] == 0
+
+
+def test_added_ticket_is_found_without_a_sync(tickets):
+    dedup = TicketDeduplicator(tickets, sync_interval=3600)
+    dedup.sync(force=True)
+    ticket_id = _insert(tickets, TITLE, DESCRIPTION)
+    dedup.add(ticket_id, TITLE, DESCRIPTION)
+    assert dedup.attach_if_duplicate(TITLE, DESCRIPTION) == str(ticket_id)
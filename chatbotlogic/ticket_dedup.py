@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from bson import ObjectId
+
+DEFAULT_SIMILARITY_THRESHOLD = float(os.getenv("TICKET_DEDUP_THRESHOLD", "0.7"))
+DEFAULT_WINDOW_HOURS = float(os.getenv("TICKET_DEDUP_WINDOW_HOURS", "72"))
+DEFAULT_SYNC_INTERVAL_SECONDS = float(os.getenv("TICKET_DEDUP_SYNC_INTERVAL_SECONDS", "30"))
+MAX_OCCURRENCES_KEPT = 50
+
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows puts the LSH candidate threshold near Jaccard 0.5, below the
+# verification threshold, so true near-duplicates are rarely missed.
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // NUM_BANDS
+SHINGLE_SIZE = 4
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(20240611)
+_PERM_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+
+def ticket_category(title):
+    # "Non-API Question: ..." and "AI Chatbot Failure: ..." never merge with each other.
+    head, sep, _ = title.partition(":")
+    return head.strip().lower() if sep else ""
+
+
+def _shingles(text):
+    text = " ".join(text.lower().split())
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text):
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+
+def estimated_jaccard(sig_a, sig_b):
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERMUTATIONS
+
+
+def _band_keys(category, signature):
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        yield (category, band, rows.tobytes())
+
+
+def _fingerprint_text(title, description):
+    _, _, subject = title.partition(":")
+    return f"{subject or title} {description}"
+
+
+class TicketDeduplicator:
+    def __init__(self, collection, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD,
+                 window_hours=DEFAULT_WINDOW_HOURS, sync_interval=DEFAULT_SYNC_INTERVAL_SECONDS):
+        self.collection = collection
+        self.similarity_threshold = similarity_threshold
+        self.window = timedelta(hours=window_hours)
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._buckets = defaultdict(set)
+        self._tickets = {}
+        self._watermark = None
+        self._last_sync = 0.0
+        self._counters = {"checked": 0, "duplicates": 0, "stale_candidates": 0, "syncs": 0}
+
+    def _add(self, ticket_id, category, signature, created_at):
+        if signature is None or ticket_id in self._tickets:
+            return
+        self._tickets[ticket_id] = (category, signature, created_at)
+        for key in _band_keys(category, signature):
+            self._buckets[key].add(ticket_id)
+
+    def _remove(self, ticket_id):
+        entry = self._tickets.pop(ticket_id, None)
+        if entry is None:
+            return
+        category, signature, _ = entry
+        for key in _band_keys(category, signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(ticket_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def sync(self, force=False):
+        # Incremental: only tickets touched since the last watermark are read, so
+        # closing a ticket on the dashboard (which bumps last_updated) drops it
+        # from the index on the next sync.
+        now = time.monotonic()
+        if not force and now - self._last_sync < self.sync_interval:
+            return
+        cutoff = (datetime.now(timezone.utc) - self.window).isoformat()
+        if self._watermark is None:
+            query = {"status": "open", "created_at": {"$gte": cutoff}}
+        else:
+            query = {"last_updated": {"$gt": self._watermark}}
+        projection = {"title": 1, "description": 1, "status": 1, "created_at": 1, "last_updated": 1}
+        changed = list(self.collection.find(query, projection))
+        with self._lock:
+            for ticket in changed:
+                ticket_id = str(ticket["_id"])
+                if ticket.get("status") != "open" or ticket.get("created_at", "") < cutoff:
+                    self._remove(ticket_id)
+                elif ticket_id not in self._tickets and "title" in ticket:
+                    self._add(
+                        ticket_id, ticket_category(ticket["title"]),
+                        minhash_signature(_fingerprint_text(ticket["title"], ticket.get("description", ""))),
+                        ticket.get("created_at", "")
+                    )
+                last_updated = ticket.get("last_updated")
+                if last_updated and (self._watermark is None or last_updated > self._watermark):
+                    self._watermark = last_updated
+            if self._watermark is None:
+                self._watermark = cutoff
+            for ticket_id in [t for t, entry in self._tickets.items() if entry[2] < cutoff]:
+                self._remove(ticket_id)
+            self._last_sync = now
+            self._counters["syncs"] += 1
+
+    def _candidates(self, category, signature):
+        with self._lock:
+            candidate_ids = set()
+            for key in _band_keys(category, signature):
+                candidate_ids.update(self._buckets.get(key, ()))
+            scored = [
+                (estimated_jaccard(signature, self._tickets[t][1]), t)
+                for t in candidate_ids if t in self._tickets
+            ]
+        return sorted((pair for pair in scored if pair[0] >= self.similarity_threshold), reverse=True)
+
+    def attach_if_duplicate(self, title, description, contact_info=""):
+        self.sync()
+        category = ticket_category(title)
+        signature = minhash_signature(_fingerprint_text(title, description))
+        with self._lock:
+            self._counters["checked"] += 1
+        if signature is None:
+            return None
+        now = datetime.now(timezone.utc).isoformat()
+        for similarity, ticket_id in self._candidates(category, signature):
+            result = self.collection.update_one(
+                {"_id": self._object_id(ticket_id), "status": "open"},
+                {
+                    "$inc": {"occurrence_count": 1},
+                    "$push": {"occurrences": {
+                        "$each": [{"description": description, "contact": contact_info,
+                                   "similarity": round(similarity, 3), "at": now}],
+                        "$slice": -MAX_OCCURRENCES_KEPT,
+                    }},
+                    "$set": {"last_updated": now},
+                }
+            )
+            if result.matched_count:
+                with self._lock:
+                    self._counters["duplicates"] += 1
+                return ticket_id
+            # Closed or deleted since the last sync.
+            with self._lock:
+                self._remove(ticket_id)
+                self._counters["stale_candidates"] += 1
+        return None
+
+    def add(self, ticket_id, title, description):
+        signature = minhash_signature(_fingerprint_text(title, description))
+        with self._lock:
+            self._add(str(ticket_id), ticket_category(title), signature, datetime.now(timezone.utc).isoformat())
+
+    @staticmethod
+    def _object_id(ticket_id):
+        return ObjectId(ticket_id) if ObjectId.is_valid(ticket_id) else ticket_id
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["indexed_open_tickets"] = len(self._tickets)
+            stats["lsh_buckets"] = len(self._buckets)
+        stats["similarity_threshold"] = self.similarity_threshold
+        return stats
@@ -0,0 +1,241 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, ReturnDocument
+
+from notification_coalescer import format_ticket_digest
+from telemetry import STAGE_NOTIFY
+
+NOTIFICATION_PENDING = "pending"
+NOTIFICATION_SENDING = "sending"
+NOTIFICATION_DELIVERED = "delivered"
+NOTIFICATION_FAILED = "failed"
+
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+DEFAULT_BASE_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BASE_BACKOFF_SECONDS", "2"))
+DEFAULT_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "300"))
+DEFAULT_POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "5"))
+# A worker that dies mid-delivery leaves its claim behind; after the lease
+# expires another worker may pick the notification up again.
+DEFAULT_LEASE_SECONDS = 60
+
+_LATENCY_SAMPLES = 500
+
+
+def new_ticket_document(title, description, contact_info="anonymous user"):
+    now = datetime.now(timezone.utc)
+    return {
+        "title": title,
+        "description": description,
+        "contact": contact_info,
+        "status": "open",
+        "created_at": now.isoformat(),
+        "last_updated": now.isoformat(),
+        "occurrence_count": 1,
+        # The pending notification lives on the ticket itself, so a single
+        # insert_one writes both atomically without needing a transaction.
+        "notification": {
+            "status": NOTIFICATION_PENDING,
+            "channel": "whatsapp",
+            "attempts": 0,
+            "enqueued_at": now,
+            "next_attempt_at": now,
+        },
+    }
+
+
+def ensure_outbox_indexes(collection):
+    collection.create_index(
+        [("notification.status", ASCENDING), ("notification.next_attempt_at", ASCENDING)],
+        name="notification_outbox"
+    )
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class OutboxWorker:
+    def __init__(self, collection, sender, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 base_backoff=DEFAULT_BASE_BACKOFF_SECONDS, max_backoff=DEFAULT_MAX_BACKOFF_SECONDS,
+                 poll_interval=DEFAULT_POLL_INTERVAL_SECONDS, lease_seconds=DEFAULT_LEASE_SECONDS, coalescer=None,
+                 telemetry=None):
+        self.collection = collection
+        self.sender = sender
+        self.coalescer = coalescer
+        self.telemetry = telemetry
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._wake = threading.Event()
+        self._idle_wait = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=_LATENCY_SAMPLES)
+        self._counters = {"delivered": 0, "retries": 0, "failed": 0, "errors": 0}
+        self._last_error = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ticket-outbox-worker", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Cleared before draining, so a wake() that lands while the batch
+            # runs leaves the event set and the wait below returns at once.
+            self._wake.clear()
+            try:
+                worked = self.process_due()
+            except Exception as e:
+                worked = 0
+                with self._lock:
+                    self._counters["errors"] += 1
+                    self._last_error = str(e)
+            if not worked:
+                self._wake.wait(self._idle_wait)
+
+    def _due_filter(self, now):
+        return {"$or": [
+            {"notification.status": NOTIFICATION_PENDING, "notification.next_attempt_at": {"$lte": now}},
+            {"notification.status": NOTIFICATION_SENDING, "notification.lease_until": {"$lte": now}},
+        ]}
+
+    def _claim(self):
+        now = datetime.now(timezone.utc)
+        return self.collection.find_one_and_update(
+            self._due_filter(now),
+            {"$set": {
+                "notification.status": NOTIFICATION_SENDING,
+                "notification.lease_until": now + timedelta(seconds=self.lease_seconds),
+            }},
+            sort=[("notification.next_attempt_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def process_due(self, limit=50):
+        self._idle_wait = self.poll_interval
+        if self.coalescer is not None:
+            return self._process_coalesced()
+        processed = 0
+        while processed < limit and not self._stop.is_set():
+            ticket = self._claim()
+            if ticket is None:
+                break
+            self._deliver([ticket])
+            processed += 1
+        return processed
+
+    def _process_coalesced(self):
+        due = self._due_filter(datetime.now(timezone.utc))
+        oldest = self.collection.find_one(due, {"notification.enqueued_at": 1},
+                                          sort=[("notification.enqueued_at", ASCENDING)])
+        if oldest is None:
+            return 0
+        pending_count = self.collection.count_documents(due, limit=self.coalescer.max_digest_tickets)
+        wait = self.coalescer.seconds_until_ready(oldest["notification"]["enqueued_at"], pending_count)
+        if not wait:
+            wait = self.coalescer.seconds_until_slot()
+        if wait:
+            self._idle_wait = min(self.poll_interval, wait)
+            return 0
+        batch = []
+        while len(batch) < self.coalescer.max_digest_tickets:
+            ticket = self._claim()
+            if ticket is None:
+                break
+            batch.append(ticket)
+        if batch:
+            self._deliver(batch)
+        return len(batch)
+
+    def _deliver(self, tickets):
+        started = time.perf_counter()
+        try:
+            self.sender.send(format_ticket_digest(tickets))
+        except Exception as e:
+            for ticket in tickets:
+                self._record_failure(ticket, e)
+            return
+        finally:
+            if self.telemetry is not None:
+                self.telemetry.record(STAGE_NOTIFY, time.perf_counter() - started)
+        if self.coalescer is not None:
+            self.coalescer.record_sent(len(tickets))
+        delivered_at = datetime.now(timezone.utc)
+        self.collection.update_many(
+            {"_id": {"$in": [ticket["_id"] for ticket in tickets]}},
+            {"$set": {"notification.status": NOTIFICATION_DELIVERED, "notification.delivered_at": delivered_at},
+             "$unset": {"notification.lease_until": ""},
+             "$inc": {"notification.attempts": 1}}
+        )
+        with self._lock:
+            for ticket in tickets:
+                enqueued_at = ticket["notification"]["enqueued_at"]
+                if enqueued_at.tzinfo is None:
+                    enqueued_at = enqueued_at.replace(tzinfo=timezone.utc)
+                self._counters["delivered"] += 1
+                self._latencies.append((delivered_at - enqueued_at).total_seconds())
+
+    def _record_failure(self, ticket, error):
+        attempts = ticket["notification"].get("attempts", 0) + 1
+        update = {"notification.attempts": attempts, "notification.last_error": str(error)}
+        if attempts >= self.max_attempts:
+            update["notification.status"] = NOTIFICATION_FAILED
+            counter = "failed"
+        else:
+            backoff = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+            # Full jitter keeps several workers from retrying in lockstep.
+            delay = random.uniform(0, backoff)
+            update["notification.status"] = NOTIFICATION_PENDING
+            update["notification.next_attempt_at"] = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            counter = "retries"
+        self.collection.update_one(
+            {"_id": ticket["_id"]},
+            {"$set": update, "$unset": {"notification.lease_until": ""}}
+        )
+        with self._lock:
+            self._counters[counter] += 1
+            self._last_error = str(error)
+
+    def queue_depth(self):
+        return self.collection.count_documents(
+            {"notification.status": {"$in": [NOTIFICATION_PENDING, NOTIFICATION_SENDING]}}
+        )
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            latencies = sorted(self._latencies)
+            stats["last_error"] = self._last_error
+        try:
+            stats["queue_depth"] = self.queue_depth()
+        except Exception:
+            stats["queue_depth"] = None
+        stats["delivery_latency_p50_s"] = _percentile(latencies, 0.5)
+        stats["delivery_latency_p95_s"] = _percentile(latencies, 0.95)
+        stats["worker_alive"] = self._thread is not None and self._thread.is_alive()
+        if self.coalescer is not None:
+            stats.update(self.coalescer.stats())
+        return stats
@@ -0,0 +1,313 @@
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from dashboard_queries import DashboardQueries, day_bounds
+from telemetry import LatencyHistogram, bucket_index, configure_logging, NUM_BUCKETS
+
+ROLLUPS_COLLECTION = "api_usage_hourly"
+ROLLUP_STATE_COLLECTION = "rollup_state"
+ROLLUP_STATE_ID = ROLLUPS_COLLECTION
+ROLLUP_KEYS = ("api", "endpoint", "user_id", "country", "status_code")
+
+# Logs newer than this are left for the next run so writes still in flight
+# land before their hour is summarized.
+DEFAULT_SETTLE_SECONDS = int(os.getenv("ROLLUP_SETTLE_SECONDS", "300"))
+# Catch-up works through the backlog a day at a time and records progress
+# after each one, so a first backfill of months of logs can be interrupted.
+DEFAULT_CHUNK_HOURS = int(os.getenv("ROLLUP_CHUNK_HOURS", "24"))
+DEFAULT_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", "5000"))
+# How often a started UsageRollups (the dashboard's) runs catch_up().
+DEFAULT_INTERVAL_SECONDS = float(os.getenv("ROLLUP_INTERVAL_SECONDS", "60"))
+
+logger = logging.getLogger("apiman.usage_rollups")
+
+_LOG_PROJECTION = {"_id": 0, "timestamp": 1, "latency_ms": 1, **{key: 1 for key in ROLLUP_KEYS}}
+
+
+def _as_utc(dt_obj):
+    if dt_obj.tzinfo is None:
+        return dt_obj.replace(tzinfo=timezone.utc)
+    return dt_obj.astimezone(timezone.utc)
+
+
+def _hour(dt_obj):
+    return _as_utc(dt_obj).replace(minute=0, second=0, microsecond=0)
+
+
+def ensure_rollup_indexes(collection):
+    collection.create_index([("hour", 1)])
+    collection.create_index([("api", 1), ("hour", 1)])
+
+
+class _Bucket:
+    __slots__ = ("count", "latency_sum_ms", "latency_max_ms", "cost", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.latency_sum_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.cost = 0.0
+        self.buckets = defaultdict(int)
+
+    def add(self, latency_ms, price):
+        self.count += 1
+        self.latency_sum_ms += latency_ms
+        self.latency_max_ms = max(self.latency_max_ms, latency_ms)
+        self.cost += price
+        self.buckets[str(bucket_index(latency_ms))] += 1
+
+
+# Hourly buckets of api_usage_logs keyed by (hour, api, endpoint, user_id,
+# country, status_code), each holding the call count, latency sum and max, a
+# latency histogram on the telemetry bucket bounds, and untiered cost from the
+# price book (volume tiers are applied when costs are read).
+#
+# catch_up() summarizes whole hours from the watermark up to now minus the
+# settle delay and then moves the watermark; those hours are written with
+# $set, so re-running a chunk after a crash gives the same result. record()
+# is the ingest hook for logs that arrive after their hour was summarized:
+# they are $inc'ed into the existing bucket. Logs at or past the watermark
+# are left for catch_up().
+#
+# catch_up() is run by `python usage_rollups.py` or by the thread start()
+# launches every interval seconds; readers only look at the watermark.
+class UsageRollups:
+    def __init__(self, logs_collection, rollups_collection, state_collection, price_book=None,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, chunk_hours=DEFAULT_CHUNK_HOURS,
+                 batch_size=DEFAULT_BATCH_SIZE, interval=DEFAULT_INTERVAL_SECONDS):
+        self.logs = logs_collection
+        self.rollups = rollups_collection
+        self.state = state_collection
+        self.price_book = price_book
+        self.settle_seconds = settle_seconds
+        self.chunk_hours = chunk_hours
+        self.batch_size = batch_size
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_error = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="usage-rollups", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        # First pass right away, so a fresh deployment starts its backfill.
+        while True:
+            try:
+                self.catch_up()
+                self._last_error = None
+            except Exception as e:
+                logger.warning("usage rollup catch-up failed: %s", e)
+                self._last_error = str(e)
+            if self._stop.wait(self.interval):
+                return
+
+    def watermark(self):
+        doc = self.state.find_one({"_id": ROLLUP_STATE_ID})
+        return _as_utc(doc["watermark"]) if doc and doc.get("watermark") else None
+
+    def _set_watermark(self, watermark):
+        self.state.update_one(
+            {"_id": ROLLUP_STATE_ID},
+            {"$set": {"watermark": watermark, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+    def _summarize(self, docs):
+        buckets = defaultdict(_Bucket)
+        for doc in docs:
+            timestamp = doc.get("timestamp")
+            if timestamp is None:
+                continue
+            key = (_hour(timestamp),) + tuple(doc.get(field) for field in ROLLUP_KEYS)
+            price = self.price_book.unit_price(key[1], key[2]) if self.price_book else 0.0
+            buckets[key].add(float(doc.get("latency_ms") or 0.0), price)
+        return buckets
+
+    def _bucket_id(self, key):
+        return "|".join([key[0].isoformat()] + [str(value) for value in key[1:]])
+
+    def _key_fields(self, key):
+        fields = {"hour": key[0]}
+        fields.update(zip(ROLLUP_KEYS, key[1:]))
+        return fields
+
+    def catch_up(self, now=None):
+        now = _as_utc(now or datetime.now(timezone.utc))
+        cutoff = _hour(now - timedelta(seconds=self.settle_seconds))
+        watermark = self.watermark()
+        if watermark is None:
+            first = self.logs.find_one({}, {"timestamp": 1}, sort=[("timestamp", 1)])
+            if first is None:
+                return {"hours": 0, "logs": 0, "buckets": 0, "watermark": None}
+            watermark = _hour(first["timestamp"])
+        processed_logs = processed_buckets = 0
+        start = watermark
+        while start < cutoff:
+            end = min(cutoff, start + timedelta(hours=self.chunk_hours))
+            cursor = self.logs.find(
+                {"timestamp": {"$gte": start, "$lt": end}}, _LOG_PROJECTION, batch_size=self.batch_size
+            )
+            buckets = self._summarize(cursor)
+            for key, bucket in buckets.items():
+                fields = self._key_fields(key)
+                fields.update({
+                    "count": bucket.count,
+                    "latency_sum_ms": bucket.latency_sum_ms,
+                    "latency_max_ms": bucket.latency_max_ms,
+                    "cost": bucket.cost,
+                    "buckets": dict(bucket.buckets),
+                })
+                self.rollups.update_one({"_id": self._bucket_id(key)}, {"$set": fields}, upsert=True)
+                processed_logs += bucket.count
+            processed_buckets += len(buckets)
+            self._set_watermark(end)
+            start = end
+        return {
+            "hours": int((start - watermark).total_seconds() // 3600),
+            "logs": processed_logs,
+            "buckets": processed_buckets,
+            "watermark": start,
+        }
+
+    def record(self, docs):
+        # Ingest hook: folds logs for already-summarized hours into their
+        # buckets. Returns how many logs were applied.
+        watermark = self.watermark()
+        if watermark is None:
+            return 0
+        late = [doc for doc in docs if doc.get("timestamp") is not None and _as_utc(doc["timestamp"]) < watermark]
+        buckets = self._summarize(late)
+        for key, bucket in buckets.items():
+            increments = {"count": bucket.count, "latency_sum_ms": bucket.latency_sum_ms, "cost": bucket.cost}
+            increments.update({f"buckets.{index}": value for index, value in bucket.buckets.items()})
+            self.rollups.update_one(
+                {"_id": self._bucket_id(key)},
+                {
+                    "$inc": increments,
+                    "$max": {"latency_max_ms": bucket.latency_max_ms},
+                    "$setOnInsert": self._key_fields(key),
+                },
+                upsert=True
+            )
+        return len(late)
+
+    def stats(self):
+        watermark = self.watermark()
+        return {
+            "watermark": watermark,
+            "lag_seconds": (datetime.now(timezone.utc) - watermark).total_seconds() if watermark else None,
+            "buckets": self.rollups.estimated_document_count(),
+            "last_error": self._last_error,
+        }
+
+
+# Dashboard widgets over the rollups. Hours before the watermark come from
+# api_usage_hourly; the unsummarized tail after it is read from the raw logs
+# with the same aggregate and the two are merged.
+class RollupQueries(DashboardQueries):
+    group_fields = dict(DashboardQueries.group_fields)
+    group_fields["day"] = {"$dateToString": {"format": "%Y-%m-%d", "date": "$hour"}}
+    group_fields["month"] = {"$dateToString": {"format": "%Y-%m", "date": "$hour"}}
+
+    def __init__(self, rollups_collection, raw_queries, watermark_source):
+        super().__init__(rollups_collection, price_book=raw_queries.price_book, max_time_ms=raw_queries.max_time_ms)
+        self.raw_queries = raw_queries
+        self.watermark_source = watermark_source
+
+    def match_stage(self, start, end, api=None):
+        match = {"hour": {"$gte": start, "$lt": end}}
+        if api is not None:
+            match["api"] = api
+        return match
+
+    def metric_accumulators(self):
+        return {
+            "calls": {"$sum": "$count"},
+            "latency_sum_ms": {"$sum": "$latency_sum_ms"},
+            "cost": {"$sum": "$cost"},
+        }
+
+    def rows(self, aggregate, start, end, api=None):
+        watermark = self.watermark_source()
+        split = max(start, min(end, watermark)) if watermark else start
+        if split >= end:
+            return super().rows(aggregate, start, end, api)
+        if split <= start:
+            return self.raw_queries.rows(aggregate, start, end, api)
+        # The range straddles the watermark: fetch both halves unlimited,
+        # merge them per group, then apply the widget's sort and limit.
+        unlimited = aggregate._replace(limit=None)
+        rows = super().rows(unlimited, start, split, api) + self.raw_queries.rows(unlimited, split, end, api)
+        merged = {}
+        for row in rows:
+            key = tuple(row.get(field) for field in aggregate.group_by)
+            if key in merged:
+                for metric in ("calls", "latency_sum_ms", "cost"):
+                    merged[key][metric] += row[metric]
+            else:
+                merged[key] = dict(row)
+        rows = list(merged.values())
+        if aggregate.sort_by == "day":
+            rows.sort(key=lambda row: row["day"])
+        elif aggregate.sort_by:
+            rows.sort(key=lambda row: -row[aggregate.sort_by])
+        if aggregate.limit:
+            rows = rows[:aggregate.limit]
+        return rows
+
+    def latency_summary(self, start_date, end_date, api=None):
+        # Percentiles from the merged per-bucket histograms of the summarized
+        # hours; the tail after the watermark is not included.
+        start, end = day_bounds(start_date, end_date)
+        group = {
+            "_id": None,
+            "count": {"$sum": "$count"},
+            "latency_sum_ms": {"$sum": "$latency_sum_ms"},
+            "latency_max_ms": {"$max": "$latency_max_ms"},
+        }
+        group.update({f"b{index}": {"$sum": f"$buckets.{index}"} for index in range(NUM_BUCKETS)})
+        histogram = LatencyHistogram()
+        pipeline = [{"$match": self.match_stage(start, end, api)}, {"$group": group}]
+        for doc in self.collection.aggregate(pipeline, maxTimeMS=self.max_time_ms):
+            histogram.merge_counts(
+                [doc.get(f"b{index}", 0) for index in range(NUM_BUCKETS)],
+                doc.get("count", 0), doc.get("latency_sum_ms", 0.0), doc.get("latency_max_ms") or 0.0
+            )
+        return histogram.summary()
+
+
+def main():
+    # Catch-up job, e.g. from cron every few minutes: python usage_rollups.py
+    from dotenv import load_dotenv
+    from mongo_connection import get_analytics_database
+    from dashboard_queries import LOGS_COLLECTION
+    from api_configs import API_CONFIGS
+    from cost_engine import PriceBook
+
+    load_dotenv()
+    configure_logging()
+    db = get_analytics_database(os.getenv("MONGODB_URI"))
+    ensure_rollup_indexes(db[ROLLUPS_COLLECTION])
+    rollups = UsageRollups(
+        db[LOGS_COLLECTION], db[ROLLUPS_COLLECTION], db[ROLLUP_STATE_COLLECTION],
+        price_book=PriceBook.from_api_configs(API_CONFIGS)
+    )
+    result = rollups.catch_up()
+    print(f"Summarized {result['logs']:,} logs into {result['buckets']:,} hourly buckets; watermark {result['watermark']}.")
+
+
+if __name__ == "__main__":
+    main()